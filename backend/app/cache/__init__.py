@@ -0,0 +1,221 @@
+import hashlib
+import json
+import math
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Iterable, Mapping, NamedTuple, Optional
+from uuid import uuid4
+
+from app.cache.backends import CacheBackend, MemoryCache, NullCache, RedisCache
+from app.config import settings
+
+# Table version: bumped by every write route (see BookCache.invalidate)
+LIST_GENERATION_KEY = "books:list:generation"
+# Unix time of the last write, rounded up to whole seconds for Last-Modified
+LAST_MODIFIED_KEY = "books:last_modified"
+
+
+class TableVersion(NamedTuple):
+    generation: int
+    last_modified: int
+    # Distinguishes versions of per-process caches, whose counters are not shared
+    scope: str
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    etag: str
+    headers: dict
+
+
+class BookCache:
+    """Read-through cache of serialized book responses.
+
+    Single books and list pages are keyed by a generation counter that every
+    write bumps, so all filter/cursor combinations are invalidated at once
+    without enumerating their keys. A read that started before a write fills
+    the cache under the generation it read, where no later request looks.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float = 60.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.created_at = math.ceil(time.time())
+        self._scope = "shared" if backend.shared else uuid4().hex[:8]
+
+    async def version(self) -> TableVersion:
+        """Current books table version, read from the cache without touching the database"""
+        generation = await self.backend.get_counter(LIST_GENERATION_KEY)
+        last_modified = max(await self.backend.get_counter(LAST_MODIFIED_KEY), self.created_at)
+        scope = self._scope
+        if not self.backend.shared:
+            # Writes through other workers never bump this process's counter, so
+            # the version also rolls over every TTL; validators then go stale no
+            # later than cached bodies do
+            if self.ttl <= 0:
+                return TableVersion(generation, math.ceil(time.time()), uuid4().hex)
+            window = int(time.time() // self.ttl)
+            scope = f"{scope}.{window}"
+            last_modified = max(last_modified, math.ceil(window * self.ttl))
+        return TableVersion(generation, last_modified, scope)
+
+    def etag(self, version: TableVersion, resource: str) -> str:
+        """Weak entity tag for a resource at a table version (valid for every encoding)"""
+        digest = hashlib.sha1(f"{version.scope}:{version.generation}:{resource}".encode()).hexdigest()
+        return f'W/"{digest[:20]}"'
+
+    async def get_book(self, serial: str, generation: Optional[int] = None) -> Optional[CachedPage]:
+        return _decode(await self.backend.get(await self._book_key(serial, generation)))
+
+    async def set_book(
+        self,
+        serial: str,
+        body: bytes,
+        headers: Optional[dict] = None,
+        etag: Optional[str] = None,
+        generation: Optional[int] = None,
+    ) -> CachedPage:
+        """Cache a book under `generation`, the one current when its row was read"""
+        page = _page(body, headers, etag)
+        await self.backend.set(await self._book_key(serial, generation), _encode(page), self.ttl)
+        return page
+
+    async def _book_key(self, serial: str, generation: Optional[int] = None) -> str:
+        if generation is None:
+            generation = await self.backend.get_counter(LIST_GENERATION_KEY)
+        return f"books:serial:{generation}:{serial}"
+
+    async def list_key(self, params: dict, generation: Optional[int] = None) -> str:
+        """Key for a list page; includes the generation current at lookup time"""
+        if generation is None:
+            generation = await self.backend.get_counter(LIST_GENERATION_KEY)
+        normalized = json.dumps(
+            {name: value for name, value in params.items() if value is not None},
+            sort_keys=True,
+            default=str,
+        )
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        return f"books:list:{generation}:{digest}"
+
+    async def get_list(self, key: str) -> Optional[CachedPage]:
+        return _decode(await self.backend.get(key))
+
+    async def set_list(
+        self, key: str, body: bytes, headers: Optional[dict] = None, etag: Optional[str] = None
+    ) -> CachedPage:
+        page = _page(body, headers, etag)
+        await self.backend.set(key, _encode(page), self.ttl)
+        return page
+
+    async def get_variant(self, etag: str, encoding: str) -> Optional[bytes]:
+        """Precompressed body of the representation identified by `etag`"""
+        return await self.backend.get(_variant_key(etag, encoding))
+
+    async def set_variant(self, etag: str, encoding: str, body: bytes):
+        await self.backend.set(_variant_key(etag, encoding), body, self.ttl)
+
+    async def invalidate(self, serials: Iterable[str] = ()):
+        """Drop cached entries for the given serials and every cached list page"""
+        # Bumping the generation is what invalidates; deleting frees the memory early
+        generation = await self.backend.get_counter(LIST_GENERATION_KEY)
+        await self.backend.delete(*[await self._book_key(serial, generation) for serial in serials])
+        await self.backend.incr(LIST_GENERATION_KEY)
+        await self.backend.set_counter(LAST_MODIFIED_KEY, math.ceil(time.time()))
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "entries": self.backend.size(),
+            **self.backend.stats.as_dict(),
+        }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an entity tag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates
+    )
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, last_modified: Optional[int]) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no entity tag was sent"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request_headers.get("if-modified-since")
+    if not if_modified_since or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return last_modified <= since <= time.time()
+
+
+def validator_headers(etag: str, version: TableVersion, now: Optional[float] = None) -> dict:
+    """ETag and, once it is at least a second old, Last-Modified.
+
+    Last-Modified has one-second resolution, so a value from the current
+    second could still be followed by a write with the same timestamp.
+    """
+    headers = {"ETag": etag}
+    if version.last_modified <= (now or time.time()) - 1:
+        headers["Last-Modified"] = formatdate(version.last_modified, usegmt=True)
+    return headers
+
+
+def _variant_key(etag: str, encoding: str) -> str:
+    return f"books:variant:{etag.removeprefix('W/').strip(chr(34))}:{encoding}"
+
+
+def _page(body: bytes, headers: Optional[dict], etag: Optional[str] = None) -> CachedPage:
+    etag = etag or '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    return CachedPage(body=body, etag=etag, headers=headers or {})
+
+
+def _encode(page: CachedPage) -> bytes:
+    meta = json.dumps({"etag": page.etag, "headers": page.headers}).encode()
+    return meta + b"\n" + page.body
+
+
+def _decode(value: Optional[bytes]) -> Optional[CachedPage]:
+    if value is None:
+        return None
+    meta, body = value.split(b"\n", 1)
+    meta = json.loads(meta)
+    return CachedPage(body=body, etag=meta["etag"], headers=meta["headers"])
+
+
+def create_cache_backend(settings=settings) -> CacheBackend:
+    if settings.cache_backend == "memory":
+        return MemoryCache(max_entries=settings.cache_max_entries)
+    if settings.cache_backend == "redis":
+        return RedisCache.from_url(settings.cache_url)
+    return NullCache()
+
+
+book_cache = BookCache(create_cache_backend(), ttl=settings.cache_ttl_seconds)
+
+
+# Dependency for getting the book response cache
+def get_cache() -> BookCache:
+    return book_cache
+
+
+__all__ = [
+    "BookCache",
+    "CacheBackend",
+    "CachedPage",
+    "MemoryCache",
+    "NullCache",
+    "RedisCache",
+    "TableVersion",
+    "book_cache",
+    "etag_matches",
+    "get_cache",
+    "is_not_modified",
+    "validator_headers",
+]
@@ -0,0 +1,173 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class CacheStats:
+    """Hit/miss/eviction counters for a cache backend"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+class CacheBackend:
+    """Interface for byte-value caches (mirrors the Redis commands we use)"""
+
+    name = "none"
+    # Whether every worker sees the same entries and counters
+    shared = False
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, *keys: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str) -> int:
+        """Atomically increment a counter that is never evicted"""
+        raise NotImplementedError
+
+    async def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+    async def set_counter(self, key: str, value: int):
+        raise NotImplementedError
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class NullCache(CacheBackend):
+    """Backend that stores nothing; every lookup is a miss"""
+
+    def __init__(self):
+        super().__init__()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key):
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key, value, ttl):
+        pass
+
+    async def delete(self, *keys):
+        pass
+
+    async def incr(self, key):
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    async def set_counter(self, key, value):
+        self._counters[key] = value
+
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with per-entry TTL"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    async def set(self, key, value, ttl):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def delete(self, *keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def incr(self, key):
+        self._counters[key] = self._counters.get(key, 0) + 1
+        return self._counters[key]
+
+    async def get_counter(self, key):
+        return self._counters.get(key, 0)
+
+    async def set_counter(self, key, value):
+        self._counters[key] = value
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCache(CacheBackend):
+    """Backend for any client exposing the redis.asyncio get/set/delete/incr API"""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = "library:"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCache":
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "CACHE_BACKEND=redis requires the 'redis' package (pip install redis)"
+            ) from exc
+        return cls(redis.from_url(url))
+
+    async def get(self, key):
+        value = await self.client.get(self.prefix + key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key, value, ttl):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, *keys):
+        if keys:
+            await self.client.delete(*(self.prefix + key for key in keys))
+
+    async def incr(self, key):
+        return await self.client.incr(self.prefix + key)
+
+    async def get_counter(self, key):
+        value = await self.client.get(self.prefix + key)
+        return int(value) if value is not None else 0
+
+    async def set_counter(self, key, value):
+        await self.client.set(self.prefix + key, value)
@@ -0,0 +1,93 @@
+from typing import Sequence
+
+from app.compression import StreamCompressor, compress, is_compressible, negotiate
+
+
+class CompressionMiddleware:
+    """Compress response bodies with the best encoding the client accepts.
+
+    Complete bodies smaller than `min_size` are sent as is. Streamed bodies are
+    compressed chunk by chunk. Responses that already carry Content-Encoding
+    (e.g. precompressed cached pages) and event streams are passed through.
+    """
+
+    def __init__(self, app, encodings: Sequence[str] = ("gzip",), min_size: int = 1024):
+        self.app = app
+        self.encodings = tuple(encodings)
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = negotiate(accept_encoding, self.encodings)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = {name.lower(): value for name, value in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if b"content-encoding" in headers or not is_compressible(content_type):
+                    passthrough = True
+                    await send(message)
+                    return
+                # The response varies by Accept-Encoding whether or not this one is compressed
+                if b"accept-encoding" not in headers.get(b"vary", b"").lower():
+                    message = {**message, "headers": [*message.get("headers", []), (b"vary", b"Accept-Encoding")]}
+                if encoding is None:
+                    passthrough = True
+                    await send(message)
+                    return
+                # Hold the start until the first body chunk shows whether to compress
+                start = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None and start is not None:
+                if not more_body and len(body) < self.min_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = [
+                    (name, value) for name, value in start.get("headers", [])
+                    if name.lower() != b"content-length"
+                ]
+                headers.append((b"content-encoding", encoding.encode()))
+                if not more_body:
+                    compressed = compress(body, encoding)
+                    headers.append((b"content-length", str(len(compressed)).encode()))
+                    passthrough = True
+                    await send({**start, "headers": headers})
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                compressor = StreamCompressor(encoding)
+                await send({**start, "headers": headers})
+                start = None
+
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -16,6 +16,114 @@ class Settings(BaseSettings):
         "http://localhost:3000",
     ]
 
+    # Read replicas for read-only routes (JSON list of URLs); empty reads from the primary
+    database_replica_urls: list[str] = []
+    # After a write, the client reads from the primary for this many seconds
+    db_replica_sticky_seconds: float = 5.0
+    # A replica that failed to connect is skipped for this many seconds
+    db_replica_retry_seconds: float = 30.0
+
+    # Connection pool (ignored for SQLite)
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800  # seconds, -1 disables recycling
+    # Ping connections that sat idle in the pool longer than this many seconds;
+    # 0 pings on every checkout, a negative value disables pinging entirely
+    db_pre_ping_idle_seconds: float = 30.0
+
+    # asyncpg
+    db_statement_cache_size: int = 100
+    db_statement_timeout_ms: Optional[int] = None
+    # PgBouncer in transaction/statement mode cannot use prepared statements
+    db_pgbouncer_mode: bool = False
+
+    # Response cache: in-process LRU, shared Redis, or disabled
+    cache_backend: Literal["memory", "redis", "none"] = "memory"
+    cache_url: str = "redis://localhost:6379/0"
+    cache_ttl_seconds: float = 60.0
+    cache_max_entries: int = 10000
+
+    # Concurrent identical reads share one query; results stay shareable for
+    # this long after it finishes (0 = only while it is running)
+    read_coalescing: bool = True
+    read_coalescing_window_ms: float = 0.0
+
+    # Response compression, in server preference order; "br" and "zstd" are used
+    # only when the brotli/zstandard packages are installed
+    compression_encodings: list[str] = ["zstd", "br", "gzip"]
+    # Smaller bodies are sent uncompressed
+    compression_min_size: int = 1024
+
+    # Token-bucket rate limits on write endpoints, per client IP and per library
+    # card; "redis" shares the buckets between workers
+    rate_limit_backend: Literal["memory", "redis", "none"] = "memory"
+    rate_limit_url: str = "redis://localhost:6379/0"
+    rate_limit_ip_per_second: float = 10.0
+    rate_limit_ip_burst: int = 50
+    rate_limit_card_per_second: float = 0.5
+    rate_limit_card_burst: int = 10
+
+    # Admission control: answer 503 instead of queueing once this many requests
+    # are in flight or the recent connection pool wait exceeds the threshold
+    # (0 disables either check)
+    admission_max_in_flight: int = 512
+    # Catalogue streams (export, snapshot, GET /books/?stream=true) hold a
+    # connection for their whole duration, so they are capped on their own
+    admission_max_streams: int = 8
+    admission_max_pool_wait_ms: float = 250.0
+    admission_retry_after_seconds: int = 1
+
+    # Idempotency-Key replays for POST /books/ and loan updates: per-worker LRU,
+    # or the idempotency_keys table shared by all workers
+    idempotency_backend: Literal["memory", "database"] = "memory"
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_max_entries: int = 10000
+    # A claim left by a worker that died mid-request is taken over after this long
+    idempotency_lock_seconds: float = 60.0
+
+    # Refuse to start unless the database is at the latest migration
+    db_check_schema_on_startup: bool = True
+
+    # `python -m app.serve`
+    uvicorn_host: str = "127.0.0.1"
+    uvicorn_port: int = 8000
+    web_concurrency: int = 1
+    # Total PostgreSQL connections shared by all workers; when set, each worker's
+    # pool size and overflow are derived from it instead of DB_POOL_SIZE/DB_MAX_OVERFLOW
+    db_connection_budget: Optional[int] = None
+    # Seconds to let in-flight requests finish after SIGTERM
+    graceful_shutdown_seconds: float = 30.0
+
+    # Book change feed (GET /books/events): "auto" relays between workers with
+    # PostgreSQL LISTEN/NOTIFY when the database is PostgreSQL, else in-process only
+    events_backend: Literal["auto", "memory", "postgres"] = "auto"
+    # Undelivered events buffered per client before it is told to resync
+    events_queue_size: int = 100
+    events_keepalive_seconds: float = 15.0
+
+    # Loans are due this many days after borrowing
+    loan_period_days: int = 14
+    # Background scan for newly overdue loans; 0 disables it
+    overdue_scan_interval_seconds: float = 300.0
+    overdue_scan_batch_size: int = 1000
+
+    # Delta sync (GET /books/changes): deletions are remembered this many days;
+    # kiosks offline for longer must bootstrap again. 0 keeps them forever
+    sync_tombstone_retention_days: float = 90.0
+
+    # Upcoming monthly loan_events partitions are created this often (PostgreSQL); 0 disables it
+    loan_event_partition_interval_seconds: float = 86400.0
+
+    # GET /stats counters are checked against a full scan this often; 0 disables it
+    stats_reconcile_interval_seconds: float = 3600.0
+
+    # Per-worker cache of (title, author) -> work and author ids used when creating books
+    work_lookup_max_entries: int = 100000
+
+    # Observability: statements slower than this are logged with their route
+    slow_query_threshold_ms: Optional[float] = 500.0
+
 
 def get_database_url() -> str:
     settings = Settings()
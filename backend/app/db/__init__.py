@@ -1,20 +1,63 @@
+from uuid import uuid4
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
-from app.config import get_database_url
+from app.config import get_database_url, settings
+from app.db.pool import InstrumentedQueuePool, install_idle_pre_ping
+from app.db.replicas import Replica, ReplicaSet, open_read_session, pin_to_primary
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def create_async_db_engine():
-    return create_async_engine(
-        get_database_url(),
-        pool_pre_ping=True,
-        echo=False,
+def get_engine_options(url: str, settings=settings) -> dict:
+    """Build create_async_engine keyword arguments for the configured pool and driver"""
+    url = make_url(url)
+    options = {"echo": False}
+    if url.get_backend_name() == "sqlite":
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pre_ping_idle_seconds == 0,
     )
 
+    if url.get_driver_name() == "asyncpg":
+        connect_args = {}
+        if settings.db_pgbouncer_mode:
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                # Unnamed statements may land on a different server connection
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+            )
+        else:
+            connect_args["statement_cache_size"] = settings.db_statement_cache_size
+        if settings.db_statement_timeout_ms is not None:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(settings.db_statement_timeout_ms)
+            }
+        options["connect_args"] = connect_args
+
+    return options
+
+
+def create_async_db_engine(url: str = None, settings=settings):
+    url = url or get_database_url()
+    engine = create_async_engine(url, **get_engine_options(url, settings))
+    if isinstance(engine.pool, InstrumentedQueuePool) and settings.db_pre_ping_idle_seconds > 0:
+        install_idle_pre_ping(engine.sync_engine, settings.db_pre_ping_idle_seconds)
+    return engine
+
 
 def get_async_session_local(engine=None):
     engine = engine or create_async_db_engine()
@@ -25,11 +68,37 @@ def get_async_session_local(engine=None):
     )
 
 
+def create_replica_set(urls=None, settings=settings) -> ReplicaSet:
+    urls = settings.database_replica_urls if urls is None else urls
+    return ReplicaSet(
+        [
+            Replica(make_url(url).render_as_string(hide_password=True), create_async_db_engine(url, settings))
+            for url in urls
+        ],
+        retry_seconds=settings.db_replica_retry_seconds,
+    )
+
+
 engine = create_async_db_engine()
 AsyncSessionLocal = get_async_session_local(engine)
+replicas = create_replica_set()
 
 
-# Dependency for getting async database session
-async def get_db():
+# Dependency for getting async database session (primary; use for writes)
+async def get_db(response: Response):
     async with AsyncSessionLocal() as session:
+        if replicas:
+            # Read-your-writes: after a commit this client reads from the primary
+            # until the replicas have had time to catch up
+            event.listen(
+                session.sync_session,
+                "after_commit",
+                lambda _: pin_to_primary(response, settings.db_replica_sticky_seconds),
+            )
+        yield session
+
+
+# Dependency for read-only routes: a replica session when replicas are configured
+async def get_read_db(request: Request):
+    async with open_read_session(request, AsyncSessionLocal, replicas) as session:
         yield session
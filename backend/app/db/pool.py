@@ -0,0 +1,130 @@
+import time
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.metrics import record_pool_wait
+
+# Weight of each checkout in the recent wait average
+RECENT_WAIT_WEIGHT = 0.2
+# The recent wait average halves every this many seconds without checkouts, so
+# a pool that stops being used (e.g. while load is shed) reads as recovered
+RECENT_WAIT_HALF_LIFE = 5.0
+
+
+class PoolWaitStats:
+    """Running totals of how long callers waited to check out a connection"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._recent_wait = 0.0
+        self._recent_at = time.monotonic()
+
+    def record(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+        self._record_recent(seconds)
+
+    def record_timeout(self, seconds: float):
+        self.timeouts += 1
+        self._record_recent(seconds)
+
+    def recent_wait_seconds(self, now: Optional[float] = None) -> float:
+        """Moving average of recent checkout waits, decaying while the pool is idle"""
+        elapsed = (now if now is not None else time.monotonic()) - self._recent_at
+        return self._recent_wait * 0.5 ** (max(elapsed, 0.0) / RECENT_WAIT_HALF_LIFE)
+
+    def _record_recent(self, seconds: float):
+        now = time.monotonic()
+        recent = self.recent_wait_seconds(now)
+        self._recent_wait = recent + RECENT_WAIT_WEIGHT * (seconds - recent)
+        self._recent_at = now
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait times"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = PoolWaitStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.wait_stats.record_timeout(time.perf_counter() - started)
+            raise
+        waited = time.perf_counter() - started
+        self.wait_stats.record(waited)
+        record_pool_wait(waited)
+        return connection
+
+
+def install_idle_pre_ping(sync_engine, idle_seconds: float):
+    """Ping connections on checkout only when they sat idle in the pool for `idle_seconds`.
+
+    Unlike pool_pre_ping, a connection that was just returned by another request
+    is handed out without the extra SELECT 1 round trip.
+    """
+
+    @event.listens_for(sync_engine, "checkin")
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at: Optional[float] = connection_record.info.pop("checked_in_at", None)
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        try:
+            alive = sync_engine.dialect.do_ping(dbapi_connection)
+        except Exception as error:
+            if not sync_engine.dialect.is_disconnect(error, dbapi_connection, None):
+                raise
+            alive = False
+        if not alive:
+            # The pool discards this connection and retries the checkout
+            raise exc.DisconnectionError("Connection was closed while idle in the pool")
+
+
+def pool_status(pool) -> dict:
+    """Snapshot of pool occupancy and checkout wait statistics"""
+    status = {
+        "pool_class": type(pool).__name__,
+        "size": None,
+        "checked_in": None,
+        "checked_out": None,
+        "overflow": None,
+        "checkouts": None,
+        "timeouts": None,
+        "wait_seconds_total": None,
+        "wait_seconds_avg": None,
+        "wait_seconds_max": None,
+        "wait_seconds_recent": None,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    stats: Optional[PoolWaitStats] = getattr(pool, "wait_stats", None)
+    if stats is not None:
+        status.update(
+            checkouts=stats.checkouts,
+            timeouts=stats.timeouts,
+            wait_seconds_total=round(stats.wait_seconds_total, 6),
+            wait_seconds_avg=(
+                round(stats.wait_seconds_total / stats.checkouts, 6) if stats.checkouts else 0.0
+            ),
+            wait_seconds_max=round(stats.wait_seconds_max, 6),
+            wait_seconds_recent=round(stats.recent_wait_seconds(), 6),
+        )
+    return status
@@ -0,0 +1,140 @@
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import Session
+
+# Clients that just wrote are pinned to the primary until this unix time, so a
+# replica that has not caught up yet cannot hide their own write from them
+PRIMARY_COOKIE = "read_primary_until"
+PRIMARY_HEADER = "X-Read-Primary-Until"
+
+
+class Replica:
+    """A read replica and its health state"""
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self.failures = 0
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.down_until
+
+
+class ReplicaSet:
+    """Round-robin over healthy replicas.
+
+    A replica whose connection fails is skipped for `retry_seconds`; the next
+    request after that tries it again, so recovery needs no background task.
+    """
+
+    def __init__(self, replicas: List[Replica], retry_seconds: float = 30.0):
+        self.replicas = replicas
+        self.retry_seconds = retry_seconds
+        self._next = itertools.count()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        now = time.monotonic()
+        available = [replica for replica in self.replicas if replica.is_available(now)]
+        if not available:
+            return None
+        return available[next(self._next) % len(available)]
+
+    def mark_down(self, replica: Replica):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.retry_seconds
+
+    def mark_up(self, replica: Replica):
+        replica.down_until = 0.0
+
+    def status(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": replica.name,
+                "healthy": replica.is_available(now),
+                "failures": replica.failures,
+                "retry_in_seconds": round(max(0.0, replica.down_until - now), 3),
+            }
+            for replica in self.replicas
+        ]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+def primary_pinned(request: Request, now: Optional[float] = None) -> bool:
+    """Whether this client wrote recently enough that it must read from the primary"""
+    value = request.headers.get(PRIMARY_HEADER) or request.cookies.get(PRIMARY_COOKIE)
+    try:
+        return float(value) > (now or time.time())
+    except (TypeError, ValueError):
+        return False
+
+
+def pin_to_primary(response: Response, seconds: float):
+    """Route this client's reads to the primary for the next `seconds`"""
+    until = f"{time.time() + seconds:.3f}"
+    response.set_cookie(PRIMARY_COOKIE, until, max_age=max(1, int(seconds)), httponly=True, samesite="lax")
+    response.headers[PRIMARY_HEADER] = until
+
+
+class ReadSession(Session):
+    """Session that picks its database on first use.
+
+    A healthy replica when one is reachable, the primary otherwise; a request
+    answered from the cache or another request's result never checks out a
+    connection at all.
+    """
+
+    replicas: Optional[ReplicaSet] = None
+    role: Optional[str] = None
+    _read_bind = None
+
+    def get_bind(self, mapper=None, **kw):
+        if self.role is None:
+            self._read_bind = self._choose_replica()
+            self.role = "replica" if self._read_bind is not None else "primary"
+        return self._read_bind or super().get_bind(mapper, **kw)
+
+    def _choose_replica(self):
+        replica = self.replicas.choose() if self.replicas else None
+        while replica is not None:
+            try:
+                # Health check: the replica must hand out a working connection
+                # (it goes straight back to the pool for this session to reuse)
+                replica.engine.sync_engine.connect().close()
+            except (DBAPIError, OSError):
+                self.replicas.mark_down(replica)
+                replica = self.replicas.choose()
+                continue
+            self.replicas.mark_up(replica)
+            return replica.engine.sync_engine
+        return None
+
+
+@asynccontextmanager
+async def open_read_session(request: Request, primary: async_sessionmaker, replicas: ReplicaSet):
+    """Session on a healthy replica, or on the primary when pinned or none is reachable"""
+    if primary_pinned(request) or not replicas:
+        request.state.db_role = "primary"
+        async with primary() as session:
+            yield session
+        return
+
+    async with primary(sync_session_class=ReadSession) as session:
+        session.sync_session.replicas = replicas
+        try:
+            yield session
+        finally:
+            request.state.db_role = session.sync_session.role
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Optional, Union
+
+import orjson
+from sqlalchemy import Row
+from sqlalchemy.engine import make_url
+
+from app.config import get_database_url, settings
+from app.db import engine
+from app.events.brokers import RESYNC_EVENT, EventBroker, PostgresEventBroker, Subscription
+from app.models.book import Book
+
+
+def book_event(event_type: str, book: Union[Book, Row], now: Optional[datetime] = None) -> dict:
+    """Availability change of one book, as sent to subscribers"""
+    return {
+        "type": event_type,
+        "serial": book.serial,
+        "author": book.author,
+        "is_borrowed": bool(book.is_borrowed) and event_type != "deleted",
+        "due_at": book.due_at.isoformat() if book.due_at else None,
+        "occurred_at": (now or datetime.utcnow()).isoformat(),
+    }
+
+
+def encode_sse(event: dict) -> bytes:
+    """Format an event as a server-sent events message"""
+    return b"event: " + event["type"].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+
+
+def create_event_broker(settings=settings) -> EventBroker:
+    backend = settings.events_backend
+    if backend == "auto":
+        backend = "postgres" if make_url(get_database_url()).get_backend_name() == "postgresql" else "memory"
+    if backend == "postgres":
+        return PostgresEventBroker(engine, queue_size=settings.events_queue_size)
+    return EventBroker(queue_size=settings.events_queue_size)
+
+
+event_broker = create_event_broker()
+
+
+# Dependency for publishing and subscribing to book events
+def get_events() -> EventBroker:
+    return event_broker
+
+
+__all__ = [
+    "RESYNC_EVENT",
+    "EventBroker",
+    "PostgresEventBroker",
+    "Subscription",
+    "book_event",
+    "encode_sse",
+    "event_broker",
+    "get_events",
+]
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+import orjson
+from sqlalchemy import event as sa_event
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger("app.events")
+
+# Sent instead of the events a slow subscriber could not keep up with, and after
+# a relay outage: the client should refetch the state it displays
+RESYNC_EVENT = {"type": "resync"}
+
+NOTIFY_CHANNEL = "book_events"
+
+# Session.info key holding the events of the open transaction (in-process broker)
+PENDING_KEY = "book_events_pending"
+
+
+class Subscription:
+    """One client's bounded event queue.
+
+    A subscription with serials and/or authors receives events matching any of
+    them; one without filters receives everything.
+    """
+
+    def __init__(self, serials: Iterable[str] = (), authors: Iterable[str] = (), queue_size: int = 100):
+        self.serials = frozenset(serials)
+        self.authors = frozenset(authors)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.dropped = 0
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Never block the publisher on a slow client: discard its backlog
+            # and tell it to resync instead
+            self.dropped += self.queue.qsize() + 1
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC_EVENT)
+
+
+class EventBroker:
+    """In-process fan-out of book events to subscriptions.
+
+    Subscriptions are indexed by serial and author, so delivering an event only
+    touches the clients interested in it, however many are connected.
+    """
+
+    name = "memory"
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._everything: Set[Subscription] = set()
+        self._by_serial: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._by_author: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, serials: Iterable[str] = (), authors: Iterable[str] = ()) -> Subscription:
+        subscription = Subscription(serials, authors, self.queue_size)
+        if not subscription.serials and not subscription.authors:
+            self._everything.add(subscription)
+        for serial in subscription.serials:
+            self._by_serial[serial].add(subscription)
+        for author in subscription.authors:
+            self._by_author[author].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._everything.discard(subscription)
+        for index, keys in ((self._by_serial, subscription.serials), (self._by_author, subscription.authors)):
+            for key in keys:
+                subscribers = index.get(key)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del index[key]
+
+    def subscriber_count(self) -> int:
+        subscriptions = set(self._everything)
+        for index in (self._by_serial, self._by_author):
+            for subscribers in index.values():
+                subscriptions |= subscribers
+        return len(subscriptions)
+
+    def deliver(self, event: dict):
+        """Hand an event to the matching local subscriptions"""
+        targets = set(self._everything)
+        targets |= self._by_serial.get(event.get("serial"), set())
+        targets |= self._by_author.get(event.get("author"), set())
+        for subscription in targets:
+            subscription.offer(event)
+
+    def deliver_to_all(self, event: dict):
+        targets = set(self._everything)
+        for index in (self._by_serial, self._by_author):
+            for subscribers in index.values():
+                targets |= subscribers
+        for subscription in targets:
+            subscription.offer(event)
+
+    async def publish(self, db: AsyncSession, events: Iterable[dict]):
+        """Publish the changes of `db`'s open transaction once it commits.
+
+        Call before committing; the events are dropped if the transaction
+        rolls back instead.
+        """
+        events = list(events)
+        if events:
+            # Begin the transaction if need be, so its commit or rollback settles them
+            await db.connection()
+            db.info.setdefault(PENDING_KEY, []).append((self, events))
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class PostgresEventBroker(EventBroker):
+    """Relays events between workers with PostgreSQL LISTEN/NOTIFY.
+
+    Publishing sends NOTIFY in the write's own transaction; every worker
+    (including the publisher) delivers what its LISTEN connection receives to
+    its local subscribers. Events sent while the listener is reconnecting are
+    lost, so subscribers get a resync event once it is back.
+    """
+
+    name = "postgres"
+
+    def __init__(self, engine: AsyncEngine, queue_size: int = 100, reconnect_seconds: float = 1.0):
+        super().__init__(queue_size)
+        self.engine = engine
+        self.reconnect_seconds = reconnect_seconds
+        self._listener: Optional[asyncio.Task] = None
+
+    async def publish(self, db, events):
+        # Part of the write's transaction: PostgreSQL delivers notifications
+        # only when it commits, and drops them on rollback
+        payloads = [orjson.dumps(event).decode() for event in events]
+        if payloads:
+            await db.execute(select(*(func.pg_notify(NOTIFY_CHANNEL, payload) for payload in payloads)))
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name="book-events-listener")
+
+    async def stop(self):
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.deliver(orjson.loads(payload))
+
+    async def _listen(self):
+        import asyncpg
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        connected_before = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                if connected_before:
+                    self.deliver_to_all(RESYNC_EVENT)
+                connected_before = True
+                await closed.wait()
+                logger.warning("Event listener connection closed; reconnecting")
+            except asyncio.CancelledError:
+                if connection is not None:
+                    await connection.close()
+                raise
+            except Exception:
+                logger.exception("Event listener failed; reconnecting")
+            await asyncio.sleep(self.reconnect_seconds)
+
+
+def _deliver_committed(session: Session):
+    for broker, events in session.info.pop(PENDING_KEY, ()):
+        for event in events:
+            broker.deliver(event)
+
+
+def _drop_rolled_back(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+
+sa_event.listen(Session, "after_commit", _deliver_committed)
+sa_event.listen(Session, "after_rollback", _drop_rolled_back)
@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import MemoryCache
+from app.config import settings
+from app.db import AsyncSessionLocal
+from app.models.idempotency_key import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+# How often expired rows are deleted from idempotency_keys
+PURGE_INTERVAL_SECONDS = 600.0
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    fingerprint: str
+
+
+# Called by a write with its response right before it commits
+Recorder = Callable[[StoredResponse], Awaitable[None]]
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """Identifies the request a key was first used with, so reuse for another request is refused"""
+    return hashlib.sha256(b"%s %s\n%s" % (method.encode(), path.encode(), body)).hexdigest()
+
+
+class IdempotencyStore:
+    """Where completed responses are kept for replay"""
+
+    name = "none"
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        """Reserve `key` for a new execution, or return what is already stored under it.
+
+        A returned response with status_code 0 means another worker holds the claim.
+        """
+        raise NotImplementedError
+
+    async def save(self, key: str, response: StoredResponse):
+        raise NotImplementedError
+
+    async def save_in_transaction(self, db: AsyncSession, key: str, response: StoredResponse) -> bool:
+        """Stage the response in the write's own transaction, to commit with it.
+
+        Returns False when the store cannot; the response is then saved after
+        the write has committed.
+        """
+        return False
+
+    async def release(self, key: str):
+        """Give up a claim whose execution failed, so the request can be retried"""
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """Per-process LRU; replays only reach the worker that served the original request"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400.0):
+        self.entries = MemoryCache(max_entries=max_entries)
+        self.ttl = ttl
+
+    async def claim(self, key, fingerprint):
+        value = await self.entries.get(key)
+        if value is None:
+            return None
+        header, _, body = value.partition(b"\n")
+        status_code, stored_fingerprint = header.decode().split(" ")
+        return StoredResponse(int(status_code), body, stored_fingerprint)
+
+    async def save(self, key, response):
+        header = f"{response.status_code} {response.fingerprint}\n".encode()
+        await self.entries.set(key, header + response.body, self.ttl)
+
+
+class DatabaseIdempotencyStore(IdempotencyStore):
+    """idempotency_keys table, shared by all workers.
+
+    The claim is an INSERT, so only one worker executes a key; the others see
+    the claim row and answer 409 until the response has been saved. A
+    successful write stores its response in its own transaction, so a crash
+    after the commit can never leave the write applied but the key free.
+    """
+
+    name = "database"
+
+    def __init__(self, session_factory=AsyncSessionLocal, ttl: float = 86400.0, lock_seconds: float = 60.0):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+
+    async def claim(self, key, fingerprint):
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            # Claims of crashed workers and responses past their TTL are free to take over
+            await session.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.expires_at <= now)
+            )
+            session.add(IdempotencyKey(
+                key=key,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(seconds=self.lock_seconds),
+            ))
+            try:
+                await session.commit()
+                return None
+            except IntegrityError:
+                await session.rollback()
+            row = (await session.execute(
+                select(IdempotencyKey).where(IdempotencyKey.key == key)
+            )).scalar_one_or_none()
+        if row is None:
+            # The holder released it between our INSERT and SELECT; the client may retry
+            return StoredResponse(0, b"", fingerprint)
+        return StoredResponse(row.status_code or 0, row.body or b"", row.fingerprint)
+
+    async def save(self, key, response):
+        async with self.session_factory() as session:
+            await session.execute(self._save_statement(key, response))
+            await session.commit()
+
+    def _save_statement(self, key: str, response: StoredResponse):
+        return (
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(
+                status_code=response.status_code,
+                body=response.body,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+            )
+        )
+
+    async def save_in_transaction(self, db, key, response):
+        await db.execute(self._save_statement(key, response))
+        return True
+
+    async def release(self, key):
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+            )
+            await session.commit()
+
+    async def purge_expired(self) -> int:
+        async with self.session_factory() as session:
+            result = await session.execute(
+                delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow())
+            )
+            await session.commit()
+        return result.rowcount
+
+
+class Idempotency:
+    """Executes each Idempotency-Key once and replays the stored response afterwards.
+
+    Duplicates arriving while the first execution is still running in this
+    worker wait for it and share its response instead of running again.
+    """
+
+    def __init__(self, store: IdempotencyStore):
+        self.store = store
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        execute: Callable[[Recorder], Awaitable[StoredResponse]],
+        db: Optional[AsyncSession] = None,
+    ) -> Tuple[StoredResponse, bool]:
+        """Return (response, whether it is a replay).
+
+        `execute` is given a recorder to await with its response just before
+        it commits on `db`, so the store can save the response in the same
+        transaction as the write.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{IDEMPOTENCY_KEY_HEADER} must be 1-{MAX_KEY_LENGTH} characters"
+            )
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            try:
+                stored = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The first execution was abandoned (client went away); take over
+                return await self.run(key, fingerprint, execute, db)
+            return _check_fingerprint(stored, fingerprint), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            stored = await self.store.claim(key, fingerprint)
+            if stored is not None:
+                _check_fingerprint(stored, fingerprint)
+                if not stored.status_code:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail=f"A request with this {IDEMPOTENCY_KEY_HEADER} is still being processed"
+                    )
+                replayed = True
+            else:
+                saved = False
+
+                async def record(response: StoredResponse):
+                    nonlocal saved
+                    if db is not None:
+                        saved = await self.store.save_in_transaction(db, key, response)
+
+                try:
+                    stored = await execute(record)
+                except BaseException:
+                    # Only frees a claim whose response was not committed
+                    await self.store.release(key)
+                    raise
+                if not saved:
+                    await self.store.save(key, stored)
+                replayed = False
+            future.set_result(stored)
+            return stored, replayed
+        except Exception as exc:
+            future.set_exception(exc)
+            # Waiters, if any, re-raise it; without them the exception is not an error
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[key]
+
+
+def _check_fingerprint(stored: StoredResponse, fingerprint: str) -> StoredResponse:
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request"
+        )
+    return stored
+
+
+def create_idempotency_store(settings=settings) -> IdempotencyStore:
+    if settings.idempotency_backend == "database":
+        return DatabaseIdempotencyStore(
+            ttl=settings.idempotency_ttl_seconds,
+            lock_seconds=settings.idempotency_lock_seconds,
+        )
+    return MemoryIdempotencyStore(
+        max_entries=settings.idempotency_max_entries,
+        ttl=settings.idempotency_ttl_seconds,
+    )
+
+
+idempotency = Idempotency(create_idempotency_store())
+
+
+# Dependency for getting the Idempotency-Key store
+def get_idempotency() -> Idempotency:
+    return idempotency
+
+
+__all__ = [
+    "DatabaseIdempotencyStore",
+    "IDEMPOTENCY_KEY_HEADER",
+    "Idempotency",
+    "IdempotencyStore",
+    "MemoryIdempotencyStore",
+    "PURGE_INTERVAL_SECONDS",
+    "REPLAYED_HEADER",
+    "Recorder",
+    "StoredResponse",
+    "get_idempotency",
+    "idempotency",
+    "request_fingerprint",
+]
@@ -1,20 +1,77 @@
 from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.config import settings
-from app.db import Base, engine
-from app.models import Book  # Import models so SQLAlchemy can see them
-from app.routers import books
+from app.db import AsyncSessionLocal, engine, replicas
+from app.db.pool import pool_status
+from app.events import event_broker
+from app.idempotency import PURGE_INTERVAL_SECONDS, DatabaseIdempotencyStore, idempotency
+from app.migrations import check_schema
+from app.metrics import render_metrics
+from app.compression import enabled_encodings
+from app.compression.middleware import CompressionMiddleware
+from app.metrics.middleware import MetricsMiddleware
+from app.metrics.sql import install_sql_hooks
+from app.ratelimit.middleware import AdmissionMiddleware, RateLimitMiddleware
+from app.routers import admin, books, loans, patrons, stats
+from app.scheduler import PeriodicTask
+from app.services.loans import create_loan_event_partitions
+from app.services.overdue import scan_overdue
+from app.services.stats import reconcile_stats
+from app.services.sync import PRUNE_INTERVAL_SECONDS, prune_tombstones
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Run startup and shutdown tasks for the application."""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Schema changes are applied by `python -m app.migrations upgrade` (or once by
+    # `python -m app.serve`); workers only verify the revision with one query
+    if settings.db_check_schema_on_startup:
+        await check_schema(engine)
+
+    tasks = []
+    if settings.overdue_scan_interval_seconds > 0:
+        tasks.append(PeriodicTask(
+            "overdue-scan",
+            settings.overdue_scan_interval_seconds,
+            partial(scan_overdue, AsyncSessionLocal, settings.overdue_scan_batch_size),
+        ))
+    if isinstance(idempotency.store, DatabaseIdempotencyStore):
+        tasks.append(PeriodicTask(
+            "idempotency-purge", PURGE_INTERVAL_SECONDS, idempotency.store.purge_expired
+        ))
+    if settings.sync_tombstone_retention_days > 0:
+        tasks.append(PeriodicTask(
+            "tombstone-prune",
+            PRUNE_INTERVAL_SECONDS,
+            partial(prune_tombstones, AsyncSessionLocal, settings.sync_tombstone_retention_days),
+        ))
+    if settings.loan_event_partition_interval_seconds > 0:
+        tasks.append(PeriodicTask(
+            "loan-event-partitions",
+            settings.loan_event_partition_interval_seconds,
+            partial(create_loan_event_partitions, engine),
+        ))
+    if settings.stats_reconcile_interval_seconds > 0:
+        tasks.append(PeriodicTask(
+            "stats-reconcile",
+            settings.stats_reconcile_interval_seconds,
+            partial(reconcile_stats, AsyncSessionLocal),
+        ))
+    for task in tasks:
+        task.start()
+    await event_broker.start()
     yield
+    await event_broker.stop()
+    for task in tasks:
+        await task.stop()
+    # Runs after in-flight requests have drained
+    await engine.dispose()
+    await replicas.dispose()
 
 
 app = FastAPI(
@@ -24,6 +81,11 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Innermost: only requests that pass the rate limiter count towards admission,
+# and CORS headers are still added to 429/503 responses
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS middleware - allows frontend to communicate with API
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +95,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/br/zstd response bodies; added first so metrics see the whole request
+app.add_middleware(
+    CompressionMiddleware,
+    encodings=enabled_encodings(settings.compression_encodings),
+    min_size=settings.compression_min_size,
+)
+# Latency, per-request query count/DB time and Server-Timing headers
+app.add_middleware(MetricsMiddleware)
+install_sql_hooks(settings.slow_query_threshold_ms)
+
 
 @app.get("/")
 async def root():
@@ -51,6 +123,25 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics for this worker"""
+    pool = pool_status(engine.pool)
+    gauges = [
+        (f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}", pool[name])
+        for name in ("size", "checked_in", "checked_out", "overflow")
+        if pool[name] is not None
+    ]
+    return PlainTextResponse(
+        render_metrics(gauges),
+        media_type="text/plain; version=0.0.4"
+    )
+
+
 # Include routers
 app.include_router(books.router)
+app.include_router(patrons.router)
+app.include_router(loans.router)
+app.include_router(stats.router)
+app.include_router(admin.router)
 
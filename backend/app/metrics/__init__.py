@@ -0,0 +1,195 @@
+import bisect
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus default latency buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """Database work attributed to the request currently being served"""
+
+    __slots__ = ("scope", "db_queries", "db_seconds", "pool_wait_seconds")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope or {}
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        """Template of the matched route (set on the scope by the router), not the raw path"""
+        return getattr(self.scope.get("route"), "path", "unmatched")
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count], sum
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        counts, total = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[label]) for label in self.labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labels + ('le',), key + (le,))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status"),
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries issued per HTTP request",
+    ("method", "route"),
+    QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing database queries per HTTP request",
+    ("method", "route"),
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Duration of individual database queries",
+)
+DB_POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check out a pooled connection",
+)
+SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Queries slower than the configured slow query threshold",
+    ("route",),
+)
+OVERDUE_LOANS = Counter(
+    "overdue_loans_detected_total",
+    "Loans found newly overdue by the background scan",
+)
+RATE_LIMITED = Counter(
+    "http_requests_rate_limited_total",
+    "Requests rejected with 429 by the rate limiter",
+    ("limit",),
+)
+REQUESTS_SHED = Counter(
+    "http_requests_shed_total",
+    "Requests rejected with 503 by admission control",
+    ("reason",),
+)
+READ_COALESCING = Counter(
+    "read_coalescing_total",
+    "Read requests that executed a query vs. joined an identical one in flight",
+    ("route", "result"),
+)
+STATS_DRIFT = Counter(
+    "stats_drift_corrected_total",
+    "Statistics rows found out of step with the data and corrected by reconciliation",
+    ("table",),
+)
+
+METRICS = (
+    REQUEST_DURATION,
+    REQUEST_DB_QUERIES,
+    REQUEST_DB_DURATION,
+    DB_QUERY_DURATION,
+    DB_POOL_WAIT,
+    SLOW_QUERIES,
+    OVERDUE_LOANS,
+    RATE_LIMITED,
+    REQUESTS_SHED,
+    READ_COALESCING,
+    STATS_DRIFT,
+)
+
+
+def record_pool_wait(seconds: float):
+    DB_POOL_WAIT.observe(seconds)
+    stats = current_request.get()
+    if stats is not None:
+        stats.pool_wait_seconds += seconds
+
+
+def render_metrics(gauges: Iterable[Tuple[str, str, float]] = ()) -> str:
+    """Render all metrics, plus point-in-time (name, help, value) gauges, in Prometheus text format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, documentation, value in gauges:
+        lines.extend([
+            f"# HELP {name} {documentation}",
+            f"# TYPE {name} gauge",
+            f"{name} {_number(value)}",
+        ])
+    return "\n".join(lines) + "\n"
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = (
+        f'{name}="{_escape(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
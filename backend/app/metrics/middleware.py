@@ -0,0 +1,61 @@
+import time
+
+from app.metrics import (
+    REQUEST_DB_DURATION,
+    REQUEST_DB_QUERIES,
+    REQUEST_DURATION,
+    RequestStats,
+    current_request,
+)
+
+
+class MetricsMiddleware:
+    """Record per-route latency and database work, and report it in Server-Timing.
+
+    Written as a plain ASGI middleware so streamed responses are not buffered.
+    The Server-Timing header covers work done before the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - started
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", _server_timing(stats, elapsed).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route_path = stats.route
+            method = scope["method"]
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=method, route=route_path, status=status_code,
+            )
+            REQUEST_DB_QUERIES.observe(stats.db_queries, method=method, route=route_path)
+            REQUEST_DB_DURATION.observe(stats.db_seconds, method=method, route=route_path)
+
+
+def _server_timing(stats: RequestStats, elapsed: float) -> str:
+    return ", ".join([
+        f"app;dur={elapsed * 1000:.2f}",
+        f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.db_queries} queries"',
+        f"pool;dur={stats.pool_wait_seconds * 1000:.2f}",
+    ])
@@ -0,0 +1,59 @@
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.metrics import DB_QUERY_DURATION, SLOW_QUERIES, current_request
+
+logger = logging.getLogger("app.slow_query")
+
+# Longest statement text written to the slow query log
+MAX_LOGGED_STATEMENT = 2000
+
+_slow_query_seconds: Optional[float] = None
+
+
+def install_sql_hooks(slow_query_ms: Optional[float] = None):
+    """Time every statement on every engine and attribute it to the current request"""
+    global _slow_query_seconds
+    _slow_query_seconds = slow_query_ms / 1000 if slow_query_ms is not None else None
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((context, time.perf_counter()))
+
+
+def _handle_error(exception_context):
+    """Drop the start time of a statement that failed, so it is not paired with the next one"""
+    conn = exception_context.connection
+    stack = conn.info.get("query_started") if conn is not None else None
+    if stack and stack[-1][0] is exception_context.execution_context:
+        stack.pop()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _, started = conn.info["query_started"].pop()
+    elapsed = time.perf_counter() - started
+    DB_QUERY_DURATION.observe(elapsed)
+
+    stats = current_request.get()
+    route = "background"
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+        route = stats.route
+
+    if _slow_query_seconds is not None and elapsed >= _slow_query_seconds:
+        SLOW_QUERIES.inc(route=route)
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s",
+            elapsed * 1000,
+            route,
+            " ".join(statement.split())[:MAX_LOGGED_STATEMENT],
+        )
@@ -0,0 +1,200 @@
+"""Versioned schema migrations.
+
+Each module in `app/migrations/versions` is one revision, applied in file-name
+order. A revision module defines:
+
+    revision = "0002"
+    description = "..."
+    transactional = True  # False for CREATE INDEX CONCURRENTLY on PostgreSQL
+
+    def upgrade(connection): ...
+    def downgrade(connection): ...
+
+`upgrade`/`downgrade` receive a synchronous Connection (they run through
+`run_sync`). The applied revision is kept in the one-row `schema_version`
+table, so checking it at startup is a single query.
+"""
+import importlib
+import pkgutil
+from types import ModuleType
+from typing import List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Column, MetaData, String, Table, delete, inspect, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.migrations import versions
+
+BASE = "base"
+
+version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version_num", String(32), primary_key=True),
+)
+
+
+class MigrationError(Exception):
+    """The requested migration cannot be performed"""
+
+
+class SchemaOutOfDate(MigrationError):
+    """The database is not at the revision this code expects"""
+
+
+class Migration(NamedTuple):
+    revision: str
+    description: str
+    transactional: bool
+    module: ModuleType
+
+
+def load_migrations() -> List[Migration]:
+    """All revisions in the order they are applied"""
+    migrations = []
+    for info in sorted(pkgutil.iter_modules(versions.__path__), key=lambda m: m.name):
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        migrations.append(Migration(
+            revision=module.revision,
+            description=module.description,
+            transactional=getattr(module, "transactional", True),
+            module=module,
+        ))
+    return migrations
+
+
+def head_revision(migrations: Optional[Sequence[Migration]] = None) -> str:
+    migrations = load_migrations() if migrations is None else migrations
+    return migrations[-1].revision if migrations else BASE
+
+
+def _position(migrations: Sequence[Migration], revision: str) -> int:
+    """Number of migrations applied when the database is at `revision`"""
+    if revision == BASE:
+        return 0
+    for index, migration in enumerate(migrations):
+        if migration.revision == revision:
+            return index + 1
+    raise MigrationError(f"Unknown revision '{revision}'")
+
+
+async def current_revision(engine: AsyncEngine) -> Optional[str]:
+    """The applied revision, or None when the database has never been migrated"""
+    try:
+        async with engine.connect() as conn:
+            return await conn.scalar(select(version_table.c.version_num))
+    except DBAPIError:
+        # No schema_version table yet
+        return None
+
+
+def _set_revision(connection, revision: str):
+    version_table.create(connection, checkfirst=True)
+    connection.execute(delete(version_table))
+    if revision != BASE:
+        connection.execute(insert(version_table).values(version_num=revision))
+
+
+async def _run(engine: AsyncEngine, migration: Migration, step: str, new_revision: str):
+    function = getattr(migration.module, step)
+    if migration.transactional or engine.dialect.name != "postgresql":
+        async with engine.begin() as conn:
+            await conn.run_sync(function)
+            await conn.run_sync(_set_revision, new_revision)
+        return
+
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.run_sync(function)
+        await conn.run_sync(_set_revision, new_revision)
+
+
+async def upgrade(engine: AsyncEngine, target: Optional[str] = None) -> List[str]:
+    """Apply pending migrations up to `target` (default: head); returns applied revisions"""
+    migrations = load_migrations()
+    current = await current_revision(engine)
+    if current is None:
+        async with engine.connect() as conn:
+            has_books = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("books"))
+        if has_books:
+            raise MigrationError(
+                "Database has tables but no schema version. It was created before migrations "
+                "existed; verify it matches revision 0001 and run `stamp 0001`."
+            )
+        current = BASE
+
+    start = _position(migrations, current)
+    end = _position(migrations, target or head_revision(migrations))
+    if end < start:
+        raise MigrationError(f"Target {target} is older than the current revision {current}; use downgrade")
+
+    applied = []
+    for migration in migrations[start:end]:
+        await _run(engine, migration, "upgrade", migration.revision)
+        applied.append(migration.revision)
+    return applied
+
+
+async def downgrade(engine: AsyncEngine, target: str) -> List[str]:
+    """Revert migrations until the database is at `target` ("base" reverts all)"""
+    migrations = load_migrations()
+    current = await current_revision(engine) or BASE
+    start = _position(migrations, current)
+    end = _position(migrations, target)
+    if end > start:
+        raise MigrationError(f"Target {target} is newer than the current revision {current}; use upgrade")
+
+    reverted = []
+    for index in range(start - 1, end - 1, -1):
+        migration = migrations[index]
+        previous = migrations[index - 1].revision if index > 0 else BASE
+        await _run(engine, migration, "downgrade", previous)
+        reverted.append(migration.revision)
+    return reverted
+
+
+async def stamp(engine: AsyncEngine, revision: str):
+    """Record `revision` as applied without running any migration"""
+    _position(load_migrations(), revision)
+    async with engine.begin() as conn:
+        await conn.run_sync(_set_revision, revision)
+
+
+async def check_schema(engine: AsyncEngine):
+    """Raise SchemaOutOfDate unless the database is at the head revision"""
+    expected = head_revision()
+    current = await current_revision(engine)
+    if current != expected:
+        raise SchemaOutOfDate(
+            f"Database schema is at revision {current or 'none'}, expected {expected}. "
+            "Run `python -m app.migrations upgrade`."
+        )
+
+
+def create_index(connection, name: str, table: str, columns: str, where: Optional[str] = None,
+                 unique: bool = False):
+    """Create an index without blocking writes on PostgreSQL (CONCURRENTLY).
+
+    Use in a migration with `transactional = False`. A failed concurrent build
+    leaves an INVALID index behind, which IF NOT EXISTS would keep; such an
+    index is dropped and built again.
+    """
+    postgres = connection.dialect.name == "postgresql"
+    if postgres:
+        valid = connection.execute(
+            text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+        ).scalar()
+        if valid is False:
+            drop_index(connection, name)
+    concurrently = " CONCURRENTLY" if postgres else ""
+    predicate = f" WHERE {where}" if where else ""
+    connection.execute(text(
+        f"CREATE {'UNIQUE ' if unique else ''}INDEX{concurrently} IF NOT EXISTS {name} "
+        f"ON {table} ({columns}){predicate}"
+    ))
+
+
+def drop_index(connection, name: str):
+    concurrently = " CONCURRENTLY" if connection.dialect.name == "postgresql" else ""
+    connection.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
@@ -0,0 +1,65 @@
+"""Schema migration CLI, run from the backend directory:
+
+    python -m app.migrations upgrade [REVISION]
+    python -m app.migrations downgrade REVISION|base
+    python -m app.migrations stamp REVISION
+    python -m app.migrations current
+    python -m app.migrations history
+"""
+import argparse
+import asyncio
+import sys
+
+from app.db import create_async_db_engine
+from app.migrations import (
+    MigrationError,
+    current_revision,
+    downgrade,
+    head_revision,
+    load_migrations,
+    stamp,
+    upgrade,
+)
+
+
+async def run(args) -> int:
+    engine = create_async_db_engine(args.database_url)
+    try:
+        if args.command == "upgrade":
+            applied = await upgrade(engine, args.revision)
+            print(f"Applied {', '.join(applied)}" if applied else "Already up to date")
+        elif args.command == "downgrade":
+            reverted = await downgrade(engine, args.revision)
+            print(f"Reverted {', '.join(reverted)}" if reverted else "Nothing to revert")
+        elif args.command == "stamp":
+            await stamp(engine, args.revision)
+            print(f"Stamped {args.revision}")
+        elif args.command == "current":
+            current = await current_revision(engine)
+            head = head_revision()
+            print(f"{current or 'none'}{' (head)' if current == head else f' (head is {head})'}")
+        else:
+            for migration in load_migrations():
+                print(f"{migration.revision}  {migration.description}")
+    except MigrationError as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    finally:
+        await engine.dispose()
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="Manage the database schema")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL / POSTGRES_* settings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("upgrade", help="apply pending migrations").add_argument("revision", nargs="?")
+    commands.add_parser("downgrade", help="revert migrations").add_argument("revision")
+    commands.add_parser("stamp", help="record a revision without running it").add_argument("revision")
+    commands.add_parser("current", help="show the applied revision")
+    commands.add_parser("history", help="list all revisions")
+    return asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
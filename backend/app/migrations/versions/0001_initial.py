@@ -0,0 +1,90 @@
+"""Initial schema: books (with search indexes) and the partitioned loan_events log.
+
+Frozen copy of the models at the time migrations were introduced; databases
+created earlier by `create_all` match it and can be stamped at 0001.
+"""
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    MetaData,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    UniqueConstraint,
+    text,
+)
+
+from app.models.loan_event import ensure_loan_event_partitions
+
+revision = "0001"
+description = "initial schema"
+
+metadata = MetaData()
+
+books = Table(
+    "books",
+    metadata,
+    Column("serial", String(6), primary_key=True, index=True),
+    Column("title", String, nullable=False),
+    Column("author", String, nullable=False),
+    Column("is_borrowed", Boolean),
+    Column("borrowed_by", String(6), nullable=True),
+    Column("borrowed_at", DateTime, nullable=True),
+    Index("ix_books_search", text("to_tsvector('simple', title || ' ' || author)"),
+          postgresql_using="gin").ddl_if(dialect="postgresql"),
+    Index("ix_books_title_trgm", "title", postgresql_using="gin",
+          postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    Index("ix_books_author_trgm", "author", postgresql_using="gin",
+          postgresql_ops={"author": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+)
+
+loan_events = Table(
+    "loan_events",
+    metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+    Column("serial", String(6), nullable=False),
+    Column("card_number", String(6), nullable=True),
+    Column("action", String(6), nullable=False),
+    Column("occurred_at", DateTime, nullable=False),
+    PrimaryKeyConstraint("id", name="pk_loan_events").ddl_if(dialect="sqlite"),
+    UniqueConstraint("id", "occurred_at", name="uq_loan_events_id_occurred_at")
+    .ddl_if(dialect="postgresql"),
+    Index("ix_loan_events_serial_id", "serial", "id"),
+    Index("ix_loan_events_card_number_id", "card_number", "id"),
+    postgresql_partition_by="RANGE (occurred_at)",
+)
+
+SQLITE_FTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5("
+    "title, author, content='books', content_rowid='rowid', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN "
+    "INSERT INTO books_fts(rowid, title, author) VALUES (new.rowid, new.title, new.author); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author) "
+    "VALUES ('delete', old.rowid, old.title, old.author); END",
+    "CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN "
+    "INSERT INTO books_fts(books_fts, rowid, title, author) "
+    "VALUES ('delete', old.rowid, old.title, old.author); "
+    "INSERT INTO books_fts(rowid, title, author) VALUES (new.rowid, new.title, new.author); END",
+)
+
+
+def upgrade(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    metadata.create_all(connection)
+    if connection.dialect.name == "sqlite":
+        for statement in SQLITE_FTS:
+            connection.execute(text(statement))
+    ensure_loan_event_partitions(connection)
+
+
+def downgrade(connection):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS books_fts"))
+    # Dropping the partitioned parent drops its partitions as well
+    metadata.drop_all(connection)
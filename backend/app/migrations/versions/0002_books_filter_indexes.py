@@ -0,0 +1,21 @@
+"""Indexes for the GET /books/ author and borrowed_by filters.
+
+Both include serial so the keyset-paginated scan (ORDER BY serial) is served
+from the index. Built CONCURRENTLY on PostgreSQL so books stays writable.
+"""
+from app.migrations import create_index, drop_index
+
+revision = "0002"
+description = "books author/borrowed_by filter indexes"
+transactional = False
+
+
+def upgrade(connection):
+    create_index(connection, "ix_books_author_serial", "books", "author, serial")
+    create_index(connection, "ix_books_borrowed_by_serial", "books", "borrowed_by, serial",
+                 where="borrowed_by IS NOT NULL")
+
+
+def downgrade(connection):
+    drop_index(connection, "ix_books_borrowed_by_serial")
+    drop_index(connection, "ix_books_author_serial")
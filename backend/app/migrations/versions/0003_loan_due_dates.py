@@ -0,0 +1,36 @@
+"""Add books.due_at (backfilled for current loans) and the job_checkpoints table."""
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+
+revision = "0003"
+description = "loan due dates and job checkpoints"
+
+# Loan period in force when this migration was written
+BACKFILL_LOAN_DAYS = 14
+
+metadata = MetaData()
+
+job_checkpoints = Table(
+    "job_checkpoints",
+    metadata,
+    Column("name", String(64), primary_key=True),
+    Column("position_at", DateTime, nullable=True),
+    Column("position_key", String(64), nullable=True),
+    Column("version", Integer, nullable=False),
+    Column("updated_at", DateTime, nullable=True),
+)
+
+
+def upgrade(connection):
+    column_type = connection.dialect.type_compiler.process(DateTime())
+    connection.execute(text(f"ALTER TABLE books ADD COLUMN due_at {column_type}"))
+    if connection.dialect.name == "postgresql":
+        due = f"borrowed_at + interval '{BACKFILL_LOAN_DAYS} days'"
+    else:
+        due = f"datetime(borrowed_at, '+{BACKFILL_LOAN_DAYS} days')"
+    connection.execute(text(f"UPDATE books SET due_at = {due} WHERE is_borrowed AND borrowed_at IS NOT NULL"))
+    metadata.create_all(connection)
+
+
+def downgrade(connection):
+    metadata.drop_all(connection)
+    connection.execute(text("ALTER TABLE books DROP COLUMN due_at"))
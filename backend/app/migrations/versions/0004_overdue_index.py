@@ -0,0 +1,17 @@
+"""Partial index for overdue scans: borrowed books in (due_at, serial) order."""
+from app.migrations import create_index, drop_index
+
+revision = "0004"
+description = "books overdue partial index"
+transactional = False
+
+
+def upgrade(connection):
+    # Must match the predicate SQLAlchemy renders for `Book.is_borrowed == True`
+    # on each dialect, or the planner cannot use the partial index
+    predicate = "is_borrowed" if connection.dialect.name == "postgresql" else "is_borrowed = 1"
+    create_index(connection, "ix_books_overdue", "books", "due_at, serial", where=predicate)
+
+
+def downgrade(connection):
+    drop_index(connection, "ix_books_overdue")
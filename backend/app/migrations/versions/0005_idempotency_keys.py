@@ -0,0 +1,26 @@
+"""Add the idempotency_keys table (stored responses for Idempotency-Key replays)."""
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, MetaData, String, Table
+
+revision = "0005"
+description = "idempotency keys"
+
+metadata = MetaData()
+
+idempotency_keys = Table(
+    "idempotency_keys",
+    metadata,
+    Column("key", String(255), primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("status_code", Integer, nullable=True),
+    Column("body", LargeBinary, nullable=True),
+    Column("expires_at", DateTime, nullable=False),
+    Index("ix_idempotency_keys_expires_at", "expires_at"),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection)
+
+
+def downgrade(connection):
+    metadata.drop_all(connection)
@@ -0,0 +1,99 @@
+"""Change versions and tombstones for delta sync.
+
+Adds books.row_version (backfilled in serial order), the change_counters and
+book_tombstones tables, and the triggers that maintain them.
+"""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, text
+
+revision = "0006"
+description = "book change versions and tombstones"
+
+metadata = MetaData()
+
+change_counters = Table(
+    "change_counters",
+    metadata,
+    Column("name", String(64), primary_key=True),
+    Column("value", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+)
+
+book_tombstones = Table(
+    "book_tombstones",
+    metadata,
+    Column("serial", String(6), primary_key=True),
+    Column("row_version", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+    Column("deleted_at", DateTime, nullable=False),
+    Index("ix_book_tombstones_row_version", "row_version"),
+)
+
+POSTGRES_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION books_lock_change_counter() RETURNS trigger AS $$ BEGIN "
+    "PERFORM 1 FROM change_counters WHERE name = 'books' FOR UPDATE; RETURN NULL; "
+    "END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION books_next_row_version() RETURNS trigger AS $$ BEGIN "
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books' "
+    "RETURNING value INTO NEW.row_version; RETURN NEW; "
+    "END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION books_record_tombstone() RETURNS trigger AS $$ "
+    "DECLARE version BIGINT; BEGIN "
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books' RETURNING value INTO version; "
+    "INSERT INTO book_tombstones (serial, row_version, deleted_at) "
+    "VALUES (OLD.serial, version, now() AT TIME ZONE 'utc') "
+    "ON CONFLICT (serial) DO UPDATE SET row_version = EXCLUDED.row_version, deleted_at = EXCLUDED.deleted_at; "
+    "RETURN OLD; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_lock_change_counter BEFORE INSERT OR UPDATE OR DELETE ON books "
+    "FOR EACH STATEMENT EXECUTE FUNCTION books_lock_change_counter()",
+    "CREATE TRIGGER books_row_version BEFORE INSERT OR UPDATE ON books "
+    "FOR EACH ROW EXECUTE FUNCTION books_next_row_version()",
+    "CREATE TRIGGER books_tombstone AFTER DELETE ON books "
+    "FOR EACH ROW EXECUTE FUNCTION books_record_tombstone()",
+)
+
+_SQLITE_NEXT_ROW_VERSION = (
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books'; "
+    "UPDATE books SET row_version = (SELECT value FROM change_counters WHERE name = 'books') "
+    "WHERE rowid = new.rowid; END"
+)
+SQLITE_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS books_row_version_insert AFTER INSERT ON books BEGIN "
+    + _SQLITE_NEXT_ROW_VERSION,
+    "CREATE TRIGGER IF NOT EXISTS books_row_version_update AFTER UPDATE ON books "
+    "WHEN new.row_version IS old.row_version BEGIN " + _SQLITE_NEXT_ROW_VERSION,
+    "CREATE TRIGGER IF NOT EXISTS books_tombstone AFTER DELETE ON books BEGIN "
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books'; "
+    "INSERT OR REPLACE INTO book_tombstones (serial, row_version, deleted_at) "
+    "VALUES (old.serial, (SELECT value FROM change_counters WHERE name = 'books'), datetime('now')); END",
+)
+
+
+def upgrade(connection):
+    column_type = connection.dialect.type_compiler.process(BigInteger())
+    connection.execute(text(f"ALTER TABLE books ADD COLUMN row_version {column_type}"))
+    # Existing rows get versions 1..n in serial order
+    connection.execute(text(
+        "UPDATE books SET row_version = r.rn "
+        "FROM (SELECT serial, row_number() OVER (ORDER BY serial) AS rn FROM books) AS r "
+        "WHERE r.serial = books.serial"
+    ))
+    metadata.create_all(connection)
+    connection.execute(text(
+        "INSERT INTO change_counters (name, value) "
+        "SELECT 'books', coalesce(max(row_version), 0) FROM books"
+    ))
+    connection.execute(text("INSERT INTO change_counters (name, value) VALUES ('book_tombstones_pruned', 0)"))
+    statements = POSTGRES_TRIGGERS if connection.dialect.name == "postgresql" else SQLITE_TRIGGERS
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "postgresql":
+        for trigger in ("books_tombstone", "books_row_version", "books_lock_change_counter"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON books"))
+        for function in ("books_record_tombstone", "books_next_row_version", "books_lock_change_counter"):
+            connection.execute(text(f"DROP FUNCTION IF EXISTS {function}()"))
+    else:
+        for trigger in ("books_tombstone", "books_row_version_update", "books_row_version_insert"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    metadata.drop_all(connection)
+    connection.execute(text("ALTER TABLE books DROP COLUMN row_version"))
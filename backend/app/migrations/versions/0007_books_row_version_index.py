@@ -0,0 +1,14 @@
+"""Index for GET /books/changes: books in row_version order."""
+from app.migrations import create_index, drop_index
+
+revision = "0007"
+description = "books row_version index"
+transactional = False
+
+
+def upgrade(connection):
+    create_index(connection, "ix_books_row_version", "books", "row_version")
+
+
+def downgrade(connection):
+    drop_index(connection, "ix_books_row_version")
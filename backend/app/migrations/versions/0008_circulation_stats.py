@@ -0,0 +1,139 @@
+"""Circulation statistics maintained by triggers.
+
+Adds author_stats and daily_loan_stats plus the books_total/books_borrowed
+counters, creates the triggers that keep them current and backfills them
+from the existing rows.
+"""
+from sqlalchemy import Column, Date, Index, Integer, MetaData, String, Table, text
+
+revision = "0008"
+description = "circulation statistics"
+
+metadata = MetaData()
+
+author_stats = Table(
+    "author_stats",
+    metadata,
+    Column("author", String, primary_key=True),
+    Column("total", Integer, nullable=False),
+    Column("borrowed", Integer, nullable=False),
+    Index("ix_author_stats_total", "total"),
+)
+
+daily_loan_stats = Table(
+    "daily_loan_stats",
+    metadata,
+    Column("day", Date, primary_key=True),
+    Column("borrows", Integer, nullable=False),
+    Column("returns", Integer, nullable=False),
+)
+
+_POSTGRES_ADDED = "SELECT author, 1 AS total, CASE WHEN is_borrowed THEN 1 ELSE 0 END AS borrowed FROM new_rows"
+_POSTGRES_REMOVED = "SELECT author, -1, CASE WHEN is_borrowed THEN -1 ELSE 0 END FROM old_rows"
+
+
+def _postgres_book_delta(changes: str, emptied: str = "") -> str:
+    statement = (
+        f"WITH changes AS ({changes}), "
+        "delta AS (SELECT author, sum(total) AS total, sum(borrowed) AS borrowed FROM changes GROUP BY author), "
+        "totals AS (UPDATE change_counters SET value = value + CASE name "
+        "WHEN 'books_total' THEN (SELECT coalesce(sum(total), 0) FROM delta) "
+        "ELSE (SELECT coalesce(sum(borrowed), 0) FROM delta) END "
+        "WHERE name IN ('books_total', 'books_borrowed')) "
+        "INSERT INTO author_stats AS s (author, total, borrowed) "
+        "SELECT author, total, borrowed FROM delta WHERE total <> 0 OR borrowed <> 0 "
+        "ON CONFLICT (author) DO UPDATE SET total = s.total + EXCLUDED.total, borrowed = s.borrowed + EXCLUDED.borrowed; "
+    )
+    if emptied:
+        statement += f"DELETE FROM author_stats WHERE total <= 0 AND author IN (SELECT author FROM {emptied}); "
+    return statement
+
+
+POSTGRES_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION books_track_stats() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN " + _postgres_book_delta(_POSTGRES_ADDED)
+    + "ELSIF TG_OP = 'DELETE' THEN " + _postgres_book_delta(_POSTGRES_REMOVED, "old_rows")
+    + "ELSE " + _postgres_book_delta(f"{_POSTGRES_ADDED} UNION ALL {_POSTGRES_REMOVED}", "old_rows")
+    + "END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_stats_insert AFTER INSERT ON books "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_update AFTER UPDATE ON books "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_delete AFTER DELETE ON books "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE OR REPLACE FUNCTION loan_events_track_stats() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO daily_loan_stats AS s (day, borrows, returns) "
+    "SELECT CAST(occurred_at AS date), count(*) FILTER (WHERE action = 'borrow'), "
+    "count(*) FILTER (WHERE action = 'return') FROM new_rows GROUP BY 1 "
+    "ON CONFLICT (day) DO UPDATE SET borrows = s.borrows + EXCLUDED.borrows, returns = s.returns + EXCLUDED.returns; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER loan_events_stats AFTER INSERT ON loan_events "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loan_events_track_stats()",
+)
+
+_SQLITE_ADD = (
+    "INSERT INTO author_stats (author, total, borrowed) VALUES (new.author, 1, coalesce(new.is_borrowed, 0)) "
+    "ON CONFLICT (author) DO UPDATE SET total = total + 1, borrowed = borrowed + excluded.borrowed; "
+)
+_SQLITE_REMOVE = (
+    "UPDATE author_stats SET total = total - 1, borrowed = borrowed - coalesce(old.is_borrowed, 0) "
+    "WHERE author = old.author; "
+    "DELETE FROM author_stats WHERE author = old.author AND total <= 0; "
+)
+
+SQLITE_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS books_stats_insert AFTER INSERT ON books BEGIN " + _SQLITE_ADD
+    + "UPDATE change_counters SET value = value + CASE name WHEN 'books_total' THEN 1 "
+    "ELSE coalesce(new.is_borrowed, 0) END WHERE name IN ('books_total', 'books_borrowed'); END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_update AFTER UPDATE OF author, is_borrowed ON books BEGIN "
+    + _SQLITE_REMOVE + _SQLITE_ADD
+    + "UPDATE change_counters SET value = value + coalesce(new.is_borrowed, 0) - coalesce(old.is_borrowed, 0) "
+    "WHERE name = 'books_borrowed'; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_delete AFTER DELETE ON books BEGIN " + _SQLITE_REMOVE
+    + "UPDATE change_counters SET value = value - CASE name WHEN 'books_total' THEN 1 "
+    "ELSE coalesce(old.is_borrowed, 0) END WHERE name IN ('books_total', 'books_borrowed'); END",
+    "CREATE TRIGGER IF NOT EXISTS loan_events_stats AFTER INSERT ON loan_events BEGIN "
+    "INSERT INTO daily_loan_stats (day, borrows, returns) "
+    "VALUES (date(new.occurred_at), new.action = 'borrow', new.action = 'return') "
+    "ON CONFLICT (day) DO UPDATE SET borrows = borrows + excluded.borrows, returns = returns + excluded.returns; END",
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection)
+    postgres = connection.dialect.name == "postgresql"
+    # Triggers first: creating them locks out writers until this migration
+    # commits, so the backfill below cannot miss a concurrent change
+    for statement in POSTGRES_TRIGGERS if postgres else SQLITE_TRIGGERS:
+        connection.execute(text(statement))
+
+    borrowed = "CASE WHEN is_borrowed THEN 1 ELSE 0 END"
+    connection.execute(text(
+        "INSERT INTO change_counters (name, value) "
+        f"SELECT 'books_total', count(*) FROM books UNION ALL "
+        f"SELECT 'books_borrowed', coalesce(sum({borrowed}), 0) FROM books"
+    ))
+    connection.execute(text(
+        f"INSERT INTO author_stats (author, total, borrowed) "
+        f"SELECT author, count(*), sum({borrowed}) FROM books GROUP BY author"
+    ))
+    day = "CAST(occurred_at AS date)" if postgres else "date(occurred_at)"
+    connection.execute(text(
+        "INSERT INTO daily_loan_stats (day, borrows, returns) "
+        f"SELECT {day}, sum(CASE WHEN action = 'borrow' THEN 1 ELSE 0 END), "
+        f"sum(CASE WHEN action = 'return' THEN 1 ELSE 0 END) FROM loan_events GROUP BY {day}"
+    ))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text("DROP TRIGGER IF EXISTS loan_events_stats ON loan_events"))
+        for trigger in ("books_stats_delete", "books_stats_update", "books_stats_insert"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger} ON books"))
+        for function in ("loan_events_track_stats", "books_track_stats"):
+            connection.execute(text(f"DROP FUNCTION IF EXISTS {function}()"))
+    else:
+        for trigger in ("loan_events_stats", "books_stats_delete", "books_stats_update", "books_stats_insert"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    metadata.drop_all(connection)
+    connection.execute(text("DELETE FROM change_counters WHERE name IN ('books_total', 'books_borrowed')"))
@@ -0,0 +1,26 @@
+"""Hold queues for borrowed books."""
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, UniqueConstraint
+
+revision = "0009"
+description = "hold queues"
+
+metadata = MetaData()
+
+holds = Table(
+    "holds",
+    metadata,
+    Column("id", BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True),
+    Column("serial", String(6), nullable=False),
+    Column("card_number", String(6), nullable=False),
+    Column("placed_at", DateTime, nullable=False),
+    Index("ix_holds_serial_id", "serial", "id"),
+    UniqueConstraint("serial", "card_number", name="uq_holds_serial_card_number"),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection)
+
+
+def downgrade(connection):
+    metadata.drop_all(connection)
@@ -0,0 +1,277 @@
+"""Titles and authors normalized into works and authors.
+
+Creates one author per distinct name and one work per distinct (title,
+author), points every book at them through work_id/author_id and drops the
+books.title/author columns. The search index moves from books to works and
+author_stats is rekeyed by author_id.
+
+Every book row is rewritten in this one transaction, which holds an exclusive
+lock on books throughout. On PostgreSQL the dropped columns keep their space
+until the rows are rewritten again (VACUUM FULL books or pg_repack).
+"""
+import importlib
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, MetaData, String, Table, UniqueConstraint, text
+
+revision = "0010"
+description = "works and authors"
+
+# Statements of earlier revisions, recreated on downgrade
+_initial = importlib.import_module(f"{__package__}.0001_initial")
+_change_tracking = importlib.import_module(f"{__package__}.0006_book_change_tracking")
+_circulation_stats = importlib.import_module(f"{__package__}.0008_circulation_stats")
+
+metadata = MetaData()
+
+authors = Table(
+    "authors",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("name", String, nullable=False),
+    UniqueConstraint("name", name="uq_authors_name"),
+)
+
+works = Table(
+    "works",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("title", String, nullable=False),
+    Column("author_id", Integer, ForeignKey("authors.id"), nullable=False),
+    UniqueConstraint("author_id", "title", name="uq_works_author_id_title"),
+)
+
+author_stats = Table(
+    "author_stats",
+    metadata,
+    Column("author_id", Integer, ForeignKey("authors.id"), primary_key=True),
+    Column("total", Integer, nullable=False),
+    Column("borrowed", Integer, nullable=False),
+    Index("ix_author_stats_total", "total"),
+)
+
+SEARCH_DOCUMENT = "to_tsvector('simple', title || ' ' || author)"
+
+POSTGRES_SEARCH = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS works_search ("
+    "work_id INTEGER PRIMARY KEY REFERENCES works (id) ON DELETE CASCADE, "
+    "title VARCHAR NOT NULL, author VARCHAR NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS ix_works_search ON works_search USING gin ({SEARCH_DOCUMENT})",
+    "CREATE INDEX IF NOT EXISTS ix_works_search_title_trgm ON works_search USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_works_search_author_trgm ON works_search USING gin (author gin_trgm_ops)",
+    "CREATE OR REPLACE FUNCTION works_index_search() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO works_search (work_id, title, author) "
+    "SELECT new_rows.id, new_rows.title, authors.name FROM new_rows JOIN authors ON authors.id = new_rows.author_id; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER works_search_insert AFTER INSERT ON works "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION works_index_search()",
+)
+
+SQLITE_SEARCH = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(title, author, prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS works_fts_insert AFTER INSERT ON works BEGIN "
+    "INSERT INTO works_fts(rowid, title, author) "
+    "VALUES (new.id, new.title, (SELECT name FROM authors WHERE id = new.author_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS works_fts_delete AFTER DELETE ON works BEGIN "
+    "DELETE FROM works_fts WHERE rowid = old.id; END",
+)
+
+POSTGRES_OLD_SEARCH_INDEXES = (
+    f"CREATE INDEX ix_books_search ON books USING gin ({SEARCH_DOCUMENT})",
+    "CREATE INDEX ix_books_title_trgm ON books USING gin (title gin_trgm_ops)",
+    "CREATE INDEX ix_books_author_trgm ON books USING gin (author gin_trgm_ops)",
+)
+
+_POSTGRES_ADDED = "SELECT author_id, 1 AS total, CASE WHEN is_borrowed THEN 1 ELSE 0 END AS borrowed FROM new_rows"
+_POSTGRES_REMOVED = "SELECT author_id, -1, CASE WHEN is_borrowed THEN -1 ELSE 0 END FROM old_rows"
+
+
+def _postgres_book_delta(changes: str, emptied: str = "") -> str:
+    statement = (
+        f"WITH changes AS ({changes}), "
+        "delta AS (SELECT author_id, sum(total) AS total, sum(borrowed) AS borrowed FROM changes GROUP BY author_id), "
+        "totals AS (UPDATE change_counters SET value = value + CASE name "
+        "WHEN 'books_total' THEN (SELECT coalesce(sum(total), 0) FROM delta) "
+        "ELSE (SELECT coalesce(sum(borrowed), 0) FROM delta) END "
+        "WHERE name IN ('books_total', 'books_borrowed')) "
+        "INSERT INTO author_stats AS s (author_id, total, borrowed) "
+        "SELECT author_id, total, borrowed FROM delta WHERE total <> 0 OR borrowed <> 0 "
+        "ON CONFLICT (author_id) DO UPDATE SET total = s.total + EXCLUDED.total, borrowed = s.borrowed + EXCLUDED.borrowed; "
+    )
+    if emptied:
+        statement += f"DELETE FROM author_stats WHERE total <= 0 AND author_id IN (SELECT author_id FROM {emptied}); "
+    return statement
+
+
+POSTGRES_STATS_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION books_track_stats() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN " + _postgres_book_delta(_POSTGRES_ADDED)
+    + "ELSIF TG_OP = 'DELETE' THEN " + _postgres_book_delta(_POSTGRES_REMOVED, "old_rows")
+    + "ELSE " + _postgres_book_delta(f"{_POSTGRES_ADDED} UNION ALL {_POSTGRES_REMOVED}", "old_rows")
+    + "END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_stats_insert AFTER INSERT ON books "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_update AFTER UPDATE ON books "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_delete AFTER DELETE ON books "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+)
+
+_SQLITE_ADD = (
+    "INSERT INTO author_stats (author_id, total, borrowed) VALUES (new.author_id, 1, coalesce(new.is_borrowed, 0)) "
+    "ON CONFLICT (author_id) DO UPDATE SET total = total + 1, borrowed = borrowed + excluded.borrowed; "
+)
+_SQLITE_REMOVE = (
+    "UPDATE author_stats SET total = total - 1, borrowed = borrowed - coalesce(old.is_borrowed, 0) "
+    "WHERE author_id = old.author_id; "
+    "DELETE FROM author_stats WHERE author_id = old.author_id AND total <= 0; "
+)
+
+SQLITE_STATS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS books_stats_insert AFTER INSERT ON books BEGIN " + _SQLITE_ADD
+    + "UPDATE change_counters SET value = value + CASE name WHEN 'books_total' THEN 1 "
+    "ELSE coalesce(new.is_borrowed, 0) END WHERE name IN ('books_total', 'books_borrowed'); END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_update AFTER UPDATE OF author_id, is_borrowed ON books BEGIN "
+    + _SQLITE_REMOVE + _SQLITE_ADD
+    + "UPDATE change_counters SET value = value + coalesce(new.is_borrowed, 0) - coalesce(old.is_borrowed, 0) "
+    "WHERE name = 'books_borrowed'; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_delete AFTER DELETE ON books BEGIN " + _SQLITE_REMOVE
+    + "UPDATE change_counters SET value = value - CASE name WHEN 'books_total' THEN 1 "
+    "ELSE coalesce(old.is_borrowed, 0) END WHERE name IN ('books_total', 'books_borrowed'); END",
+)
+
+STATS_TRIGGERS = ("books_stats_insert", "books_stats_update", "books_stats_delete")
+# The books_row_version_update trigger of 0006, dropped while rows are backfilled on SQLite
+SQLITE_ROW_VERSION_UPDATE = _change_tracking.SQLITE_TRIGGERS[1]
+BORROWED = "CASE WHEN is_borrowed THEN 1 ELSE 0 END"
+
+
+def _drop_stats_triggers(connection, postgres: bool):
+    for trigger in STATS_TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}{' ON books' if postgres else ''}"))
+
+
+def _rewrite_books(connection, postgres: bool, added: str, backfill: str, dropped: str):
+    """Add the `added` columns, fill them and drop the `dropped` ones.
+
+    Row versions are left alone: the books look the same to sync clients.
+    """
+    if postgres:
+        connection.execute(text(f"ALTER TABLE books {added}"))
+        connection.execute(text("ALTER TABLE books DISABLE TRIGGER books_row_version"))
+        connection.execute(text(backfill))
+        connection.execute(text("ALTER TABLE books ENABLE TRIGGER books_row_version"))
+        connection.execute(text(f"ALTER TABLE books {dropped}"))
+        return
+    # SQLite adds and drops one column per statement
+    connection.execute(text("DROP TRIGGER IF EXISTS books_row_version_update"))
+    for clause in added.split(", "):
+        connection.execute(text(f"ALTER TABLE books {clause}"))
+    connection.execute(text(backfill))
+    connection.execute(text(SQLITE_ROW_VERSION_UPDATE))
+    for clause in dropped.split(", "):
+        connection.execute(text(f"ALTER TABLE books {clause}"))
+
+
+def upgrade(connection):
+    postgres = connection.dialect.name == "postgresql"
+    authors.create(connection)
+    works.create(connection)
+    # The search trigger indexes the works as they are backfilled
+    for statement in POSTGRES_SEARCH if postgres else SQLITE_SEARCH:
+        connection.execute(text(statement))
+    connection.execute(text("INSERT INTO authors (name) SELECT DISTINCT author FROM books ORDER BY author"))
+    connection.execute(text(
+        "INSERT INTO works (title, author_id) "
+        "SELECT DISTINCT books.title, authors.id FROM books JOIN authors ON authors.name = books.author "
+        "ORDER BY authors.id, books.title"
+    ))
+
+    _drop_stats_triggers(connection, postgres)
+    if postgres:
+        for index in ("ix_books_search", "ix_books_title_trgm", "ix_books_author_trgm", "ix_books_author_serial"):
+            connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        _rewrite_books(
+            connection, postgres,
+            "ADD COLUMN work_id INTEGER REFERENCES works (id), ADD COLUMN author_id INTEGER REFERENCES authors (id)",
+            "UPDATE books SET work_id = works.id, author_id = works.author_id "
+            "FROM works JOIN authors ON authors.id = works.author_id "
+            "WHERE authors.name = books.author AND works.title = books.title",
+            "ALTER COLUMN work_id SET NOT NULL, ALTER COLUMN author_id SET NOT NULL, "
+            "DROP COLUMN title, DROP COLUMN author",
+        )
+    else:
+        for trigger in ("books_fts_insert", "books_fts_delete", "books_fts_update"):
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        connection.execute(text("DROP TABLE IF EXISTS books_fts"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_books_author_serial"))
+        # SQLite can add neither NOT NULL nor foreign key columns to a filled
+        # table (and could not drop the latter again on downgrade)
+        _rewrite_books(
+            connection, postgres,
+            "ADD COLUMN work_id INTEGER, ADD COLUMN author_id INTEGER",
+            "UPDATE books SET (work_id, author_id) = ("
+            "SELECT works.id, works.author_id FROM works JOIN authors ON authors.id = works.author_id "
+            "WHERE authors.name = books.author AND works.title = books.title)",
+            "DROP COLUMN title, DROP COLUMN author",
+        )
+    connection.execute(text("CREATE INDEX ix_books_author_id_serial ON books (author_id, serial)"))
+    connection.execute(text("CREATE INDEX ix_books_work_id ON books (work_id)"))
+
+    connection.execute(text("DROP TABLE author_stats"))
+    author_stats.create(connection)
+    connection.execute(text(
+        f"INSERT INTO author_stats (author_id, total, borrowed) "
+        f"SELECT author_id, count(*), sum({BORROWED}) FROM books GROUP BY author_id"
+    ))
+    for statement in POSTGRES_STATS_TRIGGERS if postgres else SQLITE_STATS_TRIGGERS:
+        connection.execute(text(statement))
+
+
+def downgrade(connection):
+    postgres = connection.dialect.name == "postgresql"
+    _drop_stats_triggers(connection, postgres)
+    author_stats.drop(connection)
+    connection.execute(text("DROP INDEX IF EXISTS ix_books_work_id"))
+    connection.execute(text("DROP INDEX IF EXISTS ix_books_author_id_serial"))
+
+    if postgres:
+        _rewrite_books(
+            connection, postgres,
+            "ADD COLUMN title VARCHAR, ADD COLUMN author VARCHAR",
+            "UPDATE books SET title = works.title, author = authors.name "
+            "FROM works JOIN authors ON authors.id = works.author_id WHERE works.id = books.work_id",
+            "ALTER COLUMN title SET NOT NULL, ALTER COLUMN author SET NOT NULL, "
+            "DROP COLUMN work_id, DROP COLUMN author_id",
+        )
+        connection.execute(text("DROP TABLE IF EXISTS works_search"))
+        connection.execute(text("DROP TRIGGER IF EXISTS works_search_insert ON works"))
+        connection.execute(text("DROP FUNCTION IF EXISTS works_index_search()"))
+        for statement in POSTGRES_OLD_SEARCH_INDEXES:
+            connection.execute(text(statement))
+    else:
+        _rewrite_books(
+            connection, postgres,
+            "ADD COLUMN title VARCHAR, ADD COLUMN author VARCHAR",
+            "UPDATE books SET (title, author) = ("
+            "SELECT works.title, authors.name FROM works JOIN authors ON authors.id = works.author_id "
+            "WHERE works.id = books.work_id)",
+            "DROP COLUMN work_id, DROP COLUMN author_id",
+        )
+        connection.execute(text("DROP TABLE IF EXISTS works_fts"))
+        for statement in _initial.SQLITE_FTS:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO books_fts(books_fts) VALUES ('rebuild')"))
+    connection.execute(text("CREATE INDEX ix_books_author_serial ON books (author, serial)"))
+    works.drop(connection)
+    authors.drop(connection)
+
+    _circulation_stats.author_stats.create(connection)
+    connection.execute(text(
+        f"INSERT INTO author_stats (author, total, borrowed) "
+        f"SELECT author, count(*), sum({BORROWED}) FROM books GROUP BY author"
+    ))
+    # The books triggers of 0008; its loan_events trigger was never dropped
+    books_triggers = _circulation_stats.POSTGRES_TRIGGERS[:4] if postgres else _circulation_stats.SQLITE_TRIGGERS[:3]
+    for statement in books_triggers:
+        connection.execute(text(statement))
@@ -0,0 +1,189 @@
+"""Sharded circulation counters.
+
+Moves books_total/books_borrowed from change_counters to circulation_counters
+and adds a shard to daily_loan_stats. On PostgreSQL the triggers add to the
+shard of their backend process, so concurrent writers no longer queue on one
+counter row (or on today's row) until they commit; deltas that sum to zero
+are not written at all. SQLite keeps everything in shard 0.
+"""
+import importlib
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, text
+
+revision = "0011"
+description = "sharded circulation counters"
+
+# Statements of earlier revisions, recreated on downgrade
+_circulation_stats = importlib.import_module(f"{__package__}.0008_circulation_stats")
+_works = importlib.import_module(f"{__package__}.0010_works")
+
+metadata = MetaData()
+
+circulation_counters = Table(
+    "circulation_counters",
+    metadata,
+    Column("name", String(64), primary_key=True),
+    Column("shard", Integer, primary_key=True),
+    Column("value", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+)
+
+SHARD = "pg_backend_pid() % 16"
+
+_POSTGRES_ADDED = "SELECT author_id, 1 AS total, CASE WHEN is_borrowed THEN 1 ELSE 0 END AS borrowed FROM new_rows"
+_POSTGRES_REMOVED = "SELECT author_id, -1, CASE WHEN is_borrowed THEN -1 ELSE 0 END FROM old_rows"
+
+
+def _postgres_book_delta(changes: str, emptied: str = "") -> str:
+    statement = (
+        f"WITH changes AS ({changes}), "
+        "delta AS (SELECT author_id, sum(total) AS total, sum(borrowed) AS borrowed FROM changes GROUP BY author_id), "
+        "totals AS (INSERT INTO circulation_counters AS c (name, shard, value) "
+        f"SELECT name, {SHARD}, value FROM (VALUES "
+        "('books_total', (SELECT sum(total) FROM delta)), ('books_borrowed', (SELECT sum(borrowed) FROM delta))"
+        ") AS t (name, value) WHERE value <> 0 "
+        "ON CONFLICT (name, shard) DO UPDATE SET value = c.value + EXCLUDED.value) "
+        "INSERT INTO author_stats AS s (author_id, total, borrowed) "
+        "SELECT author_id, total, borrowed FROM delta WHERE total <> 0 OR borrowed <> 0 "
+        "ON CONFLICT (author_id) DO UPDATE SET total = s.total + EXCLUDED.total, borrowed = s.borrowed + EXCLUDED.borrowed; "
+    )
+    if emptied:
+        statement += f"DELETE FROM author_stats WHERE total <= 0 AND author_id IN (SELECT author_id FROM {emptied}); "
+    return statement
+
+
+POSTGRES_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION books_track_stats() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN " + _postgres_book_delta(_POSTGRES_ADDED)
+    + "ELSIF TG_OP = 'DELETE' THEN " + _postgres_book_delta(_POSTGRES_REMOVED, "old_rows")
+    + "ELSE " + _postgres_book_delta(f"{_POSTGRES_ADDED} UNION ALL {_POSTGRES_REMOVED}", "old_rows")
+    + "END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_stats_insert AFTER INSERT ON books "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_update AFTER UPDATE ON books "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_delete AFTER DELETE ON books "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE OR REPLACE FUNCTION loan_events_track_stats() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO daily_loan_stats AS s (day, shard, borrows, returns) "
+    f"SELECT CAST(occurred_at AS date), {SHARD}, count(*) FILTER (WHERE action = 'borrow'), "
+    "count(*) FILTER (WHERE action = 'return') FROM new_rows GROUP BY 1, 2 "
+    "ON CONFLICT (day, shard) DO UPDATE SET borrows = s.borrows + EXCLUDED.borrows, returns = s.returns + EXCLUDED.returns; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER loan_events_stats AFTER INSERT ON loan_events "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loan_events_track_stats()",
+)
+
+_SQLITE_ADD = (
+    "INSERT INTO author_stats (author_id, total, borrowed) VALUES (new.author_id, 1, coalesce(new.is_borrowed, 0)) "
+    "ON CONFLICT (author_id) DO UPDATE SET total = total + 1, borrowed = borrowed + excluded.borrowed; "
+)
+_SQLITE_REMOVE = (
+    "UPDATE author_stats SET total = total - 1, borrowed = borrowed - coalesce(old.is_borrowed, 0) "
+    "WHERE author_id = old.author_id; "
+    "DELETE FROM author_stats WHERE author_id = old.author_id AND total <= 0; "
+)
+
+SQLITE_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS books_stats_insert AFTER INSERT ON books BEGIN " + _SQLITE_ADD
+    + "UPDATE circulation_counters SET value = value + 1 WHERE name = 'books_total' AND shard = 0; "
+    "UPDATE circulation_counters SET value = value + 1 WHERE name = 'books_borrowed' AND shard = 0 "
+    "AND new.is_borrowed; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_update AFTER UPDATE OF author_id, is_borrowed ON books BEGIN "
+    + _SQLITE_REMOVE + _SQLITE_ADD
+    + "UPDATE circulation_counters SET value = value + coalesce(new.is_borrowed, 0) - coalesce(old.is_borrowed, 0) "
+    "WHERE name = 'books_borrowed' AND shard = 0 AND new.is_borrowed IS NOT old.is_borrowed; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_delete AFTER DELETE ON books BEGIN " + _SQLITE_REMOVE
+    + "UPDATE circulation_counters SET value = value - 1 WHERE name = 'books_total' AND shard = 0; "
+    "UPDATE circulation_counters SET value = value - 1 WHERE name = 'books_borrowed' AND shard = 0 "
+    "AND old.is_borrowed; END",
+    "CREATE TRIGGER IF NOT EXISTS loan_events_stats AFTER INSERT ON loan_events BEGIN "
+    "INSERT INTO daily_loan_stats (day, shard, borrows, returns) "
+    "VALUES (date(new.occurred_at), 0, new.action = 'borrow', new.action = 'return') "
+    "ON CONFLICT (day, shard) DO UPDATE SET borrows = borrows + excluded.borrows, returns = returns + excluded.returns; END",
+)
+
+TRIGGERS = ("books_stats_insert", "books_stats_update", "books_stats_delete", "loan_events_stats")
+TOTALS = "name IN ('books_total', 'books_borrowed')"
+
+
+def _drop_triggers(connection, postgres: bool):
+    for trigger in TRIGGERS:
+        table = " ON loan_events" if trigger.startswith("loan_events") else " ON books"
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}{table if postgres else ''}"))
+
+
+def _rebuild_sqlite_daily_loan_stats(connection, sharded: bool):
+    """SQLite cannot change a primary key in place: copy into a new table"""
+    key = "day, shard" if sharded else "day"
+    connection.execute(text(
+        f"CREATE TABLE daily_loan_stats_new (day DATE NOT NULL, {'shard INTEGER NOT NULL, ' if sharded else ''}"
+        f"borrows INTEGER NOT NULL, returns INTEGER NOT NULL, PRIMARY KEY ({key}))"
+    ))
+    connection.execute(text(
+        f"INSERT INTO daily_loan_stats_new ({key}, borrows, returns) "
+        f"SELECT {'day, 0' if sharded else 'day'}, sum(borrows), sum(returns) FROM daily_loan_stats GROUP BY day"
+    ))
+    connection.execute(text("DROP TABLE daily_loan_stats"))
+    connection.execute(text("ALTER TABLE daily_loan_stats_new RENAME TO daily_loan_stats"))
+
+
+def upgrade(connection):
+    postgres = connection.dialect.name == "postgresql"
+    _drop_triggers(connection, postgres)
+
+    circulation_counters.create(connection)
+    connection.execute(text(
+        f"INSERT INTO circulation_counters (name, shard, value) SELECT name, 0, value FROM change_counters WHERE {TOTALS}"
+    ))
+    connection.execute(text(f"DELETE FROM change_counters WHERE {TOTALS}"))
+
+    if postgres:
+        connection.execute(text("ALTER TABLE daily_loan_stats ADD COLUMN shard INTEGER NOT NULL DEFAULT 0"))
+        connection.execute(text("ALTER TABLE daily_loan_stats ALTER COLUMN shard DROP DEFAULT"))
+        connection.execute(text(
+            "ALTER TABLE daily_loan_stats DROP CONSTRAINT daily_loan_stats_pkey, ADD PRIMARY KEY (day, shard)"
+        ))
+    else:
+        _rebuild_sqlite_daily_loan_stats(connection, sharded=True)
+
+    for statement in POSTGRES_TRIGGERS if postgres else SQLITE_TRIGGERS:
+        connection.execute(text(statement))
+
+
+def downgrade(connection):
+    postgres = connection.dialect.name == "postgresql"
+    _drop_triggers(connection, postgres)
+
+    if postgres:
+        connection.execute(text(
+            "UPDATE daily_loan_stats SET borrows = t.borrows, returns = t.returns "
+            "FROM (SELECT day, sum(borrows) AS borrows, sum(returns) AS returns FROM daily_loan_stats GROUP BY day) t "
+            "WHERE t.day = daily_loan_stats.day AND daily_loan_stats.shard = 0"
+        ))
+        # Days first counted by another shard get their shard 0 row first
+        connection.execute(text(
+            "INSERT INTO daily_loan_stats (day, shard, borrows, returns) "
+            "SELECT day, 0, sum(borrows), sum(returns) FROM daily_loan_stats GROUP BY day "
+            "HAVING min(shard) > 0"
+        ))
+        connection.execute(text("DELETE FROM daily_loan_stats WHERE shard <> 0"))
+        connection.execute(text(
+            "ALTER TABLE daily_loan_stats DROP CONSTRAINT daily_loan_stats_pkey, ADD PRIMARY KEY (day)"
+        ))
+        connection.execute(text("ALTER TABLE daily_loan_stats DROP COLUMN shard"))
+    else:
+        _rebuild_sqlite_daily_loan_stats(connection, sharded=False)
+
+    connection.execute(text(
+        "INSERT INTO change_counters (name, value) "
+        f"SELECT name, sum(value) FROM circulation_counters WHERE {TOTALS} GROUP BY name"
+    ))
+    circulation_counters.drop(connection)
+
+    # The books triggers of 0010 and the loan_events trigger of 0008
+    if postgres:
+        statements = _works.POSTGRES_STATS_TRIGGERS + _circulation_stats.POSTGRES_TRIGGERS[4:]
+    else:
+        statements = _works.SQLITE_STATS_TRIGGERS + _circulation_stats.SQLITE_TRIGGERS[3:]
+    for statement in statements:
+        connection.execute(text(statement))
@@ -0,0 +1,68 @@
+"""Book change versions from a sequence.
+
+On PostgreSQL row versions come from books_row_version_seq instead of the
+locked 'books' change counter, so concurrent writers no longer serialize on
+it. books and book_tombstones gain version_horizon, which lets the change
+feed stop short of versions that could still commit late. SQLite keeps its
+counter and only gets the (unused) columns.
+"""
+import importlib
+
+from sqlalchemy import text
+
+revision = "0012"
+description = "books row version sequence"
+
+# Statements of earlier revisions, recreated on downgrade
+_change_tracking = importlib.import_module(f"{__package__}.0006_book_change_tracking")
+
+_POSTGRES_NEXT_VERSION = (
+    "PERFORM pg_current_xact_id(); "
+    "{version} := nextval('books_row_version_seq'); "
+    "{horizon} := CAST(CAST(pg_snapshot_xmax(pg_current_snapshot()) AS text) AS bigint); "
+)
+POSTGRES_FUNCTIONS = (
+    "CREATE OR REPLACE FUNCTION books_next_row_version() RETURNS trigger AS $$ BEGIN "
+    + _POSTGRES_NEXT_VERSION.format(version="NEW.row_version", horizon="NEW.version_horizon")
+    + "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION books_record_tombstone() RETURNS trigger AS $$ "
+    "DECLARE version BIGINT; horizon BIGINT; BEGIN "
+    + _POSTGRES_NEXT_VERSION.format(version="version", horizon="horizon")
+    + "INSERT INTO book_tombstones (serial, row_version, version_horizon, deleted_at) "
+    "VALUES (OLD.serial, version, horizon, now() AT TIME ZONE 'utc') "
+    "ON CONFLICT (serial) DO UPDATE SET row_version = EXCLUDED.row_version, "
+    "version_horizon = EXCLUDED.version_horizon, deleted_at = EXCLUDED.deleted_at; "
+    "RETURN OLD; END $$ LANGUAGE plpgsql",
+)
+
+
+def upgrade(connection):
+    for table in ("books", "book_tombstones"):
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN version_horizon BIGINT"))
+    if connection.dialect.name != "postgresql":
+        return
+
+    connection.execute(text("CREATE SEQUENCE books_row_version_seq"))
+    connection.execute(text(
+        "SELECT setval('books_row_version_seq', greatest(value, 1), value > 0) "
+        "FROM change_counters WHERE name = 'books'"
+    ))
+    for statement in POSTGRES_FUNCTIONS:
+        connection.execute(text(statement))
+    connection.execute(text("DROP TRIGGER books_lock_change_counter ON books"))
+    connection.execute(text("DROP FUNCTION books_lock_change_counter()"))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            "UPDATE change_counters SET value = greatest(value, "
+            "(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM books_row_version_seq)) "
+            "WHERE name = 'books'"
+        ))
+        # The lock function and trigger, and the counter-based functions, of 0006
+        for statement in _change_tracking.POSTGRES_TRIGGERS[:4]:
+            connection.execute(text(statement))
+        connection.execute(text("DROP SEQUENCE books_row_version_seq"))
+    for table in ("book_tombstones", "books"):
+        connection.execute(text(f"ALTER TABLE {table} DROP COLUMN version_horizon"))
@@ -1,5 +1,26 @@
 # Modele danych SQLAlchemy
 
 from app.models.book import Book
+from app.models.book_tombstone import BookTombstone
+from app.models.change_counter import ChangeCounter
+from app.models.circulation_stats import AuthorStats, CirculationCounter, DailyLoanStats
+from app.models.hold import Hold
+from app.models.idempotency_key import IdempotencyKey
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.loan_event import LoanEvent
+from app.models.work import Author, Work
 
-__all__ = ["Book"]
+__all__ = [
+    "Author",
+    "AuthorStats",
+    "Book",
+    "BookTombstone",
+    "ChangeCounter",
+    "CirculationCounter",
+    "DailyLoanStats",
+    "Hold",
+    "IdempotencyKey",
+    "JobCheckpoint",
+    "LoanEvent",
+    "Work",
+]
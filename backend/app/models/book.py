@@ -1,15 +1,121 @@
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    FetchedValue,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    event,
+    text,
+)
+from sqlalchemy.orm import relationship
+
 from app.db import Base
+from app.models.work import Work
+
 
 class Book(Base):
+    """A physical copy; its title and author are stored once, in works and authors"""
+
     __tablename__ = "books"
 
     serial = Column(String(6), primary_key=True, index=True)
-    title = Column(String, nullable=False)
-    author = Column(String, nullable=False)
+    work_id = Column(Integer, ForeignKey("works.id"), nullable=False)
+    # The work's author, repeated here so the author filter is one index range
+    author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
     is_borrowed = Column(Boolean, default=False)
     borrowed_by = Column(String(6), nullable=True)
     borrowed_at = Column(DateTime, nullable=True)
+    due_at = Column(DateTime, nullable=True)
+    # Change version for delta sync, assigned by triggers on every insert/update
+    row_version = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=True,
+                         server_default=FetchedValue(), server_onupdate=FetchedValue())
+    # PostgreSQL: next transaction id when row_version was drawn (see app.services.sync)
+    version_horizon = Column(BigInteger, nullable=True,
+                             server_default=FetchedValue(), server_onupdate=FetchedValue())
+
+    work = relationship(Work, lazy="joined", innerjoin=True)
+
+    __table_args__ = (
+        # GET /books/changes scans in version order
+        Index("ix_books_row_version", "row_version"),
+        # Filtered list scans in serial (keyset) order
+        Index("ix_books_author_id_serial", "author_id", "serial"),
+        Index("ix_books_borrowed_by_serial", "borrowed_by", "serial",
+              postgresql_where=text("borrowed_by IS NOT NULL"),
+              sqlite_where=text("borrowed_by IS NOT NULL")),
+        # Overdue loans in (due_at, serial) keyset order; only borrowed books are indexed
+        Index("ix_books_overdue", "due_at", "serial",
+              postgresql_where=text("is_borrowed"),
+              sqlite_where=text("is_borrowed = 1")),
+        # Search results are joined from works to their copies
+        Index("ix_books_work_id", "work_id"),
+    )
+
+    @property
+    def title(self) -> str:
+        return self.work.title
+
+    @property
+    def author(self) -> str:
+        return self.work.author.name
 
     def __repr__(self):
-        return f"<Book(serial={self.serial}, title={self.title}, author={self.author})>"
\ No newline at end of file
+        return f"<Book(serial={self.serial}, work_id={self.work_id}, author_id={self.author_id})>"
+
+
+# Change versions and tombstones for delta sync. PostgreSQL draws versions from
+# a sequence, so concurrent writers do not wait on each other; they may then
+# commit out of version order, which version_horizon lets readers account for.
+# Taking a transaction id first means every version a transaction draws is
+# newer than the horizons of rows written before that id was assigned.
+_POSTGRES_NEXT_VERSION = (
+    "PERFORM pg_current_xact_id(); "
+    "{version} := nextval('books_row_version_seq'); "
+    "{horizon} := CAST(CAST(pg_snapshot_xmax(pg_current_snapshot()) AS text) AS bigint); "
+)
+POSTGRES_CHANGE_TRACKING = (
+    "CREATE SEQUENCE IF NOT EXISTS books_row_version_seq",
+    "CREATE OR REPLACE FUNCTION books_next_row_version() RETURNS trigger AS $$ BEGIN "
+    + _POSTGRES_NEXT_VERSION.format(version="NEW.row_version", horizon="NEW.version_horizon")
+    + "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION books_record_tombstone() RETURNS trigger AS $$ "
+    "DECLARE version BIGINT; horizon BIGINT; BEGIN "
+    + _POSTGRES_NEXT_VERSION.format(version="version", horizon="horizon")
+    + "INSERT INTO book_tombstones (serial, row_version, version_horizon, deleted_at) "
+    "VALUES (OLD.serial, version, horizon, now() AT TIME ZONE 'utc') "
+    "ON CONFLICT (serial) DO UPDATE SET row_version = EXCLUDED.row_version, "
+    "version_horizon = EXCLUDED.version_horizon, deleted_at = EXCLUDED.deleted_at; "
+    "RETURN OLD; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_row_version BEFORE INSERT OR UPDATE ON books "
+    "FOR EACH ROW EXECUTE FUNCTION books_next_row_version()",
+    "CREATE TRIGGER books_tombstone AFTER DELETE ON books "
+    "FOR EACH ROW EXECUTE FUNCTION books_record_tombstone()",
+)
+
+# SQLite has a single writer: the books change counter (see ChangeCounter) is enough
+_SQLITE_NEXT_ROW_VERSION = (
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books'; "
+    "UPDATE books SET row_version = (SELECT value FROM change_counters WHERE name = 'books') "
+    "WHERE rowid = new.rowid; END"
+)
+SQLITE_CHANGE_TRACKING = (
+    "CREATE TRIGGER IF NOT EXISTS books_row_version_insert AFTER INSERT ON books BEGIN "
+    + _SQLITE_NEXT_ROW_VERSION,
+    # The WHEN clause skips the trigger's own row_version update
+    "CREATE TRIGGER IF NOT EXISTS books_row_version_update AFTER UPDATE ON books "
+    "WHEN new.row_version IS old.row_version BEGIN " + _SQLITE_NEXT_ROW_VERSION,
+    "CREATE TRIGGER IF NOT EXISTS books_tombstone AFTER DELETE ON books BEGIN "
+    "UPDATE change_counters SET value = value + 1 WHERE name = 'books'; "
+    "INSERT OR REPLACE INTO book_tombstones (serial, row_version, deleted_at) "
+    "VALUES (old.serial, (SELECT value FROM change_counters WHERE name = 'books'), datetime('now')); END",
+)
+
+for statement in POSTGRES_CHANGE_TRACKING:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_CHANGE_TRACKING:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
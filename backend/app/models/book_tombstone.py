@@ -0,0 +1,26 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String
+
+from app.db import Base
+
+
+class BookTombstone(Base):
+    """Deleted book, kept so delta-sync clients learn about the deletion.
+
+    Written by a trigger on books; a serial deleted again later keeps only its
+    newest tombstone.
+    """
+
+    __tablename__ = "book_tombstones"
+
+    serial = Column(String(6), primary_key=True)
+    row_version = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    # See Book.version_horizon
+    version_horizon = Column(BigInteger, nullable=True)
+    deleted_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_book_tombstones_row_version", "row_version"),
+    )
+
+    def __repr__(self):
+        return f"<BookTombstone(serial={self.serial}, row_version={self.row_version})>"
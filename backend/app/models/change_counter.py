@@ -0,0 +1,29 @@
+from sqlalchemy import BigInteger, Column, Integer, String, event, insert
+
+from app.db import Base
+
+# Counter behind books.row_version and book_tombstones.row_version on SQLite
+# (PostgreSQL uses the books_row_version_seq sequence)
+BOOKS_CHANGE_COUNTER = "books"
+# Highest tombstone version pruned so far; clients syncing from below it must re-bootstrap
+TOMBSTONES_PRUNED_COUNTER = "book_tombstones_pruned"
+
+
+class ChangeCounter(Base):
+    """Named counters, maintained by database triggers or background jobs"""
+
+    __tablename__ = "change_counters"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ChangeCounter(name={self.name}, value={self.value})>"
+
+
+@event.listens_for(ChangeCounter.__table__, "after_create")
+def _seed_counters(target, connection, **kw):
+    connection.execute(insert(target), [
+        {"name": BOOKS_CHANGE_COUNTER, "value": 0},
+        {"name": TOMBSTONES_PRUNED_COUNTER, "value": 0},
+    ])
@@ -0,0 +1,163 @@
+from sqlalchemy import DDL, BigInteger, Column, Date, ForeignKey, Index, Integer, String, event, insert
+
+from app.db import Base
+from app.models.book import Book
+from app.models.loan_event import LoanEvent
+
+# Catalogue totals for GET /stats (see CirculationCounter)
+BOOKS_TOTAL_COUNTER = "books_total"
+BOOKS_BORROWED_COUNTER = "books_borrowed"
+
+# On PostgreSQL the triggers add to one of this many rows per counter (and per
+# day), picked by the backend process, so concurrent writers on different
+# connections do not queue on one row lock until commit. Readers sum the shards.
+COUNTER_SHARDS = 16
+
+
+class AuthorStats(Base):
+    """Books and borrowed books per author, maintained by triggers on books"""
+
+    __tablename__ = "author_stats"
+
+    author_id = Column(Integer, ForeignKey("authors.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    borrowed = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # GET /stats lists the authors with the most books
+        Index("ix_author_stats_total", "total"),
+    )
+
+    def __repr__(self):
+        return f"<AuthorStats(author_id={self.author_id}, total={self.total}, borrowed={self.borrowed})>"
+
+
+class CirculationCounter(Base):
+    """Sharded catalogue totals, maintained by triggers on books; a counter is the sum of its shards"""
+
+    __tablename__ = "circulation_counters"
+
+    name = Column(String(64), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    value = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CirculationCounter(name={self.name}, shard={self.shard}, value={self.value})>"
+
+
+class DailyLoanStats(Base):
+    """Borrows and returns per UTC day and shard, maintained by a trigger on loan_events"""
+
+    __tablename__ = "daily_loan_stats"
+
+    day = Column(Date, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    borrows = Column(Integer, nullable=False, default=0)
+    returns = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DailyLoanStats(day={self.day}, shard={self.shard}, borrows={self.borrows}, returns={self.returns})>"
+
+
+@event.listens_for(CirculationCounter.__table__, "after_create")
+def _seed_counters(target, connection, **kw):
+    connection.execute(insert(target), [
+        {"name": BOOKS_TOTAL_COUNTER, "shard": 0, "value": 0},
+        {"name": BOOKS_BORROWED_COUNTER, "shard": 0, "value": 0},
+    ])
+
+
+_POSTGRES_SHARD = f"pg_backend_pid() % {COUNTER_SHARDS}"
+
+
+def _postgres_book_delta(changes: str, emptied: str = "") -> str:
+    """Apply per-author (+total, +borrowed) rows from `changes` to author_stats and the totals"""
+    statement = (
+        f"WITH changes AS ({changes}), "
+        "delta AS (SELECT author_id, sum(total) AS total, sum(borrowed) AS borrowed FROM changes GROUP BY author_id), "
+        # Counters whose sum did not change (or empty transition tables) are not written
+        "totals AS (INSERT INTO circulation_counters AS c (name, shard, value) "
+        f"SELECT name, {_POSTGRES_SHARD}, value FROM (VALUES "
+        "('books_total', (SELECT sum(total) FROM delta)), ('books_borrowed', (SELECT sum(borrowed) FROM delta))"
+        ") AS t (name, value) WHERE value <> 0 "
+        "ON CONFLICT (name, shard) DO UPDATE SET value = c.value + EXCLUDED.value) "
+        "INSERT INTO author_stats AS s (author_id, total, borrowed) "
+        "SELECT author_id, total, borrowed FROM delta WHERE total <> 0 OR borrowed <> 0 "
+        "ON CONFLICT (author_id) DO UPDATE SET total = s.total + EXCLUDED.total, borrowed = s.borrowed + EXCLUDED.borrowed; "
+    )
+    if emptied:
+        statement += f"DELETE FROM author_stats WHERE total <= 0 AND author_id IN (SELECT author_id FROM {emptied}); "
+    return statement
+
+
+_POSTGRES_ADDED = "SELECT author_id, 1 AS total, CASE WHEN is_borrowed THEN 1 ELSE 0 END AS borrowed FROM new_rows"
+_POSTGRES_REMOVED = "SELECT author_id, -1, CASE WHEN is_borrowed THEN -1 ELSE 0 END FROM old_rows"
+
+# Statement-level with transition tables, so a bulk import or batch loan
+# touches each counter row once per statement rather than once per book
+POSTGRES_STATS_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION books_track_stats() RETURNS trigger AS $$ BEGIN "
+    "IF TG_OP = 'INSERT' THEN " + _postgres_book_delta(_POSTGRES_ADDED)
+    + "ELSIF TG_OP = 'DELETE' THEN " + _postgres_book_delta(_POSTGRES_REMOVED, "old_rows")
+    + "ELSE " + _postgres_book_delta(f"{_POSTGRES_ADDED} UNION ALL {_POSTGRES_REMOVED}", "old_rows")
+    + "END IF; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER books_stats_insert AFTER INSERT ON books "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_update AFTER UPDATE ON books "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+    "CREATE TRIGGER books_stats_delete AFTER DELETE ON books "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION books_track_stats()",
+)
+
+POSTGRES_LOAN_STATS_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION loan_events_track_stats() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO daily_loan_stats AS s (day, shard, borrows, returns) "
+    f"SELECT CAST(occurred_at AS date), {_POSTGRES_SHARD}, count(*) FILTER (WHERE action = 'borrow'), "
+    "count(*) FILTER (WHERE action = 'return') FROM new_rows GROUP BY 1, 2 "
+    "ON CONFLICT (day, shard) DO UPDATE SET borrows = s.borrows + EXCLUDED.borrows, returns = s.returns + EXCLUDED.returns; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER loan_events_stats AFTER INSERT ON loan_events "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION loan_events_track_stats()",
+)
+
+_SQLITE_ADD = (
+    "INSERT INTO author_stats (author_id, total, borrowed) VALUES (new.author_id, 1, coalesce(new.is_borrowed, 0)) "
+    "ON CONFLICT (author_id) DO UPDATE SET total = total + 1, borrowed = borrowed + excluded.borrowed; "
+)
+_SQLITE_REMOVE = (
+    "UPDATE author_stats SET total = total - 1, borrowed = borrowed - coalesce(old.is_borrowed, 0) "
+    "WHERE author_id = old.author_id; "
+    "DELETE FROM author_stats WHERE author_id = old.author_id AND total <= 0; "
+)
+
+# SQLite has a single writer, so its triggers only ever use shard 0
+SQLITE_STATS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS books_stats_insert AFTER INSERT ON books BEGIN " + _SQLITE_ADD
+    + "UPDATE circulation_counters SET value = value + 1 WHERE name = 'books_total' AND shard = 0; "
+    "UPDATE circulation_counters SET value = value + 1 WHERE name = 'books_borrowed' AND shard = 0 "
+    "AND new.is_borrowed; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_update AFTER UPDATE OF author_id, is_borrowed ON books BEGIN "
+    + _SQLITE_REMOVE + _SQLITE_ADD
+    + "UPDATE circulation_counters SET value = value + coalesce(new.is_borrowed, 0) - coalesce(old.is_borrowed, 0) "
+    "WHERE name = 'books_borrowed' AND shard = 0 AND new.is_borrowed IS NOT old.is_borrowed; END",
+    "CREATE TRIGGER IF NOT EXISTS books_stats_delete AFTER DELETE ON books BEGIN " + _SQLITE_REMOVE
+    + "UPDATE circulation_counters SET value = value - 1 WHERE name = 'books_total' AND shard = 0; "
+    "UPDATE circulation_counters SET value = value - 1 WHERE name = 'books_borrowed' AND shard = 0 "
+    "AND old.is_borrowed; END",
+)
+
+SQLITE_LOAN_STATS_TRIGGERS = (
+    "CREATE TRIGGER IF NOT EXISTS loan_events_stats AFTER INSERT ON loan_events BEGIN "
+    "INSERT INTO daily_loan_stats (day, shard, borrows, returns) "
+    "VALUES (date(new.occurred_at), 0, new.action = 'borrow', new.action = 'return') "
+    "ON CONFLICT (day, shard) DO UPDATE SET borrows = borrows + excluded.borrows, returns = returns + excluded.returns; END",
+)
+
+for statement in POSTGRES_STATS_TRIGGERS:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_STATS_TRIGGERS:
+    event.listen(Book.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_LOAN_STATS_TRIGGERS:
+    event.listen(LoanEvent.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_LOAN_STATS_TRIGGERS:
+    event.listen(LoanEvent.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
@@ -0,0 +1,27 @@
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, String, UniqueConstraint
+
+from app.db import Base
+
+
+class Hold(Base):
+    """A patron waiting for a borrowed copy.
+
+    A serial's queue is its holds in id order, so enqueueing is a plain INSERT
+    and the next in line is the first entry of ix_holds_serial_id.
+    """
+
+    __tablename__ = "holds"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    serial = Column(String(6), nullable=False)
+    card_number = Column(String(6), nullable=False)
+    placed_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_holds_serial_id", "serial", "id"),
+        # One place in a queue per patron
+        UniqueConstraint("serial", "card_number", name="uq_holds_serial_card_number"),
+    )
+
+    def __repr__(self):
+        return f"<Hold(id={self.id}, serial={self.serial}, card_number={self.card_number})>"
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, DateTime, Index, Integer, LargeBinary, String
+
+from app.db import Base
+
+
+class IdempotencyKey(Base):
+    """Stored response of a request made with an Idempotency-Key header.
+
+    A row with no status_code is a claim: the request is still executing on
+    some worker. Rows past expires_at are treated as absent and replaced.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey(key={self.key}, status_code={self.status_code})>"
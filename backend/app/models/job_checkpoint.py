@@ -0,0 +1,22 @@
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.db import Base
+
+
+class JobCheckpoint(Base):
+    """High-water mark of an incremental background job.
+
+    `version` is bumped on every advance so that workers running the same job
+    can claim a batch with a conditional UPDATE instead of a lock.
+    """
+
+    __tablename__ = "job_checkpoints"
+
+    name = Column(String(64), primary_key=True)
+    position_at = Column(DateTime, nullable=True)
+    position_key = Column(String(64), nullable=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<JobCheckpoint(name={self.name}, position_at={self.position_at}, position_key={self.position_key})>"
@@ -0,0 +1,100 @@
+from datetime import date, datetime
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    UniqueConstraint,
+    event,
+    text,
+)
+
+from app.db import Base
+
+# Monthly partitions created ahead of time on PostgreSQL
+LOAN_EVENT_PARTITIONS_AHEAD = 3
+
+
+class LoanEvent(Base):
+    """Append-only log of borrow/return operations"""
+
+    __tablename__ = "loan_events"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), nullable=False)
+    serial = Column(String(6), nullable=False)
+    card_number = Column(String(6), nullable=True)
+    action = Column(String(6), nullable=False)
+    occurred_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        # PostgreSQL range-partitions by month; a partitioned table's unique keys
+        # must include the partition column, so id alone is only the key on SQLite
+        PrimaryKeyConstraint("id", name="pk_loan_events").ddl_if(dialect="sqlite"),
+        UniqueConstraint("id", "occurred_at", name="uq_loan_events_id_occurred_at")
+        .ddl_if(dialect="postgresql"),
+        Index("ix_loan_events_serial_id", "serial", "id"),
+        Index("ix_loan_events_card_number_id", "card_number", "id"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+    def __repr__(self):
+        return f"<LoanEvent(id={self.id}, serial={self.serial}, action={self.action})>"
+
+
+def _month_start(year: int, month: int) -> date:
+    year, month = year + (month - 1) // 12, (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def ensure_loan_event_partitions(connection, months_ahead: int = LOAN_EVENT_PARTITIONS_AHEAD, today=None):
+    """Create the current and upcoming monthly partitions (PostgreSQL only).
+
+    Rows falling outside every monthly partition land in loan_events_default,
+    so inserts never fail if this maintenance is late. PostgreSQL refuses to
+    create a partition over rows the default one already holds, so those are
+    moved: the default partition is detached, the month created and filled
+    from it, and the default attached again. Run it in one transaction.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    today = today or datetime.utcnow().date()
+    # Every worker runs this periodically; let one at a time look and create
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext('loan_events_partitions'))"))
+    has_default = _exists(connection, "loan_events_default")
+    for offset in range(months_ahead + 1):
+        start = _month_start(today.year, today.month + offset)
+        end = _month_start(start.year, start.month + 1)
+        name = f"loan_events_{start:%Y_%m}"
+        if _exists(connection, name):
+            continue
+        in_range = f"occurred_at >= '{start.isoformat()}' AND occurred_at < '{end.isoformat()}'"
+        move = has_default and connection.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM loan_events_default WHERE {in_range})"
+        )).scalar()
+        if move:
+            connection.execute(text("ALTER TABLE loan_events DETACH PARTITION loan_events_default"))
+        connection.execute(text(
+            f"CREATE TABLE {name} PARTITION OF loan_events "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        ))
+        if move:
+            # Straight into the partition, so the statement triggers on
+            # loan_events do not count these events in the stats again
+            connection.execute(text(f"INSERT INTO {name} SELECT * FROM loan_events_default WHERE {in_range}"))
+            connection.execute(text(f"DELETE FROM loan_events_default WHERE {in_range}"))
+            connection.execute(text("ALTER TABLE loan_events ATTACH PARTITION loan_events_default DEFAULT"))
+    if not has_default:
+        connection.execute(text("CREATE TABLE loan_events_default PARTITION OF loan_events DEFAULT"))
+
+
+def _exists(connection, table: str) -> bool:
+    return connection.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
+
+
+@event.listens_for(LoanEvent.__table__, "after_create")
+def _create_initial_partitions(target, connection, **kw):
+    ensure_loan_event_partitions(connection)
@@ -0,0 +1,92 @@
+from sqlalchemy import DDL, Column, ForeignKey, Integer, String, UniqueConstraint, event
+from sqlalchemy.orm import relationship
+
+from app.db import Base
+
+# Full-text document for a work; the search query must repeat this expression
+# verbatim for PostgreSQL to use the GIN index built on it
+SEARCH_DOCUMENT = "to_tsvector('simple', title || ' ' || author)"
+
+
+class Author(Base):
+    """An author name, stored once however many books carry it"""
+
+    __tablename__ = "authors"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("name", name="uq_authors_name"),
+    )
+
+    def __repr__(self):
+        return f"<Author(id={self.id}, name={self.name})>"
+
+
+class Work(Base):
+    """A title by an author, shared by all physical copies of it.
+
+    Works and authors are only ever inserted: both are looked up by value when
+    books are created and are kept when their last copy is deleted.
+    """
+
+    __tablename__ = "works"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    title = Column(String, nullable=False)
+    author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
+
+    author = relationship(Author, lazy="joined", innerjoin=True)
+
+    __table_args__ = (
+        UniqueConstraint("author_id", "title", name="uq_works_author_id_title"),
+    )
+
+    def __repr__(self):
+        return f"<Work(id={self.id}, title={self.title}, author_id={self.author_id})>"
+
+
+# PostgreSQL: title and author of each work copied into works_search by a
+# trigger, for ranked full-text search plus trigram indexes for fuzzy/prefix matching
+POSTGRES_SEARCH = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS works_search ("
+    "work_id INTEGER PRIMARY KEY REFERENCES works (id) ON DELETE CASCADE, "
+    "title VARCHAR NOT NULL, author VARCHAR NOT NULL)",
+    f"CREATE INDEX IF NOT EXISTS ix_works_search ON works_search USING gin ({SEARCH_DOCUMENT})",
+    "CREATE INDEX IF NOT EXISTS ix_works_search_title_trgm ON works_search USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_works_search_author_trgm ON works_search USING gin (author gin_trgm_ops)",
+    "CREATE OR REPLACE FUNCTION works_index_search() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO works_search (work_id, title, author) "
+    "SELECT new_rows.id, new_rows.title, authors.name FROM new_rows JOIN authors ON authors.id = new_rows.author_id; "
+    "RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER works_search_insert AFTER INSERT ON works "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION works_index_search()",
+)
+
+# SQLite: an FTS5 index with one row per work, filled by a trigger
+SQLITE_SEARCH = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS works_fts USING fts5(title, author, prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS works_fts_insert AFTER INSERT ON works BEGIN "
+    "INSERT INTO works_fts(rowid, title, author) "
+    "VALUES (new.id, new.title, (SELECT name FROM authors WHERE id = new.author_id)); END",
+    "CREATE TRIGGER IF NOT EXISTS works_fts_delete AFTER DELETE ON works BEGIN "
+    "DELETE FROM works_fts WHERE rowid = old.id; END",
+)
+
+for statement in POSTGRES_SEARCH:
+    event.listen(Work.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH:
+    event.listen(Work.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+
+event.listen(
+    Work.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS works_search").execute_if(dialect="postgresql"),
+)
+event.listen(
+    Work.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS works_fts").execute_if(dialect="sqlite"),
+)
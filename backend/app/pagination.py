@@ -0,0 +1,42 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Sequence
+
+from fastapi import HTTPException, status
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode keyset values of the last row into an opaque cursor"""
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 1, types: Sequence[type] = ()) -> List[Any]:
+    """Decode an opaque cursor back into its keyset values
+
+    `types`, if given, are the JSON types expected of the values in order; a
+    cursor holding anything else is rejected like an undecodable one.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or any(type(value) is not expected for value, expected in zip(values, types))
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+    return values
@@ -0,0 +1,171 @@
+import math
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from app.config import settings
+from app.metrics import RATE_LIMITED
+
+
+class Bucket(NamedTuple):
+    rate: float  # tokens added per second
+    burst: int  # bucket capacity
+
+
+def refill(tokens: float, elapsed: float, bucket: Bucket) -> float:
+    return min(float(bucket.burst), tokens + max(elapsed, 0.0) * bucket.rate)
+
+
+def retry_after(tokens: float, bucket: Bucket) -> float:
+    """Seconds until the bucket holds a whole token again"""
+    return max(0.0, (1.0 - tokens) / bucket.rate)
+
+
+class RateLimitStore:
+    """Token-bucket state keyed by client; `take` must be atomic per key"""
+
+    name = "none"
+
+    async def take(self, key: str, bucket: Bucket) -> Tuple[bool, float]:
+        """Take one token if available; returns (allowed, tokens left)"""
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Per-process buckets; each worker enforces the limits on its own share of traffic"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time of last update), least recently used first
+        self._buckets: OrderedDict = OrderedDict()
+
+    async def take(self, key, bucket):
+        now = time.monotonic()
+        state = self._buckets.pop(key, None)
+        tokens = float(bucket.burst) if state is None else refill(state[0], now - state[1], bucket)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            # A full bucket is the default, so forgetting an old entry only ever loosens the limit
+            self._buckets.popitem(last=False)
+        return allowed, tokens
+
+    def clear(self):
+        self._buckets.clear()
+
+
+# Refill and take in one round trip; Redis TIME keeps every worker on the same clock
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared by all workers, for any client exposing the redis.asyncio eval API"""
+
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "library:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisRateLimitStore":
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "RATE_LIMIT_BACKEND=redis requires the 'redis' package (pip install redis)"
+            ) from exc
+        return cls(redis.from_url(url))
+
+    async def take(self, key, bucket):
+        allowed, tokens = await self.client.eval(
+            TOKEN_BUCKET_SCRIPT, 1, self.prefix + key, bucket.rate, bucket.burst
+        )
+        return bool(int(allowed)), float(tokens)
+
+
+class RateLimiter:
+    """Token buckets per client IP and, for loan requests, per library card"""
+
+    def __init__(self, store: RateLimitStore, ip: Bucket, card: Bucket):
+        self.store = store
+        self.ip = ip
+        self.card = card
+
+    async def check(self, ip: Optional[str], *card_numbers: Optional[str]) -> Optional[float]:
+        """Take a token from every applicable bucket; returns seconds to wait if one is empty.
+
+        A batch of loans passes each distinct card it acts for, and pays one
+        token per card, as if the loans had been sent one by one.
+        """
+        keys = [("ip", ip, self.ip)]
+        keys += [("card", card, self.card) for card in dict.fromkeys(card_numbers)]
+        for limit, key, bucket in keys:
+            if key is None:
+                continue
+            allowed, tokens = await self.store.take(f"{limit}:{key}", bucket)
+            if not allowed:
+                RATE_LIMITED.inc(limit=limit)
+                return retry_after(tokens, bucket)
+        return None
+
+
+def retry_after_header(seconds: float) -> bytes:
+    """Retry-After takes whole seconds; round up so clients never retry too early"""
+    return str(max(1, math.ceil(seconds))).encode()
+
+
+def create_rate_limiter(settings=settings) -> Optional[RateLimiter]:
+    if settings.rate_limit_backend == "none":
+        return None
+    if settings.rate_limit_backend == "redis":
+        store = RedisRateLimitStore.from_url(settings.rate_limit_url)
+    else:
+        store = MemoryRateLimitStore()
+    return RateLimiter(
+        store,
+        ip=Bucket(settings.rate_limit_ip_per_second, settings.rate_limit_ip_burst),
+        card=Bucket(settings.rate_limit_card_per_second, settings.rate_limit_card_burst),
+    )
+
+
+rate_limiter = create_rate_limiter()
+
+
+# Resolved by RateLimitMiddleware through app.dependency_overrides, like a dependency
+def get_rate_limiter() -> Optional[RateLimiter]:
+    return rate_limiter
+
+
+__all__ = [
+    "Bucket",
+    "MemoryRateLimitStore",
+    "RateLimitStore",
+    "RateLimiter",
+    "RedisRateLimitStore",
+    "create_rate_limiter",
+    "get_rate_limiter",
+    "rate_limiter",
+    "retry_after_header",
+]
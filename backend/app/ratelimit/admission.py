@@ -0,0 +1,81 @@
+from typing import Optional
+
+from app.config import settings
+from app.db import engine
+from app.db.pool import PoolWaitStats
+from app.metrics import REQUESTS_SHED
+
+
+class AdmissionController:
+    """Shed requests while the worker is saturated instead of queueing them.
+
+    A request is refused when `max_in_flight` requests are already being
+    served, or when recent checkouts from the primary pool waited longer than
+    `max_pool_wait` seconds on average. That average decays while nothing is
+    checked out, so shedding stops by itself once the backlog has drained.
+    Long-lived catalogue streams count against `max_streams` instead of
+    `max_in_flight`, so a few large exports cannot crowd out short requests.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 0,
+        max_pool_wait: float = 0.0,
+        retry_after: float = 1.0,
+        wait_stats: Optional[PoolWaitStats] = None,
+        max_streams: int = 0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_pool_wait = max_pool_wait
+        self.retry_after = retry_after
+        self.wait_stats = wait_stats
+        self.max_streams = max_streams
+        self.in_flight = 0
+        self.streams = 0
+
+    def admit(self, stream: bool = False) -> bool:
+        """Count the request in if there is room; every admitted request must be released"""
+        if stream:
+            if self.max_streams and self.streams >= self.max_streams:
+                REQUESTS_SHED.inc(reason="streams")
+                return False
+        elif self.max_in_flight and self.in_flight >= self.max_in_flight:
+            REQUESTS_SHED.inc(reason="in_flight")
+            return False
+        if (
+            self.max_pool_wait
+            and self.wait_stats is not None
+            and self.wait_stats.recent_wait_seconds() > self.max_pool_wait
+        ):
+            REQUESTS_SHED.inc(reason="pool_wait")
+            return False
+        if stream:
+            self.streams += 1
+        else:
+            self.in_flight += 1
+        return True
+
+    def release(self, stream: bool = False):
+        if stream:
+            self.streams -= 1
+        else:
+            self.in_flight -= 1
+
+
+def create_admission_controller(pool, settings=settings) -> AdmissionController:
+    return AdmissionController(
+        max_in_flight=settings.admission_max_in_flight,
+        max_pool_wait=settings.admission_max_pool_wait_ms / 1000,
+        retry_after=settings.admission_retry_after_seconds,
+        # Only the instrumented queue pool records waits (not e.g. SQLite's pools)
+        wait_stats=getattr(pool, "wait_stats", None),
+        max_streams=settings.admission_max_streams,
+    )
+
+
+admission_controller = create_admission_controller(engine.pool)
+
+
+# Resolved by AdmissionMiddleware through app.dependency_overrides, like a dependency
+def get_admission_controller() -> AdmissionController:
+    return admission_controller
@@ -0,0 +1,174 @@
+import json
+import re
+from typing import Optional
+from urllib.parse import parse_qs
+
+from app.ratelimit import get_rate_limiter, retry_after_header
+from app.ratelimit.admission import get_admission_controller
+
+# Where a rate-limited route's body names library cards
+NO_CARD, LOAN_CARD, BATCH_CARDS = "none", "loan", "batch"
+
+# Write endpoints behind the rate limiter: (method, path, cards in the body)
+RATE_LIMITED_ROUTES = (
+    ("POST", re.compile(r"/books/?"), NO_CARD),
+    ("POST", re.compile(r"/books/bulk"), NO_CARD),
+    ("PATCH", re.compile(r"/books/[^/]+/loan"), LOAN_CARD),
+    ("POST", re.compile(r"/books/loans/batch"), BATCH_CARDS),
+    ("POST", re.compile(r"/books/[^/]+/holds"), LOAN_CARD),
+)
+
+# Loan and hold request bodies are a few dozen bytes and a full batch (100
+# items) is under 10 KiB; larger bodies are refused rather than let through
+# without charging their cards
+MAX_LOAN_BODY_BYTES = 4096
+MAX_BATCH_BODY_BYTES = 65536
+
+# Cheap or long-lived routes that are never shed
+ADMISSION_EXEMPT_PREFIXES = ("/health", "/metrics", "/admin/", "/books/events")
+
+# Catalogue streams, admitted against their own cap (GET /books/ only with stream=true)
+STREAMING_PATHS = ("/books/export", "/books/snapshot")
+STREAMING_LIST = re.compile(r"/books/?")
+TRUE_VALUES = {"1", "true", "yes", "on"}
+
+
+def _resolve(scope, dependency):
+    """Call a provider, honouring app.dependency_overrides as route dependencies do"""
+    app = scope.get("app")
+    overrides = getattr(app, "dependency_overrides", {})
+    return overrides.get(dependency, dependency)()
+
+
+async def _send_error(send, status: int, detail: str, retry_after: Optional[float] = None):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    if retry_after is not None:
+        headers.append((b"retry-after", retry_after_header(retry_after)))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Answer 429 with Retry-After once a client IP or library card runs out of tokens.
+
+    Loan requests are keyed by card number as well as by IP, so one script
+    cannot work around the limit by spreading a card over many addresses.
+    Batch loans are charged to every card they name. Bodies too large to read
+    for their cards get 413.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = _match(scope["method"], scope["path"])
+        limiter = _resolve(scope, get_rate_limiter) if route is not None else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        card_numbers = []
+        if route != NO_CARD:
+            receive, card_numbers, too_large = await _read_card_numbers(receive, route)
+            if too_large:
+                await _send_error(send, 413, "Request body too large")
+                return
+        client = scope.get("client")
+        wait = await limiter.check(client[0] if client else None, *card_numbers)
+        if wait is not None:
+            await _send_error(send, 429, "Too many requests", wait)
+            return
+        await self.app(scope, receive, send)
+
+
+class AdmissionMiddleware:
+    """Answer 503 with Retry-After while the AdmissionController is shedding load"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ADMISSION_EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        controller = _resolve(scope, get_admission_controller)
+        stream = _is_stream(scope)
+        if not controller.admit(stream):
+            await _send_error(send, 503, "Server is overloaded", controller.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(stream)
+
+
+def _is_stream(scope) -> bool:
+    if scope["method"] != "GET":
+        return False
+    if scope["path"] in STREAMING_PATHS:
+        return True
+    if not STREAMING_LIST.fullmatch(scope["path"]):
+        return False
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return any(value.lower() in TRUE_VALUES for value in query.get("stream", ()))
+
+
+def _match(method: str, path: str):
+    """None if the route is not rate limited, else where its body names cards"""
+    for route_method, pattern, cards in RATE_LIMITED_ROUTES:
+        if method == route_method and pattern.fullmatch(path):
+            return cards
+    return None
+
+
+async def _read_card_numbers(receive, cards: str):
+    """Buffer the request body to find its card numbers.
+
+    Returns a receive that replays the body, the card numbers and whether the
+    body was too large to parse.
+    """
+    max_bytes = MAX_BATCH_BODY_BYTES if cards == BATCH_CARDS else MAX_LOAN_BODY_BYTES
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] != "http.request":
+            # Client went away; let the application see the disconnect
+            chunks.append(message)
+            break
+        chunks.append(message)
+        size += len(message.get("body", b""))
+        more_body = message.get("more_body", False)
+        if size > max_bytes:
+            break
+
+    card_numbers = []
+    if not more_body and chunks and chunks[-1]["type"] == "http.request":
+        try:
+            payload = json.loads(b"".join(chunk.get("body", b"") for chunk in chunks))
+        except ValueError:
+            payload = None
+        if cards == BATCH_CARDS:
+            items = payload.get("items") if isinstance(payload, dict) else None
+            requests = items if isinstance(items, list) else []
+        else:
+            requests = [payload]
+        card_numbers = [
+            request["card_number"] for request in requests
+            if isinstance(request, dict) and isinstance(request.get("card_number"), str)
+        ]
+
+    async def replay():
+        if chunks:
+            return chunks.pop(0)
+        return await receive()
+
+    return replay, card_numbers, size > max_bytes
@@ -0,0 +1,28 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+
+from app.cache import BookCache, get_cache
+from app.db import engine, replicas
+from app.db.pool import pool_status
+from app.schemas.admin import CacheStatus, PoolStatus, ReplicaStatus
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/pool", response_model=PoolStatus)
+async def get_pool_status():
+    """Connection pool occupancy and checkout wait times for this worker"""
+    return pool_status(engine.pool)
+
+
+@router.get("/cache", response_model=CacheStatus)
+async def get_cache_status(cache: BookCache = Depends(get_cache)):
+    """Response cache hit/miss/eviction counters for this worker"""
+    return cache.stats()
+
+
+@router.get("/replicas", response_model=List[ReplicaStatus])
+async def get_replica_status():
+    """Read replica health as seen by this worker"""
+    return replicas.status()
@@ -1,29 +1,227 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from typing import List
-from datetime import datetime
+from sqlalchemy import Row, select, delete
+from typing import Awaitable, Callable, List, Literal, Optional, Union
+import asyncio
+import time
 
-from app.db import get_db
+import orjson
+
+from app.cache import (
+    BookCache,
+    CachedPage,
+    TableVersion,
+    get_cache,
+    is_not_modified,
+    validator_headers,
+)
+from app.compression import StreamCompressor, compress, enabled_encodings, negotiate
+from app.config import settings
+from app.db import get_db, get_read_db
+from app.db.replicas import primary_pinned
+from app.events import EventBroker, book_event, encode_sse, get_events
+from app.idempotency import (
+    IDEMPOTENCY_KEY_HEADER,
+    REPLAYED_HEADER,
+    Idempotency,
+    Recorder,
+    StoredResponse,
+    get_idempotency,
+    request_fingerprint,
+)
 from app.models.book import Book
-from app.schemas.book import BookCreate, BookResponse, LoanRequest
+from app.models.hold import Hold
+from app.models.work import Author
+from app.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+)
+from app.schemas.book import (
+    BookChangeFeed,
+    BookCreate,
+    BookResponse,
+    BulkImportResponse,
+    HoldRequest,
+    HoldResponse,
+    LoanBatchItemResult,
+    LoanBatchRequest,
+    LoanBatchResponse,
+    LoanEventResponse,
+    LoanRequest,
+)
+from app.serialization import book_values, dump_book, dump_books, dump_books_ndjson, select_books
+from app.services import bulk, export, holds, loans, search, sync
+from app.services.works import WorkLookup, get_work_lookup
+from app.singleflight import SingleFlight, get_single_flight
 
 router = APIRouter(prefix="/books", tags=["books"])
 
+# Called by a write handler with the written book right before it commits
+BookRecorder = Callable[[Union[Book, Row]], Awaitable[None]]
+
+# Rows fetched per round trip when streaming the catalogue
+STREAM_BATCH_SIZE = 1000
+
+# Rows validated and written per statement by the bulk import
+BULK_BATCH_SIZE = 1000
+MAX_BULK_BATCH_SIZE = 10000
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+CHANGES_PAGE_SIZE = 500
+MAX_CHANGES_PAGE_SIZE = 5000
+
 
 @router.get("/", response_model=List[BookResponse])
-async def get_books(db: AsyncSession = Depends(get_db)):
-    """Get all books"""
-    result = await db.execute(select(Book))
-    books = result.scalars().all()
-    return books
+async def get_books(
+    request: Request,
+    limit: Optional[int] = Query(
+        None, ge=1, le=MAX_PAGE_SIZE,
+        description=f"Page size (default {DEFAULT_PAGE_SIZE}; unbounded when streaming)"
+    ),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    is_borrowed: Optional[bool] = Query(None, description="Filter by loan status"),
+    author: Optional[str] = Query(None, description="Filter by exact author"),
+    borrowed_by: Optional[str] = Query(None, description="Filter by borrower card number"),
+    stream: bool = Query(False, description="Stream results as NDJSON"),
+    db: AsyncSession = Depends(get_read_db),
+    cache: BookCache = Depends(get_cache),
+    flights: SingleFlight = Depends(get_single_flight)
+):
+    """Get books ordered by serial, one keyset page at a time"""
+    query = select_books().order_by(Book.serial)
+    if cursor is not None:
+        (after_serial,) = decode_cursor(cursor, types=(str,))
+        query = query.where(Book.serial > after_serial)
+    if is_borrowed is not None:
+        query = query.where(Book.is_borrowed == is_borrowed)
+    if author is not None:
+        # One lookup on the unique name, then a range of ix_books_author_id_serial
+        query = query.where(Book.author_id == select(Author.id).where(Author.name == author).scalar_subquery())
+    if borrowed_by is not None:
+        query = query.where(Book.borrowed_by == borrowed_by)
+
+    if stream:
+        if limit is not None:
+            query = query.limit(limit)
+        return StreamingResponse(
+            _stream_books(db, query),
+            media_type="application/x-ndjson"
+        )
+
+    limit = limit or DEFAULT_PAGE_SIZE
+    # Clients pinned to the primary after a write skip the cache both ways:
+    # a replica that had not caught up may have filled it under the generation
+    # their write started, and their reads must not replace replica pages
+    pinned = primary_pinned(request)
+    version = await cache.version()
+    cache_key = await cache.list_key({
+        "limit": limit,
+        "cursor": cursor,
+        "is_borrowed": is_borrowed,
+        "author": author,
+        "borrowed_by": borrowed_by,
+    }, version.generation)
+    etag = cache.etag(version, cache_key)
+    if not pinned and is_not_modified(request.headers, etag, version.last_modified):
+        return _not_modified(etag, version)
+    page = None if pinned else await cache.get_list(cache_key)
+    if page is None:
+        async def load_page() -> CachedPage:
+            result = await db.execute(query.limit(limit + 1))
+            rows = result.all()
+            headers = {}
+            if len(rows) > limit:
+                rows = rows[:limit]
+                headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].serial)
+            if pinned:
+                return CachedPage(body=dump_books(rows), etag=etag, headers=headers)
+            return await cache.set_list(cache_key, dump_books(rows), headers, etag)
+
+        # The cache key already holds the normalized filters and the table generation
+        page = await flights.do("/books/", ("list", cache_key, pinned), load_page)
+    return await _cached_response(request, cache, page, etag, version, cached=not pinned)
+
+
+def _not_modified(etag: str, version: TableVersion) -> Response:
+    """304 decided from the table version alone, before any cache or database read"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={**validator_headers(etag, version), "Vary": "Accept-Encoding"}
+    )
+
+
+async def _cached_response(
+    request: Request, cache: BookCache, page: CachedPage, etag: str, version: TableVersion, cached: bool = True
+) -> Response:
+    """Serve a cached body, compressed once per encoding and kept alongside it.
+
+    The entity tag comes from the current table version; compressed variants
+    are keyed by the cached page's own tag so they live exactly as long as it.
+    Pages read past the cache (`cached=False`) are compressed without it.
+    """
+    headers = {**validator_headers(etag, version), **page.headers, "Vary": "Accept-Encoding"}
+    body = page.body
+    encoding = None
+    if len(body) >= settings.compression_min_size:
+        encoding = negotiate(
+            request.headers.get("accept-encoding"),
+            enabled_encodings(settings.compression_encodings)
+        )
+    if encoding is not None:
+        compressed = await cache.get_variant(page.etag, encoding) if cached else None
+        if compressed is None:
+            compressed = compress(body, encoding)
+            if cached:
+                await cache.set_variant(page.etag, encoding, compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _stream_books(db: AsyncSession, query):
+    """Yield NDJSON lines from a server-side cursor, one batch at a time"""
+    result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+    async for rows in result.partitions():
+        yield dump_books_ndjson(rows)
 
 
 @router.post("/", response_model=BookResponse, status_code=status.HTTP_201_CREATED)
-async def create_book(book: BookCreate, db: AsyncSession = Depends(get_db)):
+async def create_book(
+    book: BookCreate,
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+    db: AsyncSession = Depends(get_db),
+    cache: BookCache = Depends(get_cache),
+    events: EventBroker = Depends(get_events),
+    idempotency: Idempotency = Depends(get_idempotency),
+    works: WorkLookup = Depends(get_work_lookup)
+):
     """Create a new book"""
+    if idempotency_key is None:
+        return await _create_book(book, db, cache, events, works)
+    return await _idempotent_response(
+        request, response, idempotency, db, idempotency_key, status.HTTP_201_CREATED,
+        lambda record: _create_book(book, db, cache, events, works, record)
+    )
+
+
+async def _create_book(
+    book: BookCreate,
+    db: AsyncSession,
+    cache: BookCache,
+    events: EventBroker,
+    works: WorkLookup,
+    record: Optional[BookRecorder] = None
+) -> Book:
     # Check if book with this serial already exists
-    result = await db.execute(select(Book).where(Book.serial == book.serial))
+    result = await db.execute(select(Book.serial).where(Book.serial == book.serial))
     existing_book = result.scalar_one_or_none()
     if existing_book:
         raise HTTPException(
@@ -31,25 +229,330 @@ async def create_book(book: BookCreate, db: AsyncSession = Depends(get_db)):
             detail=f"Book with serial number {book.serial} already exists"
         )
     
-    # Create new book
+    # Create new book, sharing the work row with other copies of the same title
+    work = (await works.resolve(db, [(book.title, book.author)]))[book.title, book.author]
     db_book = Book(
         serial=book.serial,
-        title=book.title,
-        author=book.author,
+        work_id=work.work_id,
+        author_id=work.author_id,
         is_borrowed=False,
         borrowed_by=None,
         borrowed_at=None
     )
     
     db.add(db_book)
-    await db.commit()
+    await db.flush()
     await db.refresh(db_book)
+    if record is not None:
+        await record(db_book)
+    await events.publish(db, [book_event("created", db_book)])
+    await db.commit()
+    await cache.invalidate([db_book.serial])
     
     return db_book
 
 
+@router.post(
+    "/bulk",
+    response_model=BulkImportResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/BookCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def bulk_create_books(
+    request: Request,
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db),
+    cache: BookCache = Depends(get_cache),
+    works: WorkLookup = Depends(get_work_lookup)
+):
+    """Create many books from a JSON array, NDJSON or CSV upload"""
+    started = time.perf_counter()
+    body = await request.body()
+    rows = bulk.parse_rows(body, request.headers.get("content-type", ""))
+
+    received, inserted = 0, 0
+    conflicts, errors = [], []
+    seen = set()
+    try:
+        for batch in bulk.batched(rows, batch_size):
+            received += len(batch)
+            valid, batch_errors, batch_conflicts = bulk.validate_batch(batch, seen)
+            errors.extend(batch_errors)
+            conflicts.extend(batch_conflicts)
+
+            created = await bulk.insert_batch(db, [book for _, book in valid], works)
+            await db.commit()
+            if created:
+                await cache.invalidate(created)
+            inserted += len(created)
+            conflicts.extend(bulk.existing_conflicts(valid, created))
+    except bulk.UnsupportedContentType as exc:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(exc)
+        )
+    except bulk.PayloadError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+
+    elapsed = time.perf_counter() - started
+    conflicts.sort(key=lambda conflict: conflict.row)
+    return BulkImportResponse(
+        received=received,
+        inserted=inserted,
+        conflicts=conflicts,
+        errors=errors,
+        elapsed_seconds=round(elapsed, 6),
+        rows_per_second=round(inserted / elapsed, 1) if elapsed > 0 else 0.0,
+    )
+
+
+@router.get("/search", response_model=List[BookResponse])
+async def search_books(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Words or word prefixes"),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    cache: BookCache = Depends(get_cache),
+    flights: SingleFlight = Depends(get_single_flight)
+):
+    """Search books by title and author, best matches first"""
+    async def run_search() -> bytes:
+        return dump_books(await search.search_books(db, q, limit))
+
+    version = await cache.version()
+    body = await flights.do(
+        "/books/search",
+        ("search", q, limit, version.generation, primary_pinned(request)),
+        run_search
+    )
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/changes", response_model=BookChangeFeed)
+async def get_book_changes(
+    since: int = Query(0, ge=0, description="next_since of the previous page; 0 for everything"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=MAX_CHANGES_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Books created, changed or deleted after version `since`, in version order.
+
+    Each book appears once, at its latest version. Repeat with
+    since=next_since while has_more is true. 410 means deletions the client
+    has not seen were already pruned and it must bootstrap from /books/snapshot.
+    """
+    page = await sync.list_changes(db, since, limit)
+    body = orjson.dumps({
+        "changes": page.changes,
+        "next_since": page.next_since,
+        "has_more": page.has_more,
+    })
+    return Response(content=body, media_type="application/json")
+
+
+@router.get(
+    "/snapshot",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def get_book_snapshot(db: AsyncSession = Depends(get_read_db)):
+    """Every book as NDJSON, for a first sync.
+
+    The X-Change-Version header is read before the rows, so the snapshot holds
+    at least every change up to it; continue with /books/changes?since=<it>.
+    """
+    version = await sync.current_version(db)
+    return StreamingResponse(
+        _stream_books(db, select_books().order_by(Book.serial)),
+        media_type="application/x-ndjson",
+        headers={sync.CHANGE_VERSION_HEADER: str(version)}
+    )
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {
+        "text/csv": {}, "application/x-ndjson": {}, "application/vnd.apache.parquet": {}, "application/gzip": {}
+    }}},
+)
+async def export_catalogue(
+    format: Literal["csv", "ndjson", "parquet"] = Query("ndjson", description="File format"),
+    gzip: bool = Query(False, description="Gzip the file as it is streamed"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """The whole catalogue as a file download, ordered by serial.
+
+    Rows are read from a server-side cursor and encoded batch by batch, so
+    memory use does not grow with the table.
+    """
+    encoder = export.create_encoder(format)
+    media_type, filename = encoder.media_type, f"books.{encoder.extension}"
+    compressor = None
+    if gzip:
+        compressor = StreamCompressor("gzip")
+        media_type, filename = "application/gzip", f"{filename}.gz"
+    return StreamingResponse(
+        export.export_books(db, select_books().order_by(Book.serial), encoder, compressor),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def book_events(
+    serial: List[str] = Query([], description="Only events for these serials"),
+    author: List[str] = Query([], description="Only events for books by these authors"),
+    events: EventBroker = Depends(get_events)
+):
+    """Server-sent events for created, deleted, borrowed and returned books.
+
+    Without filters every change is sent. A `resync` event means some events
+    were dropped (slow client or relay outage) and displayed state should be refetched.
+    """
+    return StreamingResponse(
+        _event_stream(events, serial, author, settings.events_keepalive_seconds),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _event_stream(events: EventBroker, serials: List[str], authors: List[str], keepalive: float):
+    # An idle client costs one queue and one suspended task; the subscription is
+    # dropped when the client disconnects and Starlette cancels this generator
+    subscription = events.subscribe(serials, authors)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield encode_sse(event)
+    finally:
+        events.unsubscribe(subscription)
+
+
+@router.get("/{serial}", response_model=BookResponse)
+async def get_book(
+    serial: str,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    cache: BookCache = Depends(get_cache),
+    flights: SingleFlight = Depends(get_single_flight)
+):
+    """Get a single book by serial number"""
+    # Pinned clients skip the cache both ways (see get_books)
+    pinned = primary_pinned(request)
+    version = await cache.version()
+    etag = cache.etag(version, f"book:{serial}")
+    if not pinned and is_not_modified(request.headers, etag, version.last_modified):
+        return _not_modified(etag, version)
+    page = None if pinned else await cache.get_book(serial, version.generation)
+    if page is None:
+        async def load_book() -> CachedPage:
+            result = await db.execute(select_books().where(Book.serial == serial))
+            row = result.one_or_none()
+            if not row:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Book with serial number {serial} not found"
+                )
+            if pinned:
+                return CachedPage(body=dump_book(row), etag=etag, headers={})
+            return await cache.set_book(serial, dump_book(row), etag=etag, generation=version.generation)
+
+        page = await flights.do("/books/{serial}", ("book", serial, version.generation, pinned), load_book)
+    return await _cached_response(request, cache, page, etag, version, cached=not pinned)
+
+
+@router.get("/{serial}/history", response_model=List[LoanEventResponse])
+async def get_book_history(
+    serial: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the loan history of a copy, newest first"""
+    events, next_cursor = await loans.loan_history(db, limit, cursor, serial=serial)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return events
+
+
+@router.post("/{serial}/holds", response_model=HoldResponse, status_code=status.HTTP_201_CREATED)
+async def place_hold(
+    serial: str,
+    hold_request: HoldRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Join the FIFO hold queue of a borrowed book.
+
+    When the book is returned it is lent to the first patron in the queue in
+    the same transaction.
+    """
+    hold, position = await holds.place_hold(db, serial, hold_request.card_number)
+    await db.commit()
+    return HoldResponse(
+        serial=hold.serial, card_number=hold.card_number, placed_at=hold.placed_at, position=position
+    )
+
+
+@router.get("/{serial}/holds", response_model=List[HoldResponse])
+async def get_holds(
+    serial: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the hold queue of a book, next in line first (limit=1 for just the head)"""
+    page, next_cursor = await holds.list_holds(db, serial, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [
+        HoldResponse(serial=hold.serial, card_number=hold.card_number, placed_at=hold.placed_at, position=position)
+        for hold, position in page
+    ]
+
+
+@router.delete("/{serial}/holds/{card_number}", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_hold(
+    serial: str,
+    card_number: str = Path(..., pattern=r"^\d{6}$", description="6-digit card number"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Leave the hold queue of a book"""
+    await holds.cancel_hold(db, serial, card_number)
+    await db.commit()
+    return None
+
+
 @router.delete("/{serial}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_book(serial: str, db: AsyncSession = Depends(get_db)):
+async def delete_book(
+    serial: str,
+    db: AsyncSession = Depends(get_db),
+    cache: BookCache = Depends(get_cache),
+    events: EventBroker = Depends(get_events)
+):
     """Delete a book by serial number"""
     result = await db.execute(select(Book).where(Book.serial == serial))
     book = result.scalar_one_or_none()
@@ -60,8 +563,12 @@ async def delete_book(serial: str, db: AsyncSession = Depends(get_db)):
             detail=f"Book with serial number {serial} not found"
         )
     
+    event = book_event("deleted", book)
     await db.execute(delete(Book).where(Book.serial == serial))
+    await db.execute(delete(Hold).where(Hold.serial == serial))
+    await events.publish(db, [event])
     await db.commit()
+    await cache.invalidate([serial])
     
     return None
 
@@ -70,44 +577,136 @@ async def delete_book(serial: str, db: AsyncSession = Depends(get_db)):
 async def update_loan_status(
     serial: str,
     loan_request: LoanRequest,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_KEY_HEADER),
+    db: AsyncSession = Depends(get_db),
+    cache: BookCache = Depends(get_cache),
+    events: EventBroker = Depends(get_events),
+    idempotency: Idempotency = Depends(get_idempotency)
 ):
     """Update book loan status (borrow/return)"""
-    # Get book by serial
-    result = await db.execute(select(Book).where(Book.serial == serial))
-    book = result.scalar_one_or_none()
-    
-    if not book:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Book with serial number {serial} not found"
-        )
-    
-    # Handle borrow action
-    if loan_request.action == "borrow":
-        if book.is_borrowed:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Book with serial number {serial} is already borrowed"
-            )
-        
-        book.is_borrowed = True
-        book.borrowed_by = loan_request.card_number
-        book.borrowed_at = datetime.utcnow()
-    
-    # Handle return action
-    elif loan_request.action == "return":
-        if not book.is_borrowed:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Book with serial number {serial} is not currently borrowed"
-            )
-        
-        book.is_borrowed = False
-        book.borrowed_by = None
-        book.borrowed_at = None
-    
+    if idempotency_key is None:
+        return await _update_loan_status(serial, loan_request, db, cache, events)
+    return await _idempotent_response(
+        request, response, idempotency, db, idempotency_key, status.HTTP_200_OK,
+        lambda record: _update_loan_status(serial, loan_request, db, cache, events, record)
+    )
+
+
+async def _update_loan_status(
+    serial: str,
+    loan_request: LoanRequest,
+    db: AsyncSession,
+    cache: BookCache,
+    events: EventBroker,
+    record: Optional[BookRecorder] = None
+) -> Row:
+    book = await loans.apply_loan(
+        db, serial, loan_request.action, loan_request.card_number
+    )
+    if record is not None:
+        await record(book)
+    await events.publish(db, [_loan_event(book)])
     await db.commit()
-    await db.refresh(book)
-    
+    await cache.invalidate([serial])
+
     return book
+
+
+def _loan_event(book: Row) -> dict:
+    """Change feed event for a loan; a return handed to the next hold is a borrow"""
+    return book_event("borrowed" if book.is_borrowed else "returned", book)
+
+
+async def _idempotent_response(
+    request: Request,
+    response: Response,
+    idempotency: Idempotency,
+    db: AsyncSession,
+    key: str,
+    status_code: int,
+    handler: Callable[[BookRecorder], Awaitable[Union[Book, Row]]]
+) -> Response:
+    """Run a write once per Idempotency-Key; retries get the stored status and body.
+
+    The handler records its response right before committing, so a database
+    store keeps it in the same transaction as the write.
+    """
+    fingerprint = request_fingerprint(request.method, request.url.path, await request.body())
+
+    def stored_book(book: Union[Book, Row]) -> StoredResponse:
+        return StoredResponse(status_code, dump_book(book_values(book)), fingerprint)
+
+    async def execute(record: Recorder) -> StoredResponse:
+        try:
+            book = await handler(lambda written: record(stored_book(written)))
+        except HTTPException as exc:
+            if exc.status_code >= 500:
+                raise
+            # A refused write is an outcome too: the retry gets the same answer
+            return StoredResponse(exc.status_code, orjson.dumps({"detail": exc.detail}), fingerprint)
+        return stored_book(book)
+
+    stored, replayed = await idempotency.run(key, fingerprint, execute, db)
+    result = Response(content=stored.body, status_code=stored.status_code, media_type="application/json")
+    # Returning a Response drops headers set on the injected one (the replica pin cookie)
+    result.raw_headers.extend(
+        (name, value) for name, value in response.raw_headers if name != b"content-length"
+    )
+    if replayed:
+        result.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+@router.post("/loans/batch", response_model=LoanBatchResponse)
+async def batch_update_loans(
+    batch: LoanBatchRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    cache: BookCache = Depends(get_cache),
+    events: EventBroker = Depends(get_events)
+):
+    """Borrow/return several books in one transaction (e.g. a kiosk checkout)"""
+    succeeded, failures = await loans.apply_loan_batch(
+        db, [(item.serial, item.action, item.card_number) for item in batch.items]
+    )
+
+    committed = not failures or batch.mode == "best_effort"
+    if committed:
+        await events.publish(db, [
+            _loan_event(succeeded[item.serial]) for item in batch.items if item.serial in succeeded
+        ])
+        await db.commit()
+        if succeeded:
+            await cache.invalidate(succeeded)
+    else:
+        await db.rollback()
+        response.status_code = status.HTTP_409_CONFLICT
+
+    results = []
+    for item in batch.items:
+        if item.serial in failures:
+            failure = failures[item.serial]
+            results.append(LoanBatchItemResult(
+                serial=item.serial,
+                action=item.action,
+                status_code=failure.status_code,
+                detail=failure.detail
+            ))
+        elif committed:
+            results.append(LoanBatchItemResult(
+                serial=item.serial,
+                action=item.action,
+                status_code=status.HTTP_200_OK,
+                book=BookResponse.model_validate(succeeded[item.serial])
+            ))
+        else:
+            results.append(LoanBatchItemResult(
+                serial=item.serial,
+                action=item.action,
+                status_code=status.HTTP_424_FAILED_DEPENDENCY,
+                detail="Rolled back because another item in the batch failed"
+            ))
+
+    return LoanBatchResponse(committed=committed, results=results)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.db import get_read_db
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.schemas.book import BookResponse
+from app.serialization import dump_books
+from app.services import overdue
+
+router = APIRouter(prefix="/loans", tags=["loans"])
+
+
+@router.get("/overdue", response_model=List[BookResponse])
+async def get_overdue_loans(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get borrowed books past their due date, longest overdue first"""
+    rows, next_cursor = await overdue.list_overdue(db, limit, cursor)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+    return Response(content=dump_books(rows), media_type="application/json", headers=headers)
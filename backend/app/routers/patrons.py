@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, Path, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from app.db import get_read_db
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from app.schemas.book import LoanEventResponse
+from app.services import loans
+
+router = APIRouter(prefix="/patrons", tags=["patrons"])
+
+
+@router.get("/{card_number}/loans", response_model=List[LoanEventResponse])
+async def get_patron_loans(
+    response: Response,
+    card_number: str = Path(..., pattern=r"^\d{6}$", description="6-digit card number"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from X-Next-Cursor"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get a patron's borrow/return history, newest first"""
+    events, next_cursor = await loans.loan_history(db, limit, cursor, card_number=card_number)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return events
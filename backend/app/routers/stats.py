@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app.db import get_read_db
+from app.schemas.stats import CirculationStats
+from app.services import stats
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+MAX_TOP_AUTHORS = 100
+MAX_STATS_DAYS = 366
+
+
+@router.get("", response_model=CirculationStats)
+async def get_stats(
+    author: List[str] = Query([], description="Counts for these authors instead of the top authors"),
+    top_authors: int = Query(10, ge=0, le=MAX_TOP_AUTHORS, description="Authors with the most books"),
+    days: int = Query(30, ge=1, le=MAX_STATS_DAYS, description="Days of loan activity, up to today"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Book totals, per-author counts and loans per day.
+
+    Read from counters the database keeps current on every write, so the cost
+    does not depend on the size of the catalogue.
+    """
+    return await stats.circulation_stats(db, author, top_authors, days)
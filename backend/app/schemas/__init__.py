@@ -1,5 +1,43 @@
 # Schematy Pydantic
 
-from app.schemas.book import BookCreate, BookResponse, LoanRequest
+from app.schemas.admin import CacheStatus, PoolStatus, ReplicaStatus
+from app.schemas.book import (
+    BookChange,
+    BookChangeFeed,
+    BookCreate,
+    BookResponse,
+    BulkImportResponse,
+    BulkRowError,
+    HoldRequest,
+    HoldResponse,
+    LoanBatchItem,
+    LoanBatchItemResult,
+    LoanBatchRequest,
+    LoanBatchResponse,
+    LoanEventResponse,
+    LoanRequest,
+)
+from app.schemas.stats import AuthorStatsResponse, CirculationStats, DailyLoans
 
-__all__ = ["BookCreate", "BookResponse", "LoanRequest"]
\ No newline at end of file
+__all__ = [
+    "AuthorStatsResponse",
+    "BookChange",
+    "BookChangeFeed",
+    "BookCreate",
+    "BookResponse",
+    "BulkImportResponse",
+    "BulkRowError",
+    "CacheStatus",
+    "CirculationStats",
+    "DailyLoans",
+    "HoldRequest",
+    "HoldResponse",
+    "LoanBatchItem",
+    "LoanBatchItemResult",
+    "LoanBatchRequest",
+    "LoanBatchResponse",
+    "LoanEventResponse",
+    "LoanRequest",
+    "PoolStatus",
+    "ReplicaStatus",
+]
\ No newline at end of file
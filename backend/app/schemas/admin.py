@@ -0,0 +1,35 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class PoolStatus(BaseModel):
+    """Schema for database connection pool statistics"""
+    pool_class: str
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    timeouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_avg: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
+    wait_seconds_recent: Optional[float] = None
+
+
+class CacheStatus(BaseModel):
+    """Schema for response cache statistics"""
+    backend: str
+    entries: Optional[int] = None
+    hits: int
+    misses: int
+    evictions: int
+
+
+class ReplicaStatus(BaseModel):
+    """Schema for read replica health"""
+    name: str
+    healthy: bool
+    failures: int
+    retry_in_seconds: float
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 class BookCreate(BaseModel):
     """Schema for creating a new book"""
@@ -23,6 +23,7 @@ class BookResponse(BaseModel):
     is_borrowed: bool
     borrowed_by: Optional[str] = None
     borrowed_at: Optional[datetime] = None
+    due_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True # Allows conversion from SQLAlchemy model to Pydantic model
@@ -55,4 +56,101 @@ class LoanRequest(BaseModel):
             raise ValueError("Card number is required for borrow action")
         if self.action == "return" and self.card_number:
             raise ValueError("Card number is not allowed for return action")
-        return self
\ No newline at end of file
+        return self
+
+class BulkRowError(BaseModel):
+    """Schema for a rejected row in a bulk import"""
+    row: int = Field(..., description="1-based position of the row in the upload")
+    serial: Optional[str] = None
+    detail: str
+
+class BulkImportResponse(BaseModel):
+    """Schema for bulk import summary"""
+    received: int
+    inserted: int
+    conflicts: List[BulkRowError]
+    errors: List[BulkRowError]
+    elapsed_seconds: float
+    rows_per_second: float
+
+class LoanBatchItem(LoanRequest):
+    """Schema for a single loan operation within a batch"""
+    serial: str = Field(..., min_length=6, max_length=6, description="6-digit serial number")
+
+    @field_validator("serial")
+    @classmethod
+    def validate_serial(cls, v):
+        if not v.isdigit():
+            raise ValueError("Serial must be a number")
+        return v
+
+class LoanBatchRequest(BaseModel):
+    """Schema for a batch of loan operations (e.g. one checkout at a kiosk)"""
+    items: List[LoanBatchItem] = Field(..., min_length=1, max_length=100)
+    mode: Literal["all_or_nothing", "best_effort"] = Field(
+        "all_or_nothing",
+        description="all_or_nothing rolls back every item if one fails; best_effort commits the successes"
+    )
+
+    @model_validator(mode='after')
+    def validate_unique_serials(self):
+        """Validate that each serial appears at most once per batch"""
+        serials = [item.serial for item in self.items]
+        if len(serials) != len(set(serials)):
+            raise ValueError("Each serial may appear only once per batch")
+        return self
+
+class LoanBatchItemResult(BaseModel):
+    """Schema for the outcome of a single loan operation within a batch"""
+    serial: str
+    action: str
+    status_code: int
+    detail: Optional[str] = None
+    book: Optional[BookResponse] = None
+
+class LoanBatchResponse(BaseModel):
+    """Schema for batch loan response"""
+    committed: bool
+    results: List[LoanBatchItemResult]
+
+class LoanEventResponse(BaseModel):
+    """Schema for an entry in the loan history"""
+    id: int
+    serial: str
+    card_number: Optional[str] = None
+    action: str
+    occurred_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class BookChange(BaseModel):
+    """Schema for one entry of the delta-sync change feed"""
+    version: int
+    op: Literal["upsert", "delete"]
+    serial: str
+    book: Optional[BookResponse] = None
+
+class BookChangeFeed(BaseModel):
+    """Schema for a page of the change feed; resume with since=next_since"""
+    changes: List[BookChange]
+    next_since: int
+    has_more: bool
+
+class HoldRequest(BaseModel):
+    """Schema for joining the hold queue of a borrowed book"""
+    card_number: str = Field(..., min_length=6, max_length=6, description="6-digit card number")
+
+    @field_validator("card_number")
+    @classmethod
+    def validate_card_number(cls, v: str) -> str:
+        if not v.isdigit():
+            raise ValueError("Card number must contain only digits")
+        return v
+
+class HoldResponse(BaseModel):
+    """Schema for a place in a hold queue; position 1 is next in line"""
+    serial: str
+    card_number: str
+    placed_at: datetime
+    position: int
@@ -0,0 +1,27 @@
+from datetime import date
+from typing import List
+
+from pydantic import BaseModel
+
+
+class AuthorStatsResponse(BaseModel):
+    """Schema for the book counts of one author"""
+    author: str
+    total: int
+    borrowed: int
+
+
+class DailyLoans(BaseModel):
+    """Schema for the loan activity of one UTC day"""
+    day: date
+    borrows: int
+    returns: int
+
+
+class CirculationStats(BaseModel):
+    """Schema for the circulation statistics dashboard"""
+    total_books: int
+    borrowed_books: int
+    available_books: int
+    authors: List[AuthorStatsResponse]
+    loans_per_day: List[DailyLoans]
@@ -0,0 +1,73 @@
+from typing import Iterable, Sequence
+
+import orjson
+from sqlalchemy import Select, select
+
+from app.models.book import Book
+from app.models.work import Author, Work
+
+# Field order shared by the column selection and the encoders below
+BOOK_FIELDS = ("serial", "title", "author", "is_borrowed", "borrowed_by", "borrowed_at", "due_at")
+
+# Plain columns for read-only queries: rows come back as tuples, skipping
+# ORM instance construction and identity-map bookkeeping
+BOOK_COLUMNS = (
+    Book.serial,
+    Work.title,
+    Author.name.label("author"),
+    Book.is_borrowed,
+    Book.borrowed_by,
+    Book.borrowed_at,
+    Book.due_at,
+)
+
+# The FROM clause BOOK_COLUMNS need: each book joined to its work and author
+BOOK_SOURCE = (
+    Book.__table__
+    .join(Work.__table__, Work.id == Book.work_id)
+    .join(Author.__table__, Author.id == Book.author_id)
+)
+
+# BOOK_COLUMNS for UPDATE/INSERT ... RETURNING, which cannot join (SQLite
+# forbids joined tables there), so title and author are primary key lookups
+BOOK_RETURNING = (
+    Book.serial,
+    select(Work.title).where(Work.id == Book.work_id).scalar_subquery().label("title"),
+    select(Author.name).where(Author.id == Book.author_id).scalar_subquery().label("author"),
+    Book.is_borrowed,
+    Book.borrowed_by,
+    Book.borrowed_at,
+    Book.due_at,
+)
+
+
+def select_books(*columns) -> Select:
+    """SELECT `columns` followed by BOOK_COLUMNS from books joined to works and authors"""
+    return select(*columns, *BOOK_COLUMNS).select_from(BOOK_SOURCE)
+
+
+def book_values(book) -> tuple:
+    """A book (ORM instance or row) in BOOK_FIELDS order, for the encoders below"""
+    return tuple(getattr(book, field) for field in BOOK_FIELDS)
+
+
+def book_row_to_dict(row: Sequence) -> dict:
+    return dict(zip(BOOK_FIELDS, row))
+
+
+def dump_book(row: Sequence) -> bytes:
+    """Encode one book row exactly as BookResponse would serialize it"""
+    return orjson.dumps(book_row_to_dict(row))
+
+
+def dump_books(rows: Iterable[Sequence]) -> bytes:
+    """Encode book rows as a JSON array without building response models"""
+    return orjson.dumps([dict(zip(BOOK_FIELDS, row)) for row in rows])
+
+
+def dump_books_ndjson(rows: Iterable[Sequence]) -> bytes:
+    """Encode book rows as newline-delimited JSON"""
+    return b"".join(
+        orjson.dumps(dict(zip(BOOK_FIELDS, row)), option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
@@ -0,0 +1,138 @@
+"""Production server entry point: `python -m app.serve`.
+
+Applies pending migrations once, then starts uvicorn with `--workers` processes using
+uvloop and httptools when installed. Each worker's connection pool is sized
+from DB_CONNECTION_BUDGET so all workers together stay within it. On SIGTERM
+uvicorn stops accepting connections, lets in-flight requests (and their
+transactions) finish for up to GRACEFUL_SHUTDOWN_SECONDS, then runs the
+application shutdown, which disposes the engine.
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import uvicorn
+
+from app.config import settings
+
+logger = logging.getLogger("app.serve")
+
+
+def worker_pool_limits(budget: int, workers: int, pool_size: int) -> Tuple[int, int]:
+    """Split a global connection budget into (pool_size, max_overflow) per worker.
+
+    Each worker keeps at most `pool_size` persistent connections and may
+    overflow up to its share of the budget.
+    """
+    per_worker = budget // workers
+    if per_worker < 1:
+        raise ValueError(
+            f"A connection budget of {budget} cannot serve {workers} workers "
+            "(each worker needs at least one connection)"
+        )
+    size = min(pool_size, per_worker)
+    return size, per_worker - size
+
+
+def worker_settings(workers: int, budget: Optional[int]) -> Dict[str, object]:
+    """Settings every worker process must run with"""
+    overrides: Dict[str, object] = {}
+    if budget is not None:
+        size, overflow = worker_pool_limits(budget, workers, settings.db_pool_size)
+        overrides.update(db_pool_size=size, db_max_overflow=overflow)
+    return overrides
+
+
+def shared_state_warnings(workers: int, settings=settings) -> List[str]:
+    """Per-process backends that answer inconsistently once there are several workers"""
+    if workers < 2:
+        return []
+    warnings = []
+    if settings.cache_backend == "memory":
+        warnings.append(
+            "CACHE_BACKEND=memory keeps a cache per worker: after a write, other workers serve "
+            "stale pages for up to CACHE_TTL_SECONDS. Use CACHE_BACKEND=redis (or none)."
+        )
+    if settings.idempotency_backend == "memory":
+        warnings.append(
+            "IDEMPOTENCY_BACKEND=memory keeps keys per worker: a retry that reaches another "
+            "worker runs the request again. Use IDEMPOTENCY_BACKEND=database."
+        )
+    return warnings
+
+
+def apply_settings(overrides: Dict[str, object]):
+    """Apply overrides here and, through the environment, in spawned workers"""
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+        os.environ[name.upper()] = str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+async def prepare_database():
+    """Migrate to head and create upcoming loan_events partitions"""
+    # Imported here so the engine is built after the worker settings are applied
+    from app.db import create_async_db_engine
+    from app.migrations import upgrade
+    from app.services.loans import create_loan_event_partitions
+
+    engine = create_async_db_engine()
+    try:
+        applied = await upgrade(engine)
+        if applied:
+            logger.info("Applied migrations %s", ", ".join(applied))
+        await create_loan_event_partitions(engine)
+    finally:
+        await engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Library API with multiple workers")
+    parser.add_argument("--host", default=settings.uvicorn_host)
+    parser.add_argument("--port", type=int, default=settings.uvicorn_port)
+    parser.add_argument("--workers", type=int, default=settings.web_concurrency)
+    parser.add_argument("--connection-budget", type=int, default=settings.db_connection_budget,
+                        help="total DB connections across all workers")
+    parser.add_argument("--graceful-timeout", type=float, default=settings.graceful_shutdown_seconds)
+    parser.add_argument("--skip-migrations", action="store_true", help="do not migrate at startup")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        overrides = worker_settings(args.workers, args.connection_budget)
+    except ValueError as error:
+        parser.error(str(error))
+    apply_settings(overrides)
+
+    logging.basicConfig(level=args.log_level.upper())
+    for warning in shared_state_warnings(args.workers):
+        logger.warning("%d workers: %s", args.workers, warning)
+    if not args.skip_migrations:
+        asyncio.run(prepare_database())
+    logger.info(
+        "Starting %d worker(s), pool_size=%d max_overflow=%d per worker",
+        args.workers, settings.db_pool_size, settings.db_max_overflow,
+    )
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop" if _available("uvloop") else "asyncio",
+        http="httptools" if _available("httptools") else "h11",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.book import Book
+from app.schemas.book import BookCreate, BulkRowError
+from app.services.works import WorkKey, WorkLookup
+
+JSON_TYPES = {"application/json"}
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+CSV_TYPES = {"text/csv", "application/csv"}
+
+# Columns written by the bulk path, in COPY order
+IMPORT_COLUMNS = ("serial", "work_id", "author_id", "is_borrowed")
+
+
+class PayloadError(ValueError):
+    """Raised when an upload cannot be parsed at all"""
+
+
+class UnsupportedContentType(PayloadError):
+    """Raised when the upload is not JSON, NDJSON or CSV"""
+
+
+def parse_rows(body: bytes, content_type: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (row number, raw row) pairs from a JSON, NDJSON or CSV upload"""
+    media_type = content_type.split(";")[0].strip().lower()
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError as exc:
+        raise PayloadError("Upload must be UTF-8 encoded") from exc
+
+    if media_type in JSON_TYPES:
+        try:
+            rows = json.loads(text)
+        except ValueError as exc:
+            raise PayloadError(f"Invalid JSON: {exc}") from exc
+        if not isinstance(rows, list):
+            raise PayloadError("JSON upload must be an array of books")
+        yield from enumerate(rows, start=1)
+
+    elif media_type in NDJSON_TYPES:
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, line
+
+    elif media_type in CSV_TYPES:
+        reader = csv.DictReader(io.StringIO(text))
+        yield from enumerate(reader, start=1)
+
+    else:
+        raise UnsupportedContentType(f"Unsupported content type: {media_type or 'none'}")
+
+
+def batched(rows: Iterable[Tuple[int, Any]], size: int) -> Iterator[List[Tuple[int, Any]]]:
+    """Group parsed rows into lists of at most `size` items"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_batch(
+    batch: List[Tuple[int, Any]],
+    seen: Set[str],
+) -> Tuple[List[Tuple[int, BookCreate]], List[BulkRowError], List[BulkRowError]]:
+    """Validate a batch against BookCreate, splitting out errors and in-upload duplicates"""
+    valid, errors, conflicts = [], [], []
+    for number, raw in batch:
+        try:
+            book = BookCreate.model_validate(raw)
+        except ValidationError as exc:
+            errors.append(BulkRowError(row=number, detail=_format_errors(exc)))
+            continue
+
+        if book.serial in seen:
+            conflicts.append(BulkRowError(
+                row=number,
+                serial=book.serial,
+                detail=f"Serial number {book.serial} appears more than once in the upload"
+            ))
+            continue
+        seen.add(book.serial)
+        valid.append((number, book))
+    return valid, errors, conflicts
+
+
+async def insert_batch(db: AsyncSession, books: List[BookCreate], works: WorkLookup) -> Set[str]:
+    """Insert a batch of books, skipping existing serials; return the inserted serials.
+
+    Each distinct (title, author) in the batch is resolved to its work once,
+    mostly from the in-process lookup, so copies only carry the two ids.
+    """
+    if not books:
+        return set()
+
+    keys = await works.resolve(db, {(book.title, book.author) for book in books})
+    rows = [_as_row(book, keys[book.title, book.author]) for book in books]
+    dialect = db.get_bind().dialect
+    if dialect.name == "postgresql" and dialect.driver == "asyncpg":
+        return await _copy_batch(db, rows)
+
+    insert = pg_insert if dialect.name == "postgresql" else sqlite_insert
+    stmt = (
+        insert(Book)
+        .on_conflict_do_nothing(index_elements=[Book.serial])
+        .returning(Book.serial)
+    )
+    result = await db.execute(stmt, rows)
+    return set(result.scalars().all())
+
+
+async def _copy_batch(db: AsyncSession, rows: List[Dict[str, Any]]) -> Set[str]:
+    """COPY a batch into a temp table, then move it into books with ON CONFLICT"""
+    columns = ", ".join(IMPORT_COLUMNS)
+    conn = await db.connection()
+    # Running through SQLAlchemy first also opens the transaction COPY joins
+    await conn.exec_driver_sql(
+        "CREATE TEMP TABLE IF NOT EXISTS books_import "
+        "(LIKE books INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    )
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(
+        "books_import",
+        records=[tuple(row[c] for c in IMPORT_COLUMNS) for row in rows],
+        columns=IMPORT_COLUMNS,
+    )
+    result = await conn.exec_driver_sql(
+        f"INSERT INTO books ({columns}) SELECT {columns} FROM books_import "
+        "ON CONFLICT (serial) DO NOTHING RETURNING serial"
+    )
+    inserted = {row[0] for row in result}
+    await conn.exec_driver_sql("TRUNCATE books_import")
+    return inserted
+
+
+def existing_conflicts(
+    valid: List[Tuple[int, BookCreate]],
+    inserted: Set[str],
+) -> List[BulkRowError]:
+    """Report validated rows that were skipped because the serial already exists"""
+    return [
+        BulkRowError(
+            row=number,
+            serial=book.serial,
+            detail=f"Book with serial number {book.serial} already exists"
+        )
+        for number, book in valid
+        if book.serial not in inserted
+    ]
+
+
+def _as_row(book: BookCreate, key: WorkKey) -> dict:
+    return {
+        "serial": book.serial,
+        "work_id": key.work_id,
+        "author_id": key.author_id,
+        "is_borrowed": False,
+    }
+
+
+def _format_errors(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}"
+        for error in exc.errors()
+    )
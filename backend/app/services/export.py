@@ -0,0 +1,165 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: pip install pyarrow
+    pyarrow = None
+
+from app.compression import StreamCompressor
+from app.serialization import BOOK_FIELDS, dump_books_ndjson
+
+# Rows fetched per server-side cursor round trip and encoded at a time; also
+# the Parquet row group size. Bounds the memory an export holds at once
+EXPORT_BATCH_SIZE = 10000
+
+
+class ExportEncoder:
+    """Turns batches of book rows (BOOK_FIELDS order) into consecutive file chunks"""
+
+    media_type = "application/octet-stream"
+    extension = "bin"
+
+    def encode(self, rows: Sequence[Sequence]) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        """Trailing bytes after the last batch"""
+        return b""
+
+
+class NdjsonEncoder(ExportEncoder):
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def encode(self, rows):
+        return dump_books_ndjson(rows)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+class CsvEncoder(ExportEncoder):
+    """RFC 4180 CSV with a header row; empty fields are NULL, datetimes ISO 8601"""
+
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\r\n")
+        self._writer.writerow(BOOK_FIELDS)
+
+    def encode(self, rows):
+        self._writer.writerows([_csv_value(value) for value in row] for row in rows)
+        chunk = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return chunk
+
+    def finish(self):
+        # Only the header is still buffered when the export is empty
+        return self.encode(())
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands written bytes back instead of keeping them"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        chunk = b"".join(self._chunks)
+        self._chunks.clear()
+        return chunk
+
+
+class ParquetEncoder(ExportEncoder):
+    """One Parquet row group per batch, zstd-compressed columns"""
+
+    media_type = "application/vnd.apache.parquet"
+    extension = "parquet"
+
+    def __init__(self):
+        self.schema = pyarrow.schema([
+            ("serial", pyarrow.string()),
+            ("title", pyarrow.string()),
+            ("author", pyarrow.string()),
+            ("is_borrowed", pyarrow.bool_()),
+            ("borrowed_by", pyarrow.string()),
+            ("borrowed_at", pyarrow.timestamp("us")),
+            ("due_at", pyarrow.timestamp("us")),
+        ])
+        self._sink = _ChunkSink()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema, compression="zstd")
+
+    def encode(self, rows):
+        columns = zip(*rows)
+        batch = pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def finish(self):
+        self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+
+def create_encoder(format: str) -> ExportEncoder:
+    if format == "parquet" and pyarrow is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Parquet export is not available on this server (pyarrow is not installed)"
+        )
+    return ENCODERS[format]()
+
+
+async def export_books(
+    db: AsyncSession,
+    query,
+    encoder: ExportEncoder,
+    compressor: Optional[StreamCompressor] = None
+) -> AsyncIterator[bytes]:
+    """Stream `query` through `encoder` one server-side cursor batch at a time"""
+    result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        chunk = encoder.encode(rows)
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+        if chunk:
+            yield chunk
+    chunk = encoder.finish()
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.finish()
+    if chunk:
+        yield chunk
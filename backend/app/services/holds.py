@@ -0,0 +1,109 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, insert, literal, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.book import Book
+from app.models.hold import Hold
+from app.pagination import decode_cursor, encode_cursor
+from app.services.loans import not_found_detail
+
+
+async def queue_position(db: AsyncSession, hold: Hold) -> int:
+    """1 for the next in line; counts the entries ahead on ix_holds_serial_id"""
+    ahead = await db.scalar(
+        select(func.count()).where(Hold.serial == hold.serial, Hold.id < hold.id)
+    )
+    return ahead + 1
+
+
+async def place_hold(
+    db: AsyncSession,
+    serial: str,
+    card_number: str,
+    now: Optional[datetime] = None
+) -> Tuple[Hold, int]:
+    """Join the queue of a borrowed copy in one INSERT ... SELECT; returns the hold and its position.
+
+    The copy's row is read FOR SHARE, so a hold cannot slip in while a return
+    is handing the copy to the queue and be left waiting on an available book.
+    """
+    now = now or datetime.utcnow()
+    borrowed_by_someone_else = (
+        select(Book.serial, literal(card_number, Hold.card_number.type), literal(now, Hold.placed_at.type))
+        .where(
+            Book.serial == serial,
+            Book.is_borrowed == True,  # noqa: E712
+            or_(Book.borrowed_by.is_(None), Book.borrowed_by != card_number),
+        )
+        .with_for_update(read=True)
+    )
+    stmt = (
+        insert(Hold)
+        .from_select(["serial", "card_number", "placed_at"], borrowed_by_someone_else)
+        .returning(Hold.id)
+    )
+    try:
+        async with db.begin_nested():
+            hold_id = await db.scalar(stmt)
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Card {card_number} already has a hold on book with serial number {serial}"
+        )
+    if hold_id is None:
+        await _refused(db, serial, card_number)
+    hold = Hold(id=hold_id, serial=serial, card_number=card_number, placed_at=now)
+    return hold, await queue_position(db, hold)
+
+
+async def _refused(db: AsyncSession, serial: str, card_number: str):
+    """Explain why place_hold inserted nothing"""
+    book = (await db.execute(
+        select(Book.is_borrowed, Book.borrowed_by).where(Book.serial == serial)
+    )).one_or_none()
+    if book is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail(serial))
+    if not book.is_borrowed:
+        detail = f"Book with serial number {serial} is available; borrow it instead"
+    else:
+        detail = f"Book with serial number {serial} is already borrowed by card {card_number}"
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+async def list_holds(
+    db: AsyncSession,
+    serial: str,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Tuple[Hold, int]], Optional[str]]:
+    """One keyset page of a queue, next in line first, with each hold's position"""
+    query = select(Hold).where(Hold.serial == serial).order_by(Hold.id).limit(limit + 1)
+    if cursor is not None:
+        (after_id,) = decode_cursor(cursor, types=(int,))
+        query = query.where(Hold.id > after_id)
+    holds = list((await db.execute(query)).scalars().all())
+    next_cursor = None
+    if len(holds) > limit:
+        holds = holds[:limit]
+        next_cursor = encode_cursor(holds[-1].id)
+    if not holds:
+        return [], None
+    first = await queue_position(db, holds[0])
+    return [(hold, first + offset) for offset, hold in enumerate(holds)], next_cursor
+
+
+async def cancel_hold(db: AsyncSession, serial: str, card_number: str):
+    deleted = await db.scalar(
+        delete(Hold)
+        .where(Hold.serial == serial, Hold.card_number == card_number)
+        .returning(Hold.id)
+    )
+    if deleted is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Card {card_number} has no hold on book with serial number {serial}"
+        )
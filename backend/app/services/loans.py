@@ -0,0 +1,247 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, case, delete, exists, func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.config import settings
+from app.models.book import Book
+from app.models.hold import Hold
+from app.models.loan_event import LoanEvent, ensure_loan_event_partitions
+from app.pagination import decode_cursor, encode_cursor
+from app.serialization import BOOK_RETURNING
+
+
+class LoanFailure(NamedTuple):
+    status_code: int
+    detail: str
+
+
+def loan_update(action: str, card_number=None, now: Optional[datetime] = None):
+    """Build the conditional UPDATE for a loan action, guarded by the current loan status.
+
+    `card_number` may be a literal or a SQL expression (e.g. a CASE over serials).
+    """
+    if action == "borrow":
+        now = now or datetime.utcnow()
+        return (
+            update(Book)
+            .where(Book.is_borrowed == False)  # noqa: E712
+            .values(
+                is_borrowed=True,
+                borrowed_by=card_number,
+                borrowed_at=now,
+                due_at=now + timedelta(days=settings.loan_period_days)
+            )
+        )
+    return (
+        update(Book)
+        .where(Book.is_borrowed == True)  # noqa: E712
+        .values(is_borrowed=False, borrowed_by=None, borrowed_at=None, due_at=None)
+    )
+
+
+def loan_conflict_detail(serial: str, action: str) -> str:
+    if action == "borrow":
+        return f"Book with serial number {serial} is already borrowed"
+    return f"Book with serial number {serial} is not currently borrowed"
+
+
+def not_found_detail(serial: str) -> str:
+    return f"Book with serial number {serial} not found"
+
+
+async def apply_loan(
+    db: AsyncSession,
+    serial: str,
+    action: str,
+    card_number: Optional[str] = None
+) -> Row:
+    """Borrow or return a book in a single conditional UPDATE ... RETURNING.
+
+    The loan status check happens inside the UPDATE, so concurrent borrowers of
+    the same copy cannot both succeed and no row lock is held across Python code.
+    Only a failed update costs a second query, to tell 404 from 409. A returned
+    copy with holds is lent to the next in line in the same transaction, and
+    the book comes back as that loan left it (a row in BOOK_FIELDS order).
+    """
+    now = datetime.utcnow()
+    stmt = (
+        loan_update(action, card_number, now)
+        .where(Book.serial == serial)
+        .returning(*BOOK_RETURNING)
+    )
+    book = (await db.execute(stmt)).one_or_none()
+    if book is not None:
+        if action == "borrow":
+            await record_borrows(db, {serial: card_number}, now)
+        else:
+            await record_returns(db, [serial], now)
+            lent = await fulfil_holds(db, [serial], now)
+            book = lent.get(serial, book)
+        return book
+
+    found = await db.scalar(select(exists().where(Book.serial == serial)))
+    if not found:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=not_found_detail(serial)
+        )
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=loan_conflict_detail(serial, action)
+    )
+
+
+async def apply_loan_batch(
+    db: AsyncSession,
+    items: Iterable[Tuple[str, str, Optional[str]]]
+) -> Tuple[Dict[str, Row], Dict[str, LoanFailure]]:
+    """Apply many (serial, action, card_number) loan operations with set-based UPDATEs.
+
+    All borrows go out as one UPDATE (borrowers picked per serial with CASE) and
+    all returns as another; a single lookup then classifies the failures. The
+    caller owns the transaction and decides whether to commit or roll back.
+    """
+    items = list(items)
+    now = datetime.utcnow()
+    borrows = {serial: card for serial, action, card in items if action == "borrow"}
+    returns = [serial for serial, action, _ in items if action == "return"]
+
+    succeeded: Dict[str, Row] = {}
+    if borrows:
+        borrowed_by = case(borrows, value=Book.serial)
+        stmt = (
+            loan_update("borrow", borrowed_by, now)
+            .where(Book.serial.in_(borrows))
+            .returning(*BOOK_RETURNING)
+        )
+        borrowed = {book.serial: book for book in await db.execute(stmt)}
+        await record_borrows(db, {serial: borrows[serial] for serial in borrowed}, now)
+        succeeded.update(borrowed)
+    if returns:
+        stmt = (
+            loan_update("return")
+            .where(Book.serial.in_(returns))
+            .returning(*BOOK_RETURNING)
+        )
+        returned = {book.serial: book for book in await db.execute(stmt)}
+        await record_returns(db, list(returned), now)
+        succeeded.update(returned)
+        succeeded.update(await fulfil_holds(db, list(returned), now))
+
+    failed = [serial for serial in [*borrows, *returns] if serial not in succeeded]
+    failures: Dict[str, LoanFailure] = {}
+    if failed:
+        existing = set(
+            (await db.execute(select(Book.serial).where(Book.serial.in_(failed)))).scalars()
+        )
+        for serial in failed:
+            action = "borrow" if serial in borrows else "return"
+            if serial in existing:
+                failures[serial] = LoanFailure(
+                    status.HTTP_409_CONFLICT, loan_conflict_detail(serial, action)
+                )
+            else:
+                failures[serial] = LoanFailure(
+                    status.HTTP_404_NOT_FOUND, not_found_detail(serial)
+                )
+    return succeeded, failures
+
+
+async def fulfil_holds(db: AsyncSession, serials: List[str], now: datetime) -> Dict[str, Row]:
+    """Lend just-returned copies to the first patron in each one's hold queue.
+
+    The heads are claimed with DELETE ... RETURNING, so a hold is fulfilled at
+    most once; a head cancelled concurrently is skipped for the next entry.
+    """
+    lent: Dict[str, str] = {}
+    pending = list(serials)
+    while pending:
+        heads = dict((await db.execute(
+            select(Hold.serial, func.min(Hold.id)).where(Hold.serial.in_(pending)).group_by(Hold.serial)
+        )).all())
+        if not heads:
+            break
+        claimed = dict((await db.execute(
+            delete(Hold).where(Hold.id.in_(heads.values())).returning(Hold.serial, Hold.card_number)
+        )).all())
+        lent.update(claimed)
+        pending = [serial for serial in heads if serial not in claimed]
+    if not lent:
+        return {}
+
+    stmt = (
+        loan_update("borrow", case(lent, value=Book.serial), now)
+        .where(Book.serial.in_(lent))
+        .returning(*BOOK_RETURNING)
+    )
+    books = {book.serial: book for book in await db.execute(stmt)}
+    await record_borrows(db, {serial: lent[serial] for serial in books}, now)
+    return books
+
+
+async def record_borrows(db: AsyncSession, borrows: Dict[str, str], now: datetime):
+    """Append borrow events for {serial: card_number} in one INSERT"""
+    if not borrows:
+        return
+    await db.execute(insert(LoanEvent).values([
+        {"serial": serial, "card_number": card, "action": "borrow", "occurred_at": now}
+        for serial, card in borrows.items()
+    ]))
+
+
+async def record_returns(db: AsyncSession, serials: List[str], now: datetime):
+    """Append return events in one INSERT ... SELECT.
+
+    The books row no longer knows who returned it, so the card is taken from
+    the latest borrow event of each serial (an indexed lookup on serial, id).
+    """
+    if not serials:
+        return
+    last_borrower = (
+        select(LoanEvent.card_number)
+        .where(LoanEvent.serial == Book.serial, LoanEvent.action == "borrow")
+        .order_by(LoanEvent.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(insert(LoanEvent).from_select(
+        ["serial", "card_number", "action", "occurred_at"],
+        select(Book.serial, last_borrower, literal("return"), literal(now, LoanEvent.occurred_at.type))
+        .where(Book.serial.in_(serials))
+    ))
+
+
+async def loan_history(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    serial: Optional[str] = None,
+    card_number: Optional[str] = None,
+) -> Tuple[List[LoanEvent], Optional[str]]:
+    """Newest-first page of loan events for a serial or a card, keyset-paginated on id"""
+    query = select(LoanEvent).order_by(LoanEvent.id.desc()).limit(limit + 1)
+    if serial is not None:
+        query = query.where(LoanEvent.serial == serial)
+    if card_number is not None:
+        query = query.where(LoanEvent.card_number == card_number)
+    if cursor is not None:
+        (before_id,) = decode_cursor(cursor, types=(int,))
+        query = query.where(LoanEvent.id < before_id)
+
+    events = list((await db.execute(query)).scalars().all())
+    next_cursor = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_cursor = encode_cursor(events[-1].id)
+    return events, next_cursor
+
+
+async def create_loan_event_partitions(engine: AsyncEngine):
+    """Create the upcoming monthly loan_events partitions (PostgreSQL only)"""
+    if engine.dialect.name != "postgresql":
+        return
+    async with engine.begin() as conn:
+        await conn.run_sync(ensure_loan_event_partitions)
@@ -0,0 +1,131 @@
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metrics import OVERDUE_LOANS
+from app.models.book import Book
+from app.models.job_checkpoint import JobCheckpoint
+from app.pagination import decode_cursor, encode_cursor
+from app.serialization import select_books
+
+logger = logging.getLogger("app.overdue")
+
+SCAN_JOB = "overdue_scan"
+
+OverdueHandler = Callable[[AsyncSession, Sequence], Awaitable[None]]
+
+
+def overdue_query(as_of: datetime):
+    """Borrowed books due before `as_of`, in the (due_at, serial) order of ix_books_overdue"""
+    return (
+        select_books()
+        .where(Book.is_borrowed == True, Book.due_at <= as_of)  # noqa: E712
+        .order_by(Book.due_at, Book.serial)
+    )
+
+
+def _after(due_at: datetime, serial: str):
+    return tuple_(Book.due_at, Book.serial) > tuple_(due_at, serial)
+
+
+def _decode_position(cursor: str) -> Tuple[datetime, str]:
+    due_at, serial = decode_cursor(cursor, size=2, types=(str, str))
+    try:
+        return datetime.fromisoformat(due_at), serial
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+
+async def list_overdue(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    now: Optional[datetime] = None
+) -> Tuple[List, Optional[str]]:
+    """One keyset page of overdue loans, longest overdue first"""
+    query = overdue_query(now or datetime.utcnow())
+    if cursor is not None:
+        query = query.where(_after(*_decode_position(cursor)))
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].due_at.isoformat(), rows[-1].serial)
+
+
+async def report_overdue(db: AsyncSession, rows: Sequence):
+    """Default handler for newly overdue loans: count and log them"""
+    OVERDUE_LOANS.inc(len(rows))
+    logger.info("%d loans became overdue (up to %s)", len(rows), rows[-1].due_at.isoformat())
+
+
+async def _checkpoint(db: AsyncSession) -> JobCheckpoint:
+    checkpoint = await db.get(JobCheckpoint, SCAN_JOB)
+    if checkpoint is not None:
+        return checkpoint
+    try:
+        async with db.begin_nested():
+            db.add(JobCheckpoint(name=SCAN_JOB, version=0))
+    except IntegrityError:
+        # Another worker created it first
+        pass
+    return await db.get(JobCheckpoint, SCAN_JOB, populate_existing=True)
+
+
+async def scan_overdue(
+    session_factory: async_sessionmaker,
+    batch_size: int,
+    handler: OverdueHandler = report_overdue,
+    now: Optional[datetime] = None
+) -> int:
+    """Hand loans that became overdue since the last run to `handler`, in batches.
+
+    Progress is a (due_at, serial) high-water mark in job_checkpoints, so every
+    run reads only loans past it through ix_books_overdue instead of rescanning
+    all loans. A new loan is always due after the mark, so nothing is missed.
+    Each batch is claimed by a conditional UPDATE on the checkpoint version:
+    when several workers run the scan, exactly one of them handles each batch.
+    The handler runs inside the claiming transaction; if it raises, the batch
+    is retried on the next run.
+    """
+    now = now or datetime.utcnow()
+    handled = 0
+    while True:
+        async with session_factory() as db:
+            checkpoint = await _checkpoint(db)
+            query = overdue_query(now).limit(batch_size)
+            if checkpoint.position_at is not None:
+                query = query.where(_after(checkpoint.position_at, checkpoint.position_key))
+            rows = (await db.execute(query)).all()
+            if not rows:
+                await db.commit()
+                return handled
+
+            claimed = await db.execute(
+                update(JobCheckpoint)
+                .where(JobCheckpoint.name == SCAN_JOB, JobCheckpoint.version == checkpoint.version)
+                .values(
+                    position_at=rows[-1].due_at,
+                    position_key=rows[-1].serial,
+                    version=JobCheckpoint.version + 1,
+                    updated_at=now,
+                )
+            )
+            if claimed.rowcount == 0:
+                # Another worker advanced the checkpoint meanwhile; let it continue
+                await db.rollback()
+                return handled
+
+            await handler(db, rows)
+            await db.commit()
+            handled += len(rows)
+            if len(rows) < batch_size:
+                return handled
@@ -0,0 +1,69 @@
+import re
+from typing import List
+
+from sqlalchemy import Row, column, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.work import SEARCH_DOCUMENT
+from app.serialization import BOOK_COLUMNS, BOOK_FIELDS
+
+# Search terms are reduced to word characters before reaching either query language
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Both indexes hold one entry per work; its copies are joined in afterwards
+POSTGRES_SEARCH = text(f"""
+    SELECT books.serial, works_search.title, works_search.author,
+           books.is_borrowed, books.borrowed_by, books.borrowed_at, books.due_at
+    FROM works_search
+    JOIN books ON books.work_id = works_search.work_id
+    WHERE {SEARCH_DOCUMENT} @@ to_tsquery('simple', :tsquery)
+       OR title % :q OR author % :q
+    ORDER BY ts_rank({SEARCH_DOCUMENT}, to_tsquery('simple', :tsquery)) DESC,
+             greatest(similarity(title, :q), similarity(author, :q)) DESC,
+             books.serial
+    LIMIT :limit
+""")
+
+SQLITE_SEARCH = text("""
+    SELECT books.serial, works_fts.title, works_fts.author,
+           books.is_borrowed, books.borrowed_by, books.borrowed_at, books.due_at
+    FROM works_fts
+    JOIN books ON books.work_id = works_fts.rowid
+    WHERE works_fts MATCH :match
+    ORDER BY bm25(works_fts), books.serial
+    LIMIT :limit
+""")
+
+# Result types, so datetimes and booleans come back decoded on SQLite too
+RESULT_COLUMNS = [column(field, source.type) for field, source in zip(BOOK_FIELDS, BOOK_COLUMNS)]
+
+
+def search_terms(q: str) -> List[str]:
+    return TERM_PATTERN.findall(q.lower())
+
+
+async def search_books(db: AsyncSession, q: str, limit: int) -> List[Row]:
+    """Ranked full-text search over title and author, as rows in BOOK_FIELDS order.
+
+    Every term is matched as a prefix so partially typed words ("harr pot")
+    already find results. PostgreSQL additionally matches near-misses through
+    trigram similarity; SQLite (FTS5) is prefix-only.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+
+    if db.get_bind().dialect.name == "postgresql":
+        stmt = POSTGRES_SEARCH.bindparams(
+            tsquery=" & ".join(f"{term}:*" for term in terms),
+            q=q,
+            limit=limit,
+        )
+    else:
+        stmt = SQLITE_SEARCH.bindparams(
+            match=" ".join(f'"{term}"*' for term in terms),
+            limit=limit,
+        )
+
+    result = await db.execute(stmt.columns(*RESULT_COLUMNS))
+    return list(result.all())
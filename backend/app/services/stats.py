@@ -0,0 +1,225 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, Date, case, cast, delete, func, select, type_coerce, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metrics import STATS_DRIFT
+from app.models.book import Book
+from app.models.circulation_stats import (
+    BOOKS_BORROWED_COUNTER,
+    BOOKS_TOTAL_COUNTER,
+    AuthorStats,
+    CirculationCounter,
+    DailyLoanStats,
+)
+from app.models.job_checkpoint import JobCheckpoint
+from app.models.loan_event import LoanEvent
+from app.models.work import Author
+
+logger = logging.getLogger("app.stats")
+
+RECONCILE_JOB = "stats_reconcile"
+TOTAL_COUNTERS = (BOOKS_TOTAL_COUNTER, BOOKS_BORROWED_COUNTER)
+# Counters and days summed over their shards
+COUNTER_TOTALS = (
+    select(CirculationCounter.name, cast(func.sum(CirculationCounter.value), BigInteger))
+    .where(CirculationCounter.name.in_(TOTAL_COUNTERS))
+    .group_by(CirculationCounter.name)
+)
+DAY_TOTALS = (
+    select(DailyLoanStats.day, func.sum(DailyLoanStats.borrows), func.sum(DailyLoanStats.returns))
+    .group_by(DailyLoanStats.day)
+)
+# Days of loan history the reconciliation checks; loan events are appended
+# with the current time, so earlier days no longer change
+RECONCILE_LOAN_DAYS = 35
+
+
+async def circulation_stats(
+    db: AsyncSession,
+    authors: Sequence[str] = (),
+    top_authors: int = 10,
+    days: int = 30,
+    today: Optional[date] = None
+) -> dict:
+    """Totals, per-author counts and loans per day, read from the maintained counters.
+
+    Per-author counts are given for `authors` when any are named, otherwise for
+    the `top_authors` authors with the most books. `loans_per_day` covers the
+    last `days` days including today, with zeros for days without loans.
+    """
+    counters = dict((await db.execute(COUNTER_TOTALS)).all())
+    total = counters.get(BOOKS_TOTAL_COUNTER, 0)
+    borrowed = counters.get(BOOKS_BORROWED_COUNTER, 0)
+
+    query = (
+        select(Author.name, AuthorStats.total, AuthorStats.borrowed)
+        .join(Author, Author.id == AuthorStats.author_id)
+    )
+    if authors:
+        found = {row.name: row for row in (await db.execute(query.where(Author.name.in_(authors)))).all()}
+        author_rows = [found.get(author, (author, 0, 0)) for author in dict.fromkeys(authors)]
+    else:
+        author_rows = (await db.execute(
+            query.order_by(AuthorStats.total.desc(), Author.name).limit(top_authors)
+        )).all()
+
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=days - 1)
+    loans = {
+        row[0]: row for row in (await db.execute(
+            DAY_TOTALS.where(DailyLoanStats.day >= first_day, DailyLoanStats.day <= today)
+        )).all()
+    }
+    loans_per_day = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        _, borrows, returns = loans.get(day, (day, 0, 0))
+        loans_per_day.append({"day": day, "borrows": borrows, "returns": returns})
+
+    return {
+        "total_books": total,
+        "borrowed_books": borrowed,
+        "available_books": total - borrowed,
+        "authors": [
+            {"author": author, "total": author_total, "borrowed": author_borrowed}
+            for author, author_total, author_borrowed in author_rows
+        ],
+        "loans_per_day": loans_per_day,
+    }
+
+
+def _keyed(rows) -> Dict:
+    """Rows of (key, *counts) as {key: counts}"""
+    return {row[0]: tuple(row[1:]) for row in rows}
+
+
+def _drift(counted: Dict, scanned: Dict, zero: Tuple) -> Dict:
+    """Per key, what has to be added to the counted values to match the scan"""
+    drift = {}
+    for key in counted.keys() | scanned.keys():
+        have, want = counted.get(key, zero), scanned.get(key, zero)
+        if have != want:
+            drift[key] = tuple(w - h for h, w in zip(have, want))
+    return drift
+
+
+async def reconcile_stats(
+    session_factory: async_sessionmaker,
+    loan_days: int = RECONCILE_LOAN_DAYS,
+    today: Optional[date] = None
+) -> int:
+    """Check the statistics counters against a full scan and correct any drift.
+
+    Counters and rows are read from one snapshot (the triggers change both in
+    the same transaction), and corrections are applied as increments, so
+    writes committed in between are neither lost nor counted twice. Returns
+    the number of corrected rows.
+
+    Every worker runs this job. A run applies its corrections only if it can
+    claim the job_checkpoints version it read in its snapshot (a conditional
+    UPDATE, as in scan_overdue): runs that computed the same drift from an
+    older snapshot find the version moved on and apply nothing.
+    """
+    today = today or datetime.utcnow().date()
+    first_day = today - timedelta(days=loan_days - 1)
+    async with session_factory() as session:
+        dialect = session.get_bind().dialect.name
+        if dialect == "postgresql":
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        is_borrowed = func.coalesce(func.sum(case((Book.is_borrowed, 1), else_=0)), 0)
+        claimed_version = await session.scalar(
+            select(JobCheckpoint.version).where(JobCheckpoint.name == RECONCILE_JOB)
+        )
+
+        counted_totals = _keyed(await session.execute(COUNTER_TOTALS))
+        total, borrowed = (await session.execute(select(func.count(), is_borrowed).select_from(Book))).one()
+        scanned_totals = {BOOKS_TOTAL_COUNTER: (total,), BOOKS_BORROWED_COUNTER: (borrowed,)}
+
+        counted_authors = _keyed(await session.execute(
+            select(AuthorStats.author_id, AuthorStats.total, AuthorStats.borrowed)
+        ))
+        scanned_authors = _keyed(await session.execute(
+            select(Book.author_id, func.count(), is_borrowed).group_by(Book.author_id)
+        ))
+
+        counted_days = _keyed(await session.execute(DAY_TOTALS.where(DailyLoanStats.day >= first_day)))
+        day = (
+            cast(LoanEvent.occurred_at, Date) if dialect == "postgresql"
+            else type_coerce(func.date(LoanEvent.occurred_at), Date)
+        )
+        scanned_days = _keyed(await session.execute(
+            select(
+                day,
+                func.sum(case((LoanEvent.action == "borrow", 1), else_=0)),
+                func.sum(case((LoanEvent.action == "return", 1), else_=0)),
+            )
+            .where(LoanEvent.occurred_at >= datetime.combine(first_day, time()))
+            .group_by(day)
+        ))
+        await session.rollback()
+
+    totals_drift = _drift(counted_totals, scanned_totals, (0,))
+    authors_drift = _drift(counted_authors, scanned_authors, (0, 0))
+    days_drift = _drift(counted_days, scanned_days, (0, 0))
+    if not (totals_drift or authors_drift or days_drift):
+        return 0
+
+    insert = pg_insert if dialect == "postgresql" else sqlite_insert
+    async with session_factory() as session:
+        if claimed_version is None:
+            claim = insert(JobCheckpoint).values(
+                name=RECONCILE_JOB, version=1, updated_at=datetime.utcnow()
+            ).on_conflict_do_nothing()
+        else:
+            claim = (
+                update(JobCheckpoint)
+                .where(JobCheckpoint.name == RECONCILE_JOB, JobCheckpoint.version == claimed_version)
+                .values(version=JobCheckpoint.version + 1, updated_at=datetime.utcnow())
+            )
+        if (await session.execute(claim)).rowcount == 0:
+            # Another worker corrected the counters since this snapshot was taken
+            await session.rollback()
+            return 0
+        # Corrections go to shard 0; the sums are what is compared
+        if totals_drift:
+            stmt = insert(CirculationCounter).values([
+                {"name": name, "shard": 0, "value": delta} for name, (delta,) in totals_drift.items()
+            ])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[CirculationCounter.name, CirculationCounter.shard],
+                set_={"value": CirculationCounter.value + stmt.excluded.value},
+            ))
+        if authors_drift:
+            stmt = insert(AuthorStats).values([
+                {"author_id": author_id, "total": delta_total, "borrowed": delta_borrowed}
+                for author_id, (delta_total, delta_borrowed) in authors_drift.items()
+            ])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[AuthorStats.author_id],
+                set_={"total": AuthorStats.total + stmt.excluded.total,
+                      "borrowed": AuthorStats.borrowed + stmt.excluded.borrowed},
+            ))
+            await session.execute(delete(AuthorStats).where(AuthorStats.total <= 0))
+        if days_drift:
+            stmt = insert(DailyLoanStats).values([
+                {"day": loan_day, "shard": 0, "borrows": delta_borrows, "returns": delta_returns}
+                for loan_day, (delta_borrows, delta_returns) in days_drift.items()
+            ])
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[DailyLoanStats.day, DailyLoanStats.shard],
+                set_={"borrows": DailyLoanStats.borrows + stmt.excluded.borrows,
+                      "returns": DailyLoanStats.returns + stmt.excluded.returns},
+            ))
+        await session.commit()
+
+    for table, drift in (("circulation_counters", totals_drift), ("author_stats", authors_drift),
+                         ("daily_loan_stats", days_drift)):
+        if drift:
+            STATS_DRIFT.inc(len(drift), table=table)
+            logger.warning("Corrected %d drifted %s rows, e.g. %r: %r", len(drift), table, *next(iter(drift.items())))
+    return len(totals_drift) + len(authors_drift) + len(days_drift)
@@ -0,0 +1,125 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import BigInteger, String, cast, delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.book import Book
+from app.models.book_tombstone import BookTombstone
+from app.models.change_counter import TOMBSTONES_PRUNED_COUNTER, ChangeCounter
+from app.serialization import book_row_to_dict, select_books
+
+# Response header carrying the change version a snapshot is consistent with
+CHANGE_VERSION_HEADER = "X-Change-Version"
+# How often tombstones past their retention are deleted
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+
+class ChangePage(NamedTuple):
+    changes: List[dict]
+    next_since: int
+    has_more: bool
+
+
+async def _counter(db: AsyncSession, name: str) -> int:
+    value = await db.scalar(select(ChangeCounter.value).where(ChangeCounter.name == name))
+    return value or 0
+
+
+async def current_version(db: AsyncSession) -> int:
+    """Latest change version below which no change can still commit.
+
+    PostgreSQL draws versions from a sequence, so a transaction holding an
+    older version may commit after a newer one. Each row records the next
+    transaction id at the time its version was drawn (version_horizon): once
+    every transaction below it has finished, as the snapshot's xmin shows, no
+    smaller version is still in flight. xmin is read before the rows, so the
+    rows' snapshot holds every change it vouches for. SQLite has a single
+    writer and leaves the horizon NULL.
+    """
+    xmin = None
+    if db.get_bind().dialect.name == "postgresql":
+        xmin = await db.scalar(select(
+            cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), String), BigInteger)
+        ))
+
+    versions = [await _counter(db, TOMBSTONES_PRUNED_COUNTER)]
+    for model in (Book, BookTombstone):
+        query = select(func.max(model.row_version))
+        if xmin is not None:
+            query = query.where(or_(model.version_horizon.is_(None), model.version_horizon <= xmin))
+        versions.append(await db.scalar(query) or 0)
+    return max(versions)
+
+
+async def list_changes(db: AsyncSession, since: int, limit: int) -> ChangePage:
+    """Upserts and deletions after version `since`, oldest first.
+
+    Both sources are read in row_version order up to current_version and
+    merged, so a page never skips a change: resuming from `next_since`
+    continues exactly after it, even if a change with a smaller version
+    commits late.
+    """
+    pruned = await _counter(db, TOMBSTONES_PRUNED_COUNTER)
+    if since < pruned:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail=f"Deletions up to version {pruned} are no longer kept; bootstrap again from /books/snapshot"
+        )
+
+    until = await current_version(db)
+    upserts = (await db.execute(
+        select_books(Book.row_version)
+        .where(Book.row_version > since, Book.row_version <= until)
+        .order_by(Book.row_version)
+        .limit(limit + 1)
+    )).all()
+    deletions = (await db.execute(
+        select(BookTombstone.row_version, BookTombstone.serial)
+        .where(BookTombstone.row_version > since, BookTombstone.row_version <= until)
+        .order_by(BookTombstone.row_version)
+        .limit(limit + 1)
+    )).all()
+
+    merged = list(heapq.merge(
+        (("upsert", row) for row in upserts),
+        (("delete", row) for row in deletions),
+        key=lambda change: change[1][0],
+    ))
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    changes = []
+    for op, row in merged:
+        if op == "upsert":
+            book = book_row_to_dict(row[1:])
+            changes.append({"version": row[0], "op": op, "serial": book["serial"], "book": book})
+        else:
+            changes.append({"version": row[0], "op": op, "serial": row[1], "book": None})
+    return ChangePage(changes, merged[-1][1][0] if merged else since, has_more)
+
+
+async def prune_tombstones(
+    session_factory: async_sessionmaker, retention_days: float, now: Optional[datetime] = None
+) -> int:
+    """Drop tombstones older than the retention period.
+
+    Clients whose last sync predates the newest dropped tombstone get 410 from
+    list_changes and must bootstrap again.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    async with session_factory() as session:
+        horizon = await session.scalar(
+            select(func.max(BookTombstone.row_version)).where(BookTombstone.deleted_at < cutoff)
+        )
+        if horizon is None:
+            return 0
+        result = await session.execute(delete(BookTombstone).where(BookTombstone.row_version <= horizon))
+        await session.execute(
+            update(ChangeCounter)
+            .where(ChangeCounter.name == TOMBSTONES_PRUNED_COUNTER, ChangeCounter.value < horizon)
+            .values(value=horizon)
+        )
+        await session.commit()
+    return result.rowcount
@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from typing import Dict, Iterable, NamedTuple, Set, Tuple
+
+from sqlalchemy import event, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.work import Author, Work
+
+# (title, author) as given when creating a book
+WorkName = Tuple[str, str]
+
+# Session.info key holding what lookups learned in the open transaction
+PENDING_KEY = "work_lookup_pending"
+
+
+class WorkKey(NamedTuple):
+    work_id: int
+    author_id: int
+
+
+class WorkLookup:
+    """Per-worker LRU of (title, author) -> work and author ids.
+
+    Creating a copy of a known work then costs no query at all; misses are
+    looked up and, if new, inserted in one round trip per table. What a
+    transaction learned is cached only after it commits, so ids of rows that
+    were rolled back are never handed out.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[WorkName, WorkKey]" = OrderedDict()
+
+    async def resolve(self, db: AsyncSession, names: Iterable[WorkName]) -> Dict[WorkName, WorkKey]:
+        """Ids for each (title, author), creating the works and authors that do not exist yet"""
+        resolved: Dict[WorkName, WorkKey] = {}
+        missing: Set[WorkName] = set()
+        for name in names:
+            key = self._entries.get(name)
+            if key is None:
+                missing.add(name)
+            else:
+                self._entries.move_to_end(name)
+                resolved[name] = key
+        if missing:
+            found = await find_or_create_works(db, missing)
+            db.info.setdefault(PENDING_KEY, []).append((self, found))
+            resolved.update(found)
+        return resolved
+
+    def remember(self, works: Dict[WorkName, WorkKey]):
+        self._entries.update(works)
+        for name in works:
+            self._entries.move_to_end(name)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+async def find_or_create_works(db: AsyncSession, names: Set[WorkName]) -> Dict[WorkName, WorkKey]:
+    """Look up works by (title, author), inserting the missing authors and works.
+
+    Inserts use ON CONFLICT DO NOTHING followed by a second lookup, so two
+    transactions creating the same work concurrently both end up with the row
+    that won.
+    """
+    insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+
+    author_names = {author for _, author in names}
+    author_ids = await _author_ids(db, author_names)
+    new_authors = author_names - author_ids.keys()
+    if new_authors:
+        await db.execute(
+            insert(Author).on_conflict_do_nothing(index_elements=[Author.name]),
+            [{"name": name} for name in sorted(new_authors)]
+        )
+        author_ids.update(await _author_ids(db, new_authors))
+
+    wanted = {(author_ids[author], title): (title, author) for title, author in names}
+    work_ids = await _work_ids(db, wanted.keys())
+    new_works = wanted.keys() - work_ids.keys()
+    if new_works:
+        await db.execute(
+            insert(Work).on_conflict_do_nothing(index_elements=[Work.author_id, Work.title]),
+            [{"author_id": author_id, "title": title} for author_id, title in sorted(new_works)]
+        )
+        work_ids.update(await _work_ids(db, new_works))
+
+    return {name: WorkKey(work_ids[key], key[0]) for key, name in wanted.items()}
+
+
+async def _author_ids(db: AsyncSession, names: Set[str]) -> Dict[str, int]:
+    return dict((await db.execute(select(Author.name, Author.id).where(Author.name.in_(names)))).all())
+
+
+async def _work_ids(db: AsyncSession, keys: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], int]:
+    rows = await db.execute(
+        select(Work.author_id, Work.title, Work.id).where(tuple_(Work.author_id, Work.title).in_(list(keys)))
+    )
+    return {(author_id, title): work_id for author_id, title, work_id in rows}
+
+
+def _remember_committed(session: Session):
+    for lookup, works in session.info.pop(PENDING_KEY, ()):
+        lookup.remember(works)
+
+
+def _forget_rolled_back(session: Session):
+    session.info.pop(PENDING_KEY, None)
+
+
+event.listen(Session, "after_commit", _remember_committed)
+event.listen(Session, "after_rollback", _forget_rolled_back)
+
+
+work_lookup = WorkLookup(max_entries=settings.work_lookup_max_entries)
+
+
+# Dependency for getting the work lookup cache
+def get_work_lookup() -> WorkLookup:
+    return work_lookup
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.config import settings
+from app.metrics import READ_COALESCING
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Share one execution between concurrent identical reads.
+
+    The first caller for a key runs `func`; callers arriving while it runs (or
+    within `window` seconds after it finished) await the same result instead
+    of issuing their own query. Failures are never shared after the fact: the
+    next caller runs `func` again.
+    """
+
+    def __init__(self, window: float = 0.0, enabled: bool = True):
+        self.window = window
+        self.enabled = enabled
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, name: str, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Run or join the flight for `key`; `name` labels the coalescing metrics"""
+        if not self.enabled:
+            return await func()
+        flight = self._flights.get(key)
+        if flight is not None:
+            READ_COALESCING.inc(route=name, result="coalesced")
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # The leader's request was cancelled before it finished; lead instead
+                return await self.do(name, key, func)
+
+        READ_COALESCING.inc(route=name, result="executed")
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        try:
+            result = await func()
+        except Exception as exc:
+            self._land(key, flight)
+            flight.set_exception(exc)
+            # Followers, if any, re-raise it; without them the exception is not an error
+            flight.exception()
+            raise
+        except BaseException:
+            self._land(key, flight)
+            flight.cancel()
+            raise
+        flight.set_result(result)
+        if self.window > 0:
+            asyncio.get_running_loop().call_later(self.window, self._land, key, flight)
+        else:
+            self._land(key, flight)
+        return result
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    def _land(self, key: Hashable, flight: asyncio.Future):
+        # A newer flight may already own the key
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+reads = SingleFlight(
+    window=settings.read_coalescing_window_ms / 1000,
+    enabled=settings.read_coalescing,
+)
+
+
+# Dependency for getting the read coalescer
+def get_single_flight() -> SingleFlight:
+    return reads
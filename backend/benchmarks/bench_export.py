@@ -0,0 +1,113 @@
+"""Throughput and memory of GET /books/export per format.
+
+Seeds a SQLite file with N books, then streams the whole table through each
+export encoder the way the endpoint does, reporting rows/s, MB/s of output
+and the peak resident set size seen while streaming. Run from the backend directory:
+
+    python -m benchmarks.bench_export --rows 1000000
+
+Peak RSS is sampled after every batch from /proc (Linux); elsewhere it falls
+back to the process high-water mark, which includes seeding.
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.compression import StreamCompressor
+from app.db import Base
+from app.models import Book
+from app.serialization import select_books
+from app.services import export
+from app.services.works import find_or_create_works
+
+SEED_BATCH_SIZE = 10000
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # ru_maxrss is in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(session_factory, count: int):
+    async with session_factory() as session:
+        for start in range(0, count, SEED_BATCH_SIZE):
+            batch = range(start, min(start + SEED_BATCH_SIZE, count))
+            works = await find_or_create_works(session, {(f"Title number {i}", f"Author {i % 5000}") for i in batch})
+            await session.execute(insert(Book), [
+                {
+                    "serial": f"{i:06d}",
+                    "work_id": works[f"Title number {i}", f"Author {i % 5000}"].work_id,
+                    "author_id": works[f"Title number {i}", f"Author {i % 5000}"].author_id,
+                    "is_borrowed": i % 3 == 0,
+                    "borrowed_by": f"{i % 999999:06d}" if i % 3 == 0 else None,
+                    "borrowed_at": datetime(2024, 1, 1, 12, 30) if i % 3 == 0 else None,
+                    "due_at": datetime(2024, 1, 15, 12, 30) if i % 3 == 0 else None,
+                }
+                for i in batch
+            ])
+        await session.commit()
+
+
+async def measure(session_factory, rows: int, format: str, use_gzip: bool) -> dict:
+    encoder = export.create_encoder(format)
+    compressor = StreamCompressor("gzip") if use_gzip else None
+    query = select_books().order_by(Book.serial)
+    size, peak, baseline = 0, 0.0, rss_mb()
+    async with session_factory() as session:
+        started = time.perf_counter()
+        async for chunk in export.export_books(session, query, encoder, compressor):
+            size += len(chunk)
+            peak = max(peak, rss_mb())
+        elapsed = time.perf_counter() - started
+    return {
+        "format": format + (".gz" if use_gzip else ""),
+        "mb": size / 2**20,
+        "seconds": elapsed,
+        "mb_per_second": size / 2**20 / elapsed,
+        "rows_per_second": rows / elapsed,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": peak - baseline,
+    }
+
+
+async def main(rows: int, formats):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/export.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        await seed(session_factory, rows)
+
+        print(f"{rows} rows, batch size {export.EXPORT_BATCH_SIZE}")
+        print(f"{'format':>12} {'MB':>9} {'seconds':>9} {'MB/s':>9} {'rows/s':>10} {'peak RSS MB':>12} {'growth MB':>10}")
+        for format in formats:
+            if format == "parquet" and export.pyarrow is None:
+                print(f"{format:>12}  skipped (pyarrow is not installed)")
+                continue
+            for use_gzip in (False, True):
+                result = await measure(session_factory, rows, format, use_gzip)
+                print(
+                    f"{result['format']:>12} {result['mb']:>9.1f} {result['seconds']:>9.2f} "
+                    f"{result['mb_per_second']:>9.1f} {result['rows_per_second']:>10.0f} "
+                    f"{result['peak_rss_mb']:>12.1f} {result['rss_growth_mb']:>10.1f}"
+                )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--formats", nargs="+", default=list(export.ENCODERS), choices=list(export.ENCODERS))
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.formats))
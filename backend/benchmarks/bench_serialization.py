@@ -0,0 +1,91 @@
+"""Compare the ORM + BookResponse list path with the Core + orjson fast path.
+
+Seeds an in-memory SQLite database and, for each page size, times fetching and
+encoding one page both ways. Run from the backend directory:
+
+    python -m benchmarks.bench_serialization --sizes 10000 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db import Base
+from app.models import Book
+from app.schemas.book import BookResponse
+from app.serialization import dump_books, select_books
+from app.services.works import find_or_create_works
+
+
+async def seed(session_factory, count: int):
+    async with session_factory() as session:
+        for start in range(0, count, 10000):
+            batch = range(start, min(start + 10000, count))
+            works = await find_or_create_works(session, {(f"Title number {i}", f"Author {i % 5000}") for i in batch})
+            await session.execute(insert(Book), [
+                {
+                    "serial": f"{i:06d}",
+                    "work_id": works[f"Title number {i}", f"Author {i % 5000}"].work_id,
+                    "author_id": works[f"Title number {i}", f"Author {i % 5000}"].author_id,
+                    "is_borrowed": i % 3 == 0,
+                    "borrowed_by": f"{i % 999999:06d}" if i % 3 == 0 else None,
+                    "borrowed_at": datetime(2024, 1, 1, 12, 30) if i % 3 == 0 else None,
+                }
+                for i in batch
+            ])
+        await session.commit()
+
+
+async def orm_page(session: AsyncSession, limit: int) -> bytes:
+    """Previous path: ORM instances, response-model validation, jsonable_encoder"""
+    result = await session.execute(select(Book).order_by(Book.serial).limit(limit))
+    books = result.scalars().all()
+    validated = [BookResponse.model_validate(book) for book in books]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+async def fast_page(session: AsyncSession, limit: int) -> bytes:
+    """Fast path: Core column tuples encoded straight to bytes with orjson"""
+    result = await session.execute(select_books().order_by(Book.serial).limit(limit))
+    return dump_books(result.all())
+
+
+async def measure(session_factory, page, limit: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # Fresh session each run so the ORM path pays for its identity map
+        async with session_factory() as session:
+            started = time.perf_counter()
+            body = await page(session, limit)
+            best = min(best, time.perf_counter() - started)
+    assert body.startswith(b"[")
+    return best
+
+
+async def main(sizes, repeat: int):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(session_factory, max(sizes))
+
+    print(f"{'rows':>8} {'orm rows/s':>12} {'fast rows/s':>12} {'speedup':>8}")
+    for size in sizes:
+        orm = await measure(session_factory, orm_page, size, repeat)
+        fast = await measure(session_factory, fast_page, size, repeat)
+        print(f"{size:>8} {size / orm:>12,.0f} {size / fast:>12,.0f} {orm / fast:>7.1f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.repeat))
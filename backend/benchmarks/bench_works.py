@@ -0,0 +1,107 @@
+"""Table size and author-filter latency before and after the works migration.
+
+Migrates a SQLite file to 0009 (titles and authors stored on every book),
+seeds N books as copies of M works, measures the size of books and its indexes
+(from dbstat) and the latency of a GET /books/?author= page, then upgrades to
+head (0010: books reference works and authors) and measures again. Run from
+the backend directory:
+
+    python -m benchmarks.bench_works --books 200000 --works 5000 --authors 1000
+
+Both sides are VACUUMed before measuring, so the sizes compare live data only.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.migrations import upgrade
+from app.models import Author, Book
+from app.serialization import select_books
+
+PAGE_SIZE = 50
+
+OLD_AUTHOR_PAGE = text(
+    "SELECT serial, title, author, is_borrowed, borrowed_by, borrowed_at, due_at FROM books "
+    "WHERE author = :author ORDER BY serial LIMIT :limit"
+)
+
+
+def new_author_page():
+    """The query GET /books/?author= runs after the migration"""
+    author_id = select(Author.id).where(Author.name == bindparam("author")).scalar_subquery()
+    return select_books().where(Book.author_id == author_id).order_by(Book.serial).limit(PAGE_SIZE)
+
+
+async def seed(engine, books: int, works: int, authors: int):
+    rows = [
+        {"serial": f"{i:06d}", "title": f"Title number {i % works}", "author": f"Author {i % works % authors}"}
+        for i in range(books)
+    ]
+    async with engine.begin() as conn:
+        for start in range(0, books, 10000):
+            await conn.execute(
+                text("INSERT INTO books (serial, title, author, is_borrowed) VALUES (:serial, :title, :author, 0)"),
+                rows[start:start + 10000],
+            )
+
+
+async def books_size_mb(engine) -> float:
+    """Size of books plus its indexes, after a VACUUM"""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM"))
+        size = await conn.scalar(text(
+            "SELECT sum(pgsize) FROM dbstat WHERE name = 'books' "
+            "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'books')"
+        ))
+    return size / 2**20
+
+
+async def author_page_ms(engine, query, authors: int, repeat: int) -> float:
+    """Median latency of one author-filtered page, over `repeat` random authors"""
+    timings = []
+    async with engine.connect() as conn:
+        for _ in range(repeat):
+            author = f"Author {random.randrange(authors)}"
+            started = time.perf_counter()
+            rows = (await conn.execute(query, {"author": author, "limit": PAGE_SIZE})).all()
+            timings.append(time.perf_counter() - started)
+            assert len(rows) == PAGE_SIZE
+    return statistics.median(timings) * 1000
+
+
+async def main(books: int, works: int, authors: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{directory}/works.db")
+        await upgrade(engine, "0009")
+        await seed(engine, books, works, authors)
+        before_mb = await books_size_mb(engine)
+        before_ms = await author_page_ms(engine, OLD_AUTHOR_PAGE, authors, repeat)
+
+        started = time.perf_counter()
+        await upgrade(engine)
+        migration_seconds = time.perf_counter() - started
+        after_mb = await books_size_mb(engine)
+        after_ms = await author_page_ms(engine, new_author_page(), authors, repeat)
+        await engine.dispose()
+
+    print(f"{books} books, {works} works, {authors} authors; migration took {migration_seconds:.1f}s")
+    print(f"{'':>16} {'books MB':>9} {'author page ms':>15}")
+    print(f"{'title/author':>16} {before_mb:>9.1f} {before_ms:>15.3f}")
+    print(f"{'works/authors':>16} {after_mb:>9.1f} {after_ms:>15.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--works", type=int, default=5000)
+    parser.add_argument("--authors", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.books, args.works, args.authors, args.repeat))
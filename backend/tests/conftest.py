@@ -2,12 +2,17 @@ import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from sqlalchemy import delete
 
-from app.db import Base, get_db
+from app.cache import BookCache, MemoryCache, get_cache
+from app.db import Base, get_db, get_read_db
+from app.events import EventBroker, get_events
+from app.idempotency import Idempotency, MemoryIdempotencyStore, get_idempotency
 from app.main import app
 from app.models import Book
+from app.ratelimit import get_rate_limiter
+from app.services.works import WorkLookup, find_or_create_works, get_work_lookup
 
 
 # Test database URL (SQLite in-memory for testing)
@@ -49,13 +54,44 @@ async def test_session(test_engine):
         yield session
 
 
+@pytest.fixture(scope="function")
+def test_cache():
+    """Create an empty in-process response cache"""
+    return BookCache(MemoryCache(max_entries=100), ttl=60)
+
+
+@pytest.fixture(scope="function")
+def test_events():
+    """Create an in-process event broker with no subscribers"""
+    return EventBroker(queue_size=10)
+
+
+@pytest.fixture(scope="function")
+def test_idempotency():
+    """Create an empty Idempotency-Key store"""
+    return Idempotency(MemoryIdempotencyStore(max_entries=100))
+
+
+@pytest.fixture(scope="function")
+def test_works():
+    """Create an empty (title, author) lookup cache"""
+    return WorkLookup(max_entries=100)
+
+
 @pytest_asyncio.fixture(scope="function")
-async def client(test_session):
+async def client(test_session, test_cache, test_events, test_idempotency, test_works):
     """Create a test client with overridden database dependency"""
     async def override_get_db():
         yield test_session
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_cache] = lambda: test_cache
+    app.dependency_overrides[get_events] = lambda: test_events
+    app.dependency_overrides[get_idempotency] = lambda: test_idempotency
+    app.dependency_overrides[get_work_lookup] = lambda: test_works
+    # Tests issue far more writes from one address than the limits allow
+    app.dependency_overrides[get_rate_limiter] = lambda: None
     
     async with AsyncClient(app=app, base_url="http://test") as ac:
         yield ac
@@ -66,10 +102,12 @@ async def client(test_session):
 @pytest_asyncio.fixture(scope="function")
 async def sample_book(test_session):
     """Create a sample book for testing"""
+    works = await find_or_create_works(test_session, {("Test Book", "Test Author")})
+    work = works["Test Book", "Test Author"]
     book = Book(
         serial="123456",
-        title="Test Book",
-        author="Test Author",
+        work_id=work.work_id,
+        author_id=work.author_id,
         is_borrowed=False,
         borrowed_by=None,
         borrowed_at=None
@@ -82,3 +120,50 @@ async def sample_book(test_session):
     await test_session.execute(delete(Book).where(Book.serial == book.serial))
     await test_session.commit()
 
+
+
+@pytest_asyncio.fixture(scope="function")
+async def file_engine(tmp_path):
+    """Create a file-backed SQLite engine whose pool hands out separate connections"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'library.db'}",
+        connect_args={"timeout": 30},
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=5,
+        max_overflow=0,
+    )
+
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        await conn.run_sync(Base.metadata.create_all)
+
+    yield engine
+
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def concurrent_client(file_engine, test_cache, test_events, test_idempotency, test_works):
+    """Create a test client that opens a new session per request, like get_db"""
+    session_factory = async_sessionmaker(
+        file_engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_cache] = lambda: test_cache
+    app.dependency_overrides[get_events] = lambda: test_events
+    app.dependency_overrides[get_idempotency] = lambda: test_idempotency
+    app.dependency_overrides[get_work_lookup] = lambda: test_works
+    app.dependency_overrides[get_rate_limiter] = lambda: None
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac
+
+    app.dependency_overrides.clear()
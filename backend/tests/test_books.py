@@ -1,8 +1,11 @@
+import json
+
 import pytest
 from httpx import AsyncClient
 from datetime import datetime
 
 from app.models import Book
+from app.pagination import encode_cursor
 
 
 @pytest.mark.asyncio
@@ -293,3 +296,93 @@ async def test_full_workflow(client: AsyncClient):
     final_get_response = await client.get("/books/")
     assert len(final_get_response.json()) == 0
 
+
+
+@pytest.mark.asyncio
+async def test_get_books_keyset_pagination(client: AsyncClient):
+    """Test walking the catalogue page by page with the next cursor"""
+    for i in range(5):
+        await client.post("/books/", json={
+            "serial": f"10000{i}",
+            "title": f"Book {i}",
+            "author": "Author"
+        })
+
+    first = await client.get("/books/", params={"limit": 2})
+    assert first.status_code == 200
+    assert [b["serial"] for b in first.json()] == ["100000", "100001"]
+    cursor = first.headers["x-next-cursor"]
+
+    second = await client.get("/books/", params={"limit": 2, "cursor": cursor})
+    assert [b["serial"] for b in second.json()] == ["100002", "100003"]
+
+    last = await client.get(
+        "/books/", params={"limit": 2, "cursor": second.headers["x-next-cursor"]}
+    )
+    assert [b["serial"] for b in last.json()] == ["100004"]
+    assert "x-next-cursor" not in last.headers
+
+
+@pytest.mark.asyncio
+async def test_get_books_invalid_cursor(client: AsyncClient):
+    """Test listing books with a malformed cursor"""
+    response = await client.get("/books/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+    # Well-formed cursors whose value is not a serial
+    for value in ({}, [1], None, 1):
+        response = await client.get("/books/", params={"cursor": encode_cursor(value)})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.asyncio
+async def test_get_books_filters(client: AsyncClient, sample_book):
+    """Test filtering books by loan status, author and borrower"""
+    await client.post("/books/", json={
+        "serial": "222222",
+        "title": "Other Book",
+        "author": "Other Author"
+    })
+    await client.patch("/books/123456/loan", json={
+        "action": "borrow",
+        "card_number": "654321"
+    })
+
+    borrowed = await client.get("/books/", params={"is_borrowed": True})
+    assert [b["serial"] for b in borrowed.json()] == ["123456"]
+
+    by_author = await client.get("/books/", params={"author": "Other Author"})
+    assert [b["serial"] for b in by_author.json()] == ["222222"]
+
+    by_card = await client.get("/books/", params={"borrowed_by": "654321"})
+    assert [b["serial"] for b in by_card.json()] == ["123456"]
+
+
+@pytest.mark.asyncio
+async def test_get_books_stream_ndjson(client: AsyncClient, sample_book):
+    """Test streaming the catalogue as NDJSON"""
+    response = await client.get("/books/", params={"stream": True})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["serial"] == "123456"
+    assert lines[0]["is_borrowed"] is False
+
+
+@pytest.mark.asyncio
+async def test_get_books_fast_path_matches_book_response(client: AsyncClient, sample_book):
+    """Test that list rows serialize exactly like BookResponse"""
+    loan = await client.patch("/books/123456/loan", json={
+        "action": "borrow",
+        "card_number": "654321"
+    })
+
+    listing = await client.get("/books/")
+    single = await client.get("/books/123456")
+    streamed = await client.get("/books/", params={"stream": True})
+
+    assert listing.json() == [loan.json()]
+    assert single.json() == loan.json()
+    assert json.loads(streamed.text) == loan.json()
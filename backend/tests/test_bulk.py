@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_json(client: AsyncClient, sample_book):
+    """Test bulk import of a JSON array with conflicts and invalid rows"""
+    rows = [
+        {"serial": "200001", "title": "First", "author": "Author"},
+        {"serial": "123456", "title": "Existing", "author": "Author"},
+        {"serial": "abc", "title": "Bad Serial", "author": "Author"},
+        {"serial": "200001", "title": "Repeated", "author": "Author"},
+        {"serial": "200002", "title": "Second", "author": "Author"},
+    ]
+    response = await client.post("/books/bulk", json=rows, params={"batch_size": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["received"] == 5
+    assert data["inserted"] == 2
+    assert [c["row"] for c in data["conflicts"]] == [2, 4]
+    assert data["conflicts"][0]["serial"] == "123456"
+    assert "already exists" in data["conflicts"][0]["detail"]
+    assert [e["row"] for e in data["errors"]] == [3]
+    assert data["rows_per_second"] >= 0
+
+    listing = await client.get("/books/")
+    assert [b["serial"] for b in listing.json()] == ["123456", "200001", "200002"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_ndjson(client: AsyncClient):
+    """Test bulk import of newline-delimited JSON"""
+    body = "\n".join([
+        json.dumps({"serial": "300001", "title": "One", "author": "A"}),
+        "{not json",
+        json.dumps({"serial": "300002", "title": "Two", "author": "B"}),
+    ])
+    response = await client.post(
+        "/books/bulk",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2
+    assert [e["row"] for e in data["errors"]] == [2]
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_csv(client: AsyncClient):
+    """Test bulk import of a CSV upload with a header row"""
+    body = "serial,title,author\n400001,\"Title, with comma\",Author\n400002,Other,Author\n"
+    response = await client.post(
+        "/books/bulk",
+        content=body,
+        headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 2
+
+    listing = await client.get("/books/")
+    assert listing.json()[0]["title"] == "Title, with comma"
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_unsupported_content_type(client: AsyncClient):
+    """Test bulk import with an unsupported content type"""
+    response = await client.post(
+        "/books/bulk",
+        content="serial title author",
+        headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 415
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_json_not_array(client: AsyncClient):
+    """Test bulk import of a JSON object instead of an array"""
+    response = await client.post("/books/bulk", json={"serial": "500001"})
+    assert response.status_code == 400
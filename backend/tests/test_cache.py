@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.cache import BookCache, MemoryCache, RedisCache
+
+
+class FakeRedis:
+    """In-memory stand-in for a redis.asyncio client"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+@pytest.mark.asyncio
+async def test_get_book_by_serial(client: AsyncClient, sample_book):
+    """Test getting a single book and a missing one"""
+    response = await client.get("/books/123456")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Test Book"
+
+    missing = await client.get("/books/999999")
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_list_page_cached_with_etag(client: AsyncClient, sample_book, test_cache):
+    """Test that repeated list reads hit the cache and honour If-None-Match"""
+    first = await client.get("/books/")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    second = await client.get("/books/")
+    assert second.json() == first.json()
+    assert second.headers["etag"] == etag
+    assert test_cache.stats()["hits"] == 1
+
+    not_modified = await client.get("/books/", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+
+@pytest.mark.asyncio
+async def test_cache_invalidated_by_writes(client: AsyncClient, sample_book):
+    """Test that create, loan and delete invalidate cached pages and books"""
+    etag = (await client.get("/books/")).headers["etag"]
+    await client.get("/books/123456")
+
+    await client.post("/books/", json={"serial": "222222", "title": "New", "author": "A"})
+    listing = await client.get("/books/", headers={"If-None-Match": etag})
+    assert listing.status_code == 200
+    assert [b["serial"] for b in listing.json()] == ["123456", "222222"]
+
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})
+    assert (await client.get("/books/123456")).json()["is_borrowed"] is True
+    borrowed = await client.get("/books/", params={"is_borrowed": True})
+    assert [b["serial"] for b in borrowed.json()] == ["123456"]
+
+    await client.delete("/books/123456")
+    assert (await client.get("/books/123456")).status_code == 404
+    assert [b["serial"] for b in (await client.get("/books/")).json()] == ["222222"]
+
+
+@pytest.mark.asyncio
+async def test_stale_book_fill_after_write_not_served(client: AsyncClient, sample_book, test_cache):
+    """Test that a read started before a write cannot cache its stale row for later reads"""
+    version = await test_cache.version()
+    stale = (await client.get("/books/123456")).content
+
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})
+    # The slow read finishes after the write invalidated the cache
+    await test_cache.set_book("123456", stale, generation=version.generation)
+
+    assert (await client.get("/books/123456")).json()["is_borrowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_cached_page_keeps_next_cursor(client: AsyncClient):
+    """Test that cached list pages still carry the pagination cursor"""
+    for serial in ("100001", "100002"):
+        await client.post("/books/", json={"serial": serial, "title": "T", "author": "A"})
+
+    first = await client.get("/books/", params={"limit": 1})
+    cached = await client.get("/books/", params={"limit": 1})
+    assert cached.headers["x-next-cursor"] == first.headers["x-next-cursor"]
+
+
+@pytest.mark.asyncio
+async def test_admin_cache_status(client: AsyncClient, sample_book):
+    """Test the cache statistics admin endpoint"""
+    await client.get("/books/")
+    await client.get("/books/")
+    data = (await client.get("/admin/cache")).json()
+    assert data["backend"] == "memory"
+    assert data["hits"] == 1
+    assert data["misses"] == 1
+    assert data["entries"] == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_lru_and_ttl():
+    """Test LRU eviction and TTL expiry of the in-process backend"""
+    backend = MemoryCache(max_entries=2)
+    await backend.set("a", b"1", ttl=60)
+    await backend.set("b", b"2", ttl=60)
+    assert await backend.get("a") == b"1"
+    await backend.set("c", b"3", ttl=60)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == b"1"
+    assert backend.stats.evictions == 1
+
+    await backend.set("short", b"x", ttl=0.01)
+    await asyncio.sleep(0.02)
+    assert await backend.get("short") is None
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_with_fake_client():
+    """Test the Redis backend against a local fake client"""
+    cache = BookCache(RedisCache(FakeRedis()), ttl=60)
+    await cache.set_book("123456", b'{"serial":"123456"}')
+    page = await cache.get_book("123456")
+    assert page.body == b'{"serial":"123456"}'
+
+    key = await cache.list_key({"limit": 10})
+    await cache.set_list(key, b"[]", {"X-Next-Cursor": "abc"})
+    assert (await cache.get_list(key)).headers == {"X-Next-Cursor": "abc"}
+
+    await cache.invalidate(["123456"])
+    assert await cache.get_book("123456") is None
+    assert await cache.list_key({"limit": 10}) != key
+    assert cache.stats()["backend"] == "redis"
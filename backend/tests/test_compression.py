@@ -0,0 +1,195 @@
+import gzip
+import math
+import time
+from email.utils import formatdate
+
+import pytest
+from httpx import AsyncClient
+
+from app.cache import BookCache, MemoryCache, RedisCache, TableVersion, is_not_modified, validator_headers
+from app.compression import StreamCompressor, compress, negotiate
+from app.config import settings
+
+
+async def add_books(client: AsyncClient, count: int):
+    books = [
+        {"serial": f"{400000 + i}", "title": f"A fairly long title number {i}", "author": "Author"}
+        for i in range(count)
+    ]
+    response = await client.post("/books/bulk", json=books)
+    assert response.status_code == 200
+
+
+def test_negotiate_uses_q_values_then_server_order():
+    """Test Accept-Encoding negotiation"""
+    encodings = ("zstd", "br", "gzip")
+    assert negotiate("gzip, br", encodings) == "br"
+    assert negotiate("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+    assert negotiate("identity", encodings) is None
+    assert negotiate("*", ("gzip",)) == "gzip"
+    assert negotiate("gzip;q=0", ("gzip",)) is None
+    assert negotiate(None, encodings) is None
+
+
+def test_stream_compressor_round_trip():
+    """Test that flushed chunks decompress to the original stream"""
+    compressor = StreamCompressor("gzip")
+    chunks = [compressor.compress(b'{"n":%d}\n' % i) for i in range(3)]
+    chunks.append(compressor.finish())
+    assert all(chunks[:3])
+    assert gzip.decompress(b"".join(chunks)) == b'{"n":0}\n{"n":1}\n{"n":2}\n'
+
+
+@pytest.mark.parametrize("encoding", ["br", "zstd"])
+def test_optional_encodings(encoding):
+    """Test brotli and zstd when their packages are installed"""
+    module = pytest.importorskip({"br": "brotli", "zstd": "zstandard"}[encoding])
+    body = b"library " * 500
+    compressed = compress(body, encoding)
+    if encoding == "br":
+        assert module.decompress(compressed) == body
+    else:
+        assert module.ZstdDecompressor().decompress(compressed) == body
+
+
+@pytest.mark.asyncio
+async def test_list_compressed_above_min_size(client: AsyncClient, sample_book):
+    """Test that large pages are gzipped and small ones are sent as is"""
+    small = await client.get("/books/", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.headers["vary"] == "Accept-Encoding"
+
+    await add_books(client, 30)
+    large = await client.get("/books/", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert len(large.json()) == 31
+
+    plain = await client.get("/books/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == large.json()
+    assert plain.headers["etag"] == large.headers["etag"]
+
+
+@pytest.mark.asyncio
+async def test_compressed_variant_cached(client: AsyncClient, test_cache: BookCache, monkeypatch):
+    """Test that a cached page is compressed once per encoding"""
+    await add_books(client, 30)
+    calls = []
+    original = compress
+
+    def counting_compress(body, encoding):
+        calls.append(encoding)
+        return original(body, encoding)
+
+    monkeypatch.setattr("app.routers.books.compress", counting_compress)
+    for _ in range(3):
+        response = await client.get("/books/", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+    assert calls == ["gzip"]
+
+
+@pytest.mark.asyncio
+async def test_streamed_ndjson_compressed(client: AsyncClient):
+    """Test that streamed responses are compressed chunk by chunk"""
+    await add_books(client, 50)
+    response = await client.get("/books/", params={"stream": True}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 50
+
+
+@pytest.mark.asyncio
+async def test_other_routes_compressed_by_middleware(client: AsyncClient):
+    """Test that uncached JSON responses are compressed by the middleware"""
+    await add_books(client, 30)
+    response = await client.get("/books/search", params={"q": "title"}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 20
+
+
+@pytest.mark.asyncio
+async def test_not_modified_without_database(client: AsyncClient, sample_book, test_session, monkeypatch):
+    """Test that a matching validator is answered from the table version alone"""
+    listing = await client.get("/books/")
+    book = await client.get("/books/123456")
+
+    async def no_database(*args, **kwargs):
+        raise AssertionError("conditional request reached the database")
+
+    monkeypatch.setattr(test_session, "execute", no_database)
+    for path, response in (("/books/", listing), ("/books/123456", book)):
+        not_modified = await client.get(path, headers={"If-None-Match": response.headers["etag"]})
+        assert not_modified.status_code == 304
+        assert not_modified.headers["etag"] == response.headers["etag"]
+    monkeypatch.undo()
+
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})
+    changed = await client.get("/books/123456", headers={"If-None-Match": book.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json()["is_borrowed"] is True
+
+
+@pytest.mark.asyncio
+async def test_table_version_bumped_by_invalidate():
+    """Test that writes change the version and its Last-Modified time"""
+    cache = BookCache(RedisCache(FakeCounterRedis()), ttl=60)
+    before = await cache.version()
+    await cache.invalidate(["123456"])
+    after = await cache.version()
+    assert after.generation == before.generation + 1
+    assert after.last_modified >= before.last_modified
+    assert cache.etag(before, "book:123456") != cache.etag(after, "book:123456")
+    assert cache.etag(after, "book:123456").startswith('W/"')
+
+
+@pytest.mark.asyncio
+async def test_process_local_versions_are_scoped():
+    """Test that per-process caches never share validators"""
+    first = BookCache(MemoryCache(max_entries=10), ttl=60)
+    second = BookCache(MemoryCache(max_entries=10), ttl=60)
+    assert first.etag(await first.version(), "x") != second.etag(await second.version(), "x")
+
+
+def test_conditional_headers():
+    """Test If-None-Match precedence and If-Modified-Since handling"""
+    now = time.time()
+    version = TableVersion(generation=3, last_modified=int(now) - 100, scope="shared")
+    etag = 'W/"abc"'
+    since = formatdate(now - 50, usegmt=True)
+
+    assert is_not_modified({"if-none-match": etag}, etag, version.last_modified)
+    assert not is_not_modified({"if-none-match": 'W/"old"', "if-modified-since": since}, etag, version.last_modified)
+    assert is_not_modified({"if-modified-since": since}, etag, version.last_modified)
+    assert not is_not_modified({"if-modified-since": formatdate(now - 200, usegmt=True)}, etag, version.last_modified)
+    assert not is_not_modified({"if-modified-since": formatdate(now + 3600, usegmt=True)}, etag, version.last_modified)
+    assert not is_not_modified({"if-modified-since": "yesterday"}, etag, version.last_modified)
+
+    assert "Last-Modified" in validator_headers(etag, version, now)
+    fresh = version._replace(last_modified=math.ceil(now))
+    assert "Last-Modified" not in validator_headers(etag, fresh, now)
+
+
+def test_compression_settings_defaults():
+    """Test the default encoding preference"""
+    assert settings.compression_encodings == ["zstd", "br", "gzip"]
+    assert settings.compression_min_size == 1024
+
+
+class FakeCounterRedis:
+    """Minimal redis.asyncio stand-in for counter keys"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
@@ -0,0 +1,92 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import Settings
+from app.db import get_engine_options
+from app.db.pool import InstrumentedQueuePool, install_idle_pre_ping, pool_status
+
+PG_URL = "postgresql+asyncpg://library:library@db:5432/library"
+
+
+def test_engine_options_pool_settings():
+    """Test that pool settings are passed through to the engine"""
+    settings = Settings(
+        db_pool_size=20,
+        db_max_overflow=0,
+        db_pool_timeout=2.5,
+        db_pool_recycle=600,
+        db_statement_timeout_ms=5000,
+    )
+    options = get_engine_options(PG_URL, settings)
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 20
+    assert options["max_overflow"] == 0
+    assert options["pool_timeout"] == 2.5
+    assert options["pool_recycle"] == 600
+    assert options["pool_pre_ping"] is False
+    assert options["connect_args"]["statement_cache_size"] == 100
+    assert options["connect_args"]["server_settings"] == {"statement_timeout": "5000"}
+
+
+def test_engine_options_pgbouncer_mode():
+    """Test that PgBouncer mode disables prepared statement caching"""
+    options = get_engine_options(PG_URL, Settings(db_pgbouncer_mode=True))
+    connect_args = options["connect_args"]
+    assert connect_args["statement_cache_size"] == 0
+    assert connect_args["prepared_statement_cache_size"] == 0
+    assert connect_args["prepared_statement_name_func"]() != connect_args["prepared_statement_name_func"]()
+
+
+def test_engine_options_always_pre_ping():
+    """Test that an idle threshold of zero falls back to pinging every checkout"""
+    options = get_engine_options(PG_URL, Settings(db_pre_ping_idle_seconds=0))
+    assert options["pool_pre_ping"] is True
+
+
+def test_engine_options_sqlite():
+    """Test that SQLite engines keep their dialect's default pool"""
+    options = get_engine_options("sqlite+aiosqlite:///:memory:", Settings())
+    assert "poolclass" not in options
+    assert "connect_args" not in options
+
+
+@pytest.mark.asyncio
+async def test_instrumented_pool_and_idle_pre_ping(tmp_path):
+    """Test checkout statistics and that only idle connections are pinged"""
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+    )
+    install_idle_pre_ping(engine.sync_engine, idle_seconds=0.000001)
+
+    pings = []
+    original_ping = engine.sync_engine.dialect.do_ping
+    engine.sync_engine.dialect.do_ping = lambda conn: pings.append(conn) or original_ping(conn)
+    try:
+        for _ in range(3):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+    finally:
+        engine.sync_engine.dialect.do_ping = original_ping
+
+    status = pool_status(engine.pool)
+    assert status["checkouts"] == 3
+    assert status["size"] == 1
+    assert status["checked_out"] == 0
+    # The first checkout opened a fresh connection, so it was not pinged
+    assert len(pings) == 2
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_admin_pool_status(client: AsyncClient):
+    """Test the pool statistics admin endpoint"""
+    response = await client.get("/admin/pool")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["pool_class"] == "InstrumentedQueuePool"
+    assert data["size"] == 5
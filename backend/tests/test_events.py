@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.events import RESYNC_EVENT, EventBroker
+from app.routers.books import _event_stream
+
+
+def _drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_subscriptions_filter_by_serial_and_author():
+    """Test that events reach only subscriptions for their serial or author"""
+    broker = EventBroker()
+    everything = broker.subscribe()
+    by_serial = broker.subscribe(serials=["100001"])
+    by_author = broker.subscribe(authors=["Lem"])
+
+    broker.deliver({"type": "borrowed", "serial": "100001", "author": "Tokarczuk"})
+    broker.deliver({"type": "created", "serial": "100002", "author": "Lem"})
+
+    assert [e["serial"] for e in _drain(everything)] == ["100001", "100002"]
+    assert [e["serial"] for e in _drain(by_serial)] == ["100001"]
+    assert [e["serial"] for e in _drain(by_author)] == ["100002"]
+
+    broker.unsubscribe(by_serial)
+    broker.unsubscribe(by_author)
+    assert broker.subscriber_count() == 1
+
+
+def test_slow_subscriber_gets_resync():
+    """Test that a full queue is replaced by a resync event instead of blocking publishers"""
+    broker = EventBroker(queue_size=3)
+    subscription = broker.subscribe()
+    for i in range(5):
+        broker.deliver({"type": "created", "serial": f"10000{i}", "author": "A"})
+
+    assert _drain(subscription) == [RESYNC_EVENT, {"type": "created", "serial": "100004", "author": "A"}]
+    assert subscription.dropped == 4
+
+
+@pytest.mark.asyncio
+async def test_writes_publish_events(client: AsyncClient, test_events: EventBroker):
+    """Test that create, borrow, return and delete publish events after commit"""
+    subscription = test_events.subscribe(serials=["123456"])
+
+    await client.post("/books/", json={"serial": "123456", "title": "Solaris", "author": "Lem"})
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})  # 409
+    await client.post("/books/loans/batch", json={"items": [{"serial": "123456", "action": "return"}]})
+    await client.delete("/books/123456")
+
+    events = _drain(subscription)
+    assert [(e["type"], e["is_borrowed"]) for e in events] == [
+        ("created", False),
+        ("borrowed", True),
+        ("returned", False),
+        ("deleted", False),
+    ]
+    assert events[1]["due_at"] is not None
+
+
+@pytest.mark.asyncio
+async def test_rolled_back_write_publishes_nothing(test_session):
+    """Test that events are delivered only when the write's transaction commits"""
+    broker = EventBroker()
+    subscription = broker.subscribe()
+
+    await broker.publish(test_session, [{"type": "created", "serial": "100001", "author": "A"}])
+    await test_session.rollback()
+    await broker.publish(test_session, [{"type": "created", "serial": "100002", "author": "A"}])
+    assert _drain(subscription) == []
+
+    await test_session.commit()
+    assert [e["serial"] for e in _drain(subscription)] == ["100002"]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_format_and_cleanup():
+    """Test the SSE framing, keepalives and unsubscribe on disconnect"""
+    broker = EventBroker()
+    stream = _event_stream(broker, ["123456"], [], keepalive=0.01)
+
+    assert await stream.__anext__() == b"retry: 3000\n\n"
+    assert await stream.__anext__() == b": keepalive\n\n"
+    assert broker.subscriber_count() == 1
+
+    broker.deliver({"type": "borrowed", "serial": "123456", "author": "Lem"})
+    message = await stream.__anext__()
+    event_line, data_line, _, _ = message.split(b"\n")
+    assert event_line == b"event: borrowed"
+    assert json.loads(data_line.removeprefix(b"data: "))["serial"] == "123456"
+
+    await stream.aclose()
+    assert broker.subscriber_count() == 0
@@ -0,0 +1,80 @@
+import csv
+import gzip
+import io
+
+import orjson
+import pytest
+from httpx import AsyncClient
+
+from app.services import export
+
+BOOKS = [
+    {"serial": "800001", "title": "Dune", "author": "Frank Herbert"},
+    {"serial": "800002", "title": "Hyperion, \"Cantos\"", "author": "Dan Simmons"},
+    {"serial": "800003", "title": "Solaris", "author": "Stanisław Lem"},
+]
+
+
+async def seed(client: AsyncClient):
+    for book in BOOKS:
+        await client.post("/books/", json=book)
+    await client.patch("/books/800002/loan", json={"action": "borrow", "card_number": "654321"})
+
+
+@pytest.mark.asyncio
+async def test_export_csv(client: AsyncClient, monkeypatch):
+    """Test CSV export across several cursor batches, with quoting and NULLs"""
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    await seed(client)
+    response = await client.get("/books/export", params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/csv; charset=utf-8"
+    assert response.headers["content-disposition"] == 'attachment; filename="books.csv"'
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["serial"] for row in rows] == ["800001", "800002", "800003"]
+    assert rows[1]["title"] == 'Hyperion, "Cantos"'
+    assert rows[1]["is_borrowed"] == "true"
+    assert rows[1]["borrowed_by"] == "654321"
+    assert rows[1]["borrowed_at"].startswith("20")
+    assert rows[0]["borrowed_by"] == "" and rows[0]["is_borrowed"] == "false"
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_gzip(client: AsyncClient):
+    """Test that gzip=true sends a .gz download of the NDJSON file"""
+    await seed(client)
+    response = await client.get("/books/export", params={"format": "ndjson", "gzip": True})
+    assert response.headers["content-type"] == "application/gzip"
+    assert response.headers["content-disposition"] == 'attachment; filename="books.ndjson.gz"'
+    assert "content-encoding" not in response.headers
+
+    books = [orjson.loads(line) for line in gzip.decompress(response.content).splitlines()]
+    assert [book["serial"] for book in books] == ["800001", "800002", "800003"]
+    assert books[2]["author"] == "Stanisław Lem"
+
+
+@pytest.mark.asyncio
+async def test_export_empty(client: AsyncClient):
+    """Test that an empty catalogue still exports a well-formed file"""
+    response = await client.get("/books/export", params={"format": "csv"})
+    assert response.text.splitlines() == [",".join(export.BOOK_FIELDS)]
+    assert (await client.get("/books/export")).content == b""
+
+
+@pytest.mark.asyncio
+async def test_export_parquet(client: AsyncClient, monkeypatch):
+    """Test Parquet export with one row group per batch"""
+    parquet = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 2)
+    await seed(client)
+    response = await client.get("/books/export", params={"format": "parquet"})
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+
+    file = parquet.ParquetFile(io.BytesIO(response.content))
+    assert file.metadata.num_row_groups == 2
+    table = file.read()
+    assert table.column_names == list(export.BOOK_FIELDS)
+    assert table.column("serial").to_pylist() == ["800001", "800002", "800003"]
+    assert table.column("is_borrowed").to_pylist() == [False, True, False]
+    assert table.column("borrowed_at").to_pylist()[0] is None
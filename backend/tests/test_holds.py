@@ -0,0 +1,112 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.events import EventBroker
+from app.models import Hold, LoanEvent
+from app.pagination import encode_cursor
+
+BORROW = {"action": "borrow", "card_number": "111111"}
+
+
+async def hold(client: AsyncClient, card_number: str, serial: str = "123456"):
+    return await client.post(f"/books/{serial}/holds", json={"card_number": card_number})
+
+
+@pytest.mark.asyncio
+async def test_holds_queue_in_order(client: AsyncClient, sample_book):
+    """Test that holds get consecutive positions and can be listed and cancelled"""
+    await client.patch("/books/123456/loan", json=BORROW)
+    for position, card in enumerate(("222222", "333333", "444444"), start=1):
+        response = await hold(client, card)
+        assert response.status_code == 201
+        assert response.json()["position"] == position
+
+    queue = (await client.get("/books/123456/holds")).json()
+    assert [(h["card_number"], h["position"]) for h in queue] == [("222222", 1), ("333333", 2), ("444444", 3)]
+
+    assert (await client.delete("/books/123456/holds/333333")).status_code == 204
+    assert (await client.delete("/books/123456/holds/333333")).status_code == 404
+    page = await client.get("/books/123456/holds", params={"limit": 1})
+    assert [h["card_number"] for h in page.json()] == ["222222"]
+    rest = await client.get("/books/123456/holds", params={"cursor": page.headers["x-next-cursor"]})
+    assert [(h["card_number"], h["position"]) for h in rest.json()] == [("444444", 2)]
+
+
+@pytest.mark.asyncio
+async def test_holds_invalid_cursor(client: AsyncClient, sample_book):
+    """Test that listing a queue rejects cursors that are not hold ids"""
+    for cursor in ("not-a-cursor", encode_cursor({}), encode_cursor([1]), encode_cursor(None)):
+        response = await client.get("/books/123456/holds", params={"cursor": cursor})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.asyncio
+async def test_hold_refused(client: AsyncClient, sample_book):
+    """Test 404/409 for missing books, available books, the borrower and duplicates"""
+    assert (await hold(client, "222222", serial="999999")).status_code == 404
+    available = await hold(client, "222222")
+    assert available.status_code == 409
+    assert "available" in available.json()["detail"]
+
+    await client.patch("/books/123456/loan", json=BORROW)
+    assert (await hold(client, "111111")).status_code == 409
+    assert (await hold(client, "222222")).status_code == 201
+    duplicate = await hold(client, "222222")
+    assert duplicate.status_code == 409
+    assert "already has a hold" in duplicate.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_return_lends_to_next_in_line(
+    client: AsyncClient, sample_book, test_session, test_events: EventBroker
+):
+    """Test that a return hands the book to the head of the queue in the same transaction"""
+    await client.patch("/books/123456/loan", json=BORROW)
+    await hold(client, "222222")
+    await hold(client, "333333")
+    subscription = test_events.subscribe()
+
+    response = await client.patch("/books/123456/loan", json={"action": "return"})
+    assert response.status_code == 200
+    assert response.json()["is_borrowed"] is True
+    assert response.json()["borrowed_by"] == "222222"
+    assert [h["card_number"] for h in (await client.get("/books/123456/holds")).json()] == ["333333"]
+    # Availability displays see one change: still borrowed, by someone else
+    published = []
+    while not subscription.queue.empty():
+        published.append(subscription.queue.get_nowait()["type"])
+    assert published == ["borrowed"]
+
+    events = (await test_session.execute(
+        select(LoanEvent.action, LoanEvent.card_number).order_by(LoanEvent.id)
+    )).all()
+    assert events == [("borrow", "111111"), ("return", "111111"), ("borrow", "222222")]
+
+    # Once the queue is empty a return leaves the book available
+    assert (await client.patch("/books/123456/loan", json={"action": "return"})).json()["borrowed_by"] == "333333"
+    assert (await client.patch("/books/123456/loan", json={"action": "return"})).json()["is_borrowed"] is False
+    assert (await client.get("/books/123456/holds")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_batch_return_and_delete(client: AsyncClient, sample_book, test_session):
+    """Test hand-off from batch returns and that deleting a book drops its queue"""
+    await client.post("/books/", json={"serial": "654321", "title": "Other", "author": "A"})
+    await client.post("/books/loans/batch", json={"items": [
+        {"serial": "123456", "action": "borrow", "card_number": "111111"},
+        {"serial": "654321", "action": "borrow", "card_number": "111111"},
+    ]})
+    await hold(client, "222222")
+    await hold(client, "333333", serial="654321")
+    await hold(client, "444444", serial="654321")
+
+    result = (await client.post("/books/loans/batch", json={"items": [
+        {"serial": "123456", "action": "return"},
+        {"serial": "654321", "action": "return"},
+    ]})).json()
+    assert [item["book"]["borrowed_by"] for item in result["results"]] == ["222222", "333333"]
+
+    await client.delete("/books/654321")
+    assert await test_session.scalar(select(func.count()).select_from(Hold)) == 0
@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.idempotency import (
+    DatabaseIdempotencyStore,
+    Idempotency,
+    StoredResponse,
+    get_idempotency,
+    request_fingerprint,
+)
+from app.main import app
+from app.models import Book, IdempotencyKey
+
+NEW_BOOK = {"serial": "500001", "title": "Solaris", "author": "Stanisław Lem"}
+
+
+@pytest.mark.asyncio
+async def test_create_replayed(client: AsyncClient, test_session):
+    """Test that a retried create returns the original 201 instead of a 409"""
+    headers = {"Idempotency-Key": "create-1"}
+    first = await client.post("/books/", json=NEW_BOOK, headers=headers)
+    retry = await client.post("/books/", json=NEW_BOOK, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert "idempotent-replayed" not in first.headers
+    assert retry.headers["idempotent-replayed"] == "true"
+    count = await test_session.scalar(select(func.count()).select_from(Book).where(Book.serial == "500001"))
+    assert count == 1
+
+    # Without a key the duplicate check still applies
+    assert (await client.post("/books/", json=NEW_BOOK)).status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_borrow_replayed(client: AsyncClient, sample_book):
+    """Test that a retried borrow gets the original result, not 'already borrowed'"""
+    borrow = {"action": "borrow", "card_number": "654321"}
+    first = await client.patch("/books/123456/loan", json=borrow, headers={"Idempotency-Key": "k1"})
+    retry = await client.patch("/books/123456/loan", json=borrow, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.json()["borrowed_by"] == "654321"
+
+    other = await client.patch("/books/123456/loan", json=borrow, headers={"Idempotency-Key": "k2"})
+    assert other.status_code == 409
+
+
+@pytest.mark.asyncio
+async def test_client_errors_replayed(client: AsyncClient):
+    """Test that refused writes are stored and replayed as well"""
+    borrow = {"action": "borrow", "card_number": "654321"}
+    headers = {"Idempotency-Key": "missing"}
+    first = await client.patch("/books/999999/loan", json=borrow, headers=headers)
+    retry = await client.patch("/books/999999/loan", json=borrow, headers=headers)
+    assert first.status_code == retry.status_code == 404
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_key_reused_for_other_request(client: AsyncClient):
+    """Test 422 when a key comes back with a different request"""
+    headers = {"Idempotency-Key": "reused"}
+    assert (await client.post("/books/", json=NEW_BOOK, headers=headers)).status_code == 201
+    other = await client.post("/books/", json={**NEW_BOOK, "serial": "500002"}, headers=headers)
+    assert other.status_code == 422
+    assert "different request" in other.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_coalesce(concurrent_client: AsyncClient, file_engine):
+    """Test that duplicates in flight share a single execution"""
+    headers = {"Idempotency-Key": "burst"}
+    responses = await asyncio.gather(*(
+        concurrent_client.post("/books/", json=NEW_BOOK, headers=headers) for _ in range(5)
+    ))
+    assert [r.status_code for r in responses] == [201] * 5
+    assert sum("idempotent-replayed" not in r.headers for r in responses) == 1
+
+    session_factory = async_sessionmaker(file_engine, class_=AsyncSession)
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(Book)) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_execution_not_stored(test_idempotency: Idempotency):
+    """Test that server errors leave the key free for a retry"""
+    fingerprint = request_fingerprint("POST", "/books/", b"{}")
+
+    async def fail(record):
+        raise RuntimeError("database unavailable")
+
+    async def succeed(record):
+        return StoredResponse(201, b"{}", fingerprint)
+
+    with pytest.raises(RuntimeError):
+        await test_idempotency.run("k", fingerprint, fail)
+    assert await test_idempotency.run("k", fingerprint, succeed) == (StoredResponse(201, b"{}", fingerprint), False)
+
+
+@pytest.mark.asyncio
+async def test_database_store_shared_between_workers(client: AsyncClient, test_engine):
+    """Test the idempotency_keys backend, including claims held by another worker"""
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    store = DatabaseIdempotencyStore(session_factory, ttl=60, lock_seconds=30)
+    app.dependency_overrides[get_idempotency] = lambda: Idempotency(store)
+
+    headers = {"Idempotency-Key": "db-key"}
+    first = await client.post("/books/", json=NEW_BOOK, headers=headers)
+    # A second worker has its own in-process state but the same table
+    app.dependency_overrides[get_idempotency] = lambda: Idempotency(store)
+    retry = await client.post("/books/", json=NEW_BOOK, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+
+    fingerprint = request_fingerprint("POST", "/books/", b"{}")
+    assert await store.claim("held", fingerprint) is None
+    with pytest.raises(HTTPException) as error:
+        await Idempotency(store).run("held", fingerprint, None)
+    assert error.value.status_code == 409
+
+    # A claim abandoned by a crashed worker is taken over once it expires
+    async with session_factory() as session:
+        await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == "held")
+            .values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await session.commit()
+    assert await store.claim("held", fingerprint) is None
+    await store.release("held")
+
+    async with session_factory() as session:
+        await session.execute(update(IdempotencyKey).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+    assert await store.purge_expired() == 1
+
+
+@pytest.mark.asyncio
+async def test_database_store_commits_response_with_write(client: AsyncClient, test_engine, sample_book, monkeypatch):
+    """Test that a loan and its stored response commit together, without a separate save"""
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    store = DatabaseIdempotencyStore(session_factory, ttl=60, lock_seconds=30)
+    app.dependency_overrides[get_idempotency] = lambda: Idempotency(store)
+
+    async def unavailable(key, response):
+        raise AssertionError("saved outside the write's transaction")
+
+    monkeypatch.setattr(store, "save", unavailable)
+    headers = {"Idempotency-Key": "borrow-once"}
+    borrow = {"action": "borrow", "card_number": "654321"}
+    first = await client.patch("/books/123456/loan", json=borrow, headers=headers)
+    assert first.status_code == 200
+
+    # Another worker finds the committed response, not a free key
+    app.dependency_overrides[get_idempotency] = lambda: Idempotency(store)
+    retry = await client.patch("/books/123456/loan", json=borrow, headers=headers)
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from benchmarks.loadtest import Workload, compare, main, parse_mix, percentile, summarize
+
+
+def _result(rps, p95, queries=1.0):
+    stats = {"requests_per_second": rps, "p50_ms": 1.0, "p95_ms": p95, "p99_ms": p95,
+             "db_queries_per_request": queries}
+    return {"summary": {**stats, "operations": {"read": dict(stats)}}}
+
+
+def test_percentile_nearest_rank():
+    """Test nearest-rank percentiles"""
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.95) == 0.0
+
+
+def test_parse_mix_rejects_unknown_operation():
+    """Test that the operation mix only accepts known operations"""
+    assert parse_mix("read=3,loan=1") == {"read": 3.0, "loan": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("read=1,update=1")
+
+
+def test_summarize_counts_server_errors():
+    """Test aggregation per operation and error counting"""
+    samples = [
+        {"op": "read", "status": 200, "latency": 0.01, "queries": 1},
+        {"op": "read", "status": 500, "latency": 0.03, "queries": 2},
+        {"op": "loan", "status": 409, "latency": 0.02, "queries": None},
+    ]
+    summary = summarize(samples, elapsed=1.0)
+    assert summary["requests"] == 3
+    assert summary["errors"] == 1
+    assert summary["db_queries_per_request"] == 1.5
+    assert summary["operations"]["loan"]["statuses"] == {"409": 1}
+
+
+def test_compare_flags_regressions_beyond_threshold():
+    """Test that compare mode reports slower or less efficient runs only"""
+    baseline = _result(rps=100, p95=10)
+    assert compare(baseline, _result(rps=95, p95=10.5), threshold=0.10) == []
+    regressions = compare(baseline, _result(rps=80, p95=12, queries=2.0), threshold=0.10)
+    assert any(r.startswith("overall.requests_per_second") for r in regressions)
+    assert any(r.startswith("read.p95_ms") for r in regressions)
+    assert any(r.startswith("read.db_queries_per_request") for r in regressions)
+
+
+def test_workload_only_deletes_created_books():
+    """Test that deletes target books whose create already succeeded"""
+    workload = Workload(books=10, mix={"create": 1, "delete": 1}, seed=1)
+    for _ in range(20):
+        op, method, path, params, body, serial = workload.next_request()
+        if op == "delete":
+            assert int(serial) >= 10
+        workload.completed(op, serial, 201 if op == "create" else 204)
+
+
+def test_run_and_compare_in_process(tmp_path):
+    """Test a small in-process run end to end, then compare it with itself"""
+    output = tmp_path / "result.json"
+    database_url = f"sqlite+aiosqlite:///{tmp_path / 'bench.db'}"
+    assert main(["run", "--books", "50", "--requests", "60", "--concurrency", "4",
+                 "--database-url", database_url, "--output", str(output)]) == 0
+
+    result = json.loads(output.read_text())
+    assert result["summary"]["requests"] == 60
+    assert result["summary"]["errors"] == 0
+    assert result["summary"]["operations"]["read"]["db_queries_per_request"] is not None
+    assert main(["compare", str(output), str(output)]) == 0
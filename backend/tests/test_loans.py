@@ -0,0 +1,271 @@
+import asyncio
+from collections import Counter
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+from httpx import AsyncClient
+
+from app.models.loan_event import ensure_loan_event_partitions
+from app.pagination import encode_cursor
+
+
+@pytest.mark.asyncio
+async def test_concurrent_borrows_single_winner(concurrent_client: AsyncClient):
+    """Test that only one of many simultaneous borrows of one copy succeeds"""
+    response = await concurrent_client.post("/books/", json={
+        "serial": "777777",
+        "title": "Bestseller",
+        "author": "Popular Author"
+    })
+    assert response.status_code == 201
+
+    borrowers = [f"{100000 + i}" for i in range(200)]
+    responses = await asyncio.gather(*(
+        concurrent_client.patch(
+            "/books/777777/loan",
+            json={"action": "borrow", "card_number": card}
+        )
+        for card in borrowers
+    ))
+
+    statuses = Counter(r.status_code for r in responses)
+    assert statuses == {200: 1, 409: len(borrowers) - 1}
+
+    winner = next(r.json() for r in responses if r.status_code == 200)
+    listing = await concurrent_client.get("/books/")
+    assert listing.json()[0]["borrowed_by"] == winner["borrowed_by"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_returns_single_winner(concurrent_client: AsyncClient):
+    """Test that only one of many simultaneous returns of one copy succeeds"""
+    await concurrent_client.post("/books/", json={
+        "serial": "777778",
+        "title": "Bestseller",
+        "author": "Popular Author"
+    })
+    await concurrent_client.patch(
+        "/books/777778/loan",
+        json={"action": "borrow", "card_number": "123123"}
+    )
+
+    responses = await asyncio.gather(*(
+        concurrent_client.patch("/books/777778/loan", json={"action": "return"})
+        for _ in range(100)
+    ))
+
+    statuses = Counter(r.status_code for r in responses)
+    assert statuses == {200: 1, 409: 99}
+
+
+async def _create_books(client: AsyncClient, *serials: str):
+    for serial in serials:
+        await client.post("/books/", json={
+            "serial": serial,
+            "title": f"Book {serial}",
+            "author": "Author"
+        })
+
+
+@pytest.mark.asyncio
+async def test_batch_loans_all_or_nothing_success(client: AsyncClient):
+    """Test a kiosk checkout of several books in one batch"""
+    await _create_books(client, "100001", "100002", "100003")
+    await client.patch("/books/100003/loan", json={"action": "borrow", "card_number": "999999"})
+
+    response = await client.post("/books/loans/batch", json={"items": [
+        {"serial": "100001", "action": "borrow", "card_number": "111111"},
+        {"serial": "100002", "action": "borrow", "card_number": "222222"},
+        {"serial": "100003", "action": "return"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status_code"] for r in data["results"]] == [200, 200, 200]
+    assert data["results"][0]["book"]["borrowed_by"] == "111111"
+    assert data["results"][1]["book"]["borrowed_by"] == "222222"
+    assert data["results"][2]["book"]["is_borrowed"] is False
+
+    listing = await client.get("/books/", params={"is_borrowed": True})
+    assert [b["serial"] for b in listing.json()] == ["100001", "100002"]
+
+
+@pytest.mark.asyncio
+async def test_batch_loans_all_or_nothing_rollback(client: AsyncClient):
+    """Test that one failing item rolls back the whole batch"""
+    await _create_books(client, "100001", "100002")
+    await client.patch("/books/100002/loan", json={"action": "borrow", "card_number": "999999"})
+
+    response = await client.post("/books/loans/batch", json={"items": [
+        {"serial": "100001", "action": "borrow", "card_number": "111111"},
+        {"serial": "100002", "action": "borrow", "card_number": "111111"},
+        {"serial": "999999", "action": "return"},
+    ]})
+    assert response.status_code == 409
+    data = response.json()
+    assert data["committed"] is False
+    assert [r["status_code"] for r in data["results"]] == [424, 409, 404]
+
+    listing = await client.get("/books/", params={"is_borrowed": True})
+    assert [b["serial"] for b in listing.json()] == ["100002"]
+
+
+@pytest.mark.asyncio
+async def test_batch_loans_best_effort(client: AsyncClient):
+    """Test that best-effort mode commits the items that succeeded"""
+    await _create_books(client, "100001", "100002")
+    await client.patch("/books/100002/loan", json={"action": "borrow", "card_number": "999999"})
+
+    response = await client.post("/books/loans/batch", json={
+        "mode": "best_effort",
+        "items": [
+            {"serial": "100001", "action": "borrow", "card_number": "111111"},
+            {"serial": "100002", "action": "borrow", "card_number": "111111"},
+        ]
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["committed"] is True
+    assert [r["status_code"] for r in data["results"]] == [200, 409]
+    assert "already borrowed" in data["results"][1]["detail"].lower()
+
+    listing = await client.get("/books/", params={"borrowed_by": "111111"})
+    assert [b["serial"] for b in listing.json()] == ["100001"]
+
+
+@pytest.mark.asyncio
+async def test_batch_loans_validation(client: AsyncClient):
+    """Test batch validation: duplicate serials and LoanRequest rules"""
+    duplicate = await client.post("/books/loans/batch", json={"items": [
+        {"serial": "100001", "action": "borrow", "card_number": "111111"},
+        {"serial": "100001", "action": "return"},
+    ]})
+    assert duplicate.status_code == 422
+
+    missing_card = await client.post("/books/loans/batch", json={"items": [
+        {"serial": "100001", "action": "borrow"},
+    ]})
+    assert missing_card.status_code == 422
+
+    empty = await client.post("/books/loans/batch", json={"items": []})
+    assert empty.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_loan_history_records_events(client: AsyncClient, sample_book):
+    """Test that borrows and returns are appended to the book's history"""
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "111111"})
+    await client.patch("/books/123456/loan", json={"action": "return"})
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "222222"})
+    # A rejected operation leaves no trace
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "333333"})
+
+    response = await client.get("/books/123456/history")
+    assert response.status_code == 200
+    history = [(e["action"], e["card_number"]) for e in response.json()]
+    assert history == [("borrow", "222222"), ("return", "111111"), ("borrow", "111111")]
+
+
+@pytest.mark.asyncio
+async def test_patron_loans_keyset_pagination(client: AsyncClient):
+    """Test paging through a patron's loan events"""
+    await _create_books(client, "100001", "100002", "100003")
+    await client.post("/books/loans/batch", json={"items": [
+        {"serial": serial, "action": "borrow", "card_number": "111111"}
+        for serial in ("100001", "100002", "100003")
+    ]})
+    await client.patch("/books/100002/loan", json={"action": "return"})
+
+    first = await client.get("/patrons/111111/loans", params={"limit": 2})
+    assert first.status_code == 200
+    page = [(e["serial"], e["action"]) for e in first.json()]
+    assert page[0] == ("100002", "return")
+    assert len(page) == 2
+
+    second = await client.get(
+        "/patrons/111111/loans",
+        params={"limit": 2, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert len(second.json()) == 2
+    assert "x-next-cursor" not in second.headers
+
+    serials = sorted(e["serial"] for e in first.json() + second.json() if e["action"] == "borrow")
+    assert serials == ["100001", "100002", "100003"]
+
+
+@pytest.mark.asyncio
+async def test_loan_history_invalid_cursor(client: AsyncClient):
+    """Test that book history and patron loans reject cursors that are not event ids"""
+    await _create_books(client, "100001")
+    for path in ("/books/100001/history", "/patrons/111111/loans"):
+        for cursor in ("not-a-cursor", encode_cursor({}), encode_cursor("1"), encode_cursor(None)):
+            response = await client.get(path, params={"cursor": cursor})
+            assert response.status_code == 400
+            assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.asyncio
+async def test_batch_rollback_discards_events(client: AsyncClient):
+    """Test that an all-or-nothing rollback also drops the loan events"""
+    await _create_books(client, "100001")
+    await client.post("/books/loans/batch", json={"items": [
+        {"serial": "100001", "action": "borrow", "card_number": "111111"},
+        {"serial": "999999", "action": "borrow", "card_number": "111111"},
+    ]})
+
+    response = await client.get("/patrons/111111/loans")
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_patron_loans_invalid_card(client: AsyncClient):
+    """Test that the card number path parameter is validated"""
+    response = await client.get("/patrons/12ab/loans")
+    assert response.status_code == 422
+
+
+def _partition_connection(tables=(), default_rows_from=()):
+    """Fake PostgreSQL connection recording DDL, with the given tables existing
+    and loan_events_default holding rows of the months starting on `default_rows_from`"""
+    statements = []
+
+    def execute(clause, params=None):
+        sql = str(clause)
+        if "to_regclass" in sql:
+            return SimpleNamespace(scalar=lambda: params["table"] in tables)
+        if sql.startswith("SELECT EXISTS"):
+            return SimpleNamespace(scalar=lambda: any(f">= '{day}'" in sql for day in default_rows_from))
+        if not sql.startswith("SELECT pg_advisory_xact_lock"):
+            statements.append(sql)
+
+    return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), execute=execute), statements
+
+
+def test_loan_event_partitions_roll_over_year():
+    """Test that monthly partitions are generated across a year boundary"""
+    connection, statements = _partition_connection()
+    ensure_loan_event_partitions(connection, months_ahead=2, today=date(2025, 11, 15))
+
+    assert statements[0].startswith("CREATE TABLE loan_events_2025_11 PARTITION OF")
+    assert "FROM ('2025-12-01') TO ('2026-01-01')" in statements[1]
+    assert "FROM ('2026-01-01') TO ('2026-02-01')" in statements[2]
+    assert statements[3].endswith("PARTITION OF loan_events DEFAULT")
+
+
+def test_loan_event_partitions_move_default_rows():
+    """Test that rows already in the default partition are moved into a new month"""
+    connection, statements = _partition_connection(
+        tables={"loan_events_default", "loan_events_2025_11"}, default_rows_from={"2025-12-01"}
+    )
+    ensure_loan_event_partitions(connection, months_ahead=2, today=date(2025, 11, 15))
+
+    assert statements == [
+        "ALTER TABLE loan_events DETACH PARTITION loan_events_default",
+        "CREATE TABLE loan_events_2025_12 PARTITION OF loan_events FOR VALUES FROM ('2025-12-01') TO ('2026-01-01')",
+        "INSERT INTO loan_events_2025_12 SELECT * FROM loan_events_default "
+        "WHERE occurred_at >= '2025-12-01' AND occurred_at < '2026-01-01'",
+        "DELETE FROM loan_events_default WHERE occurred_at >= '2025-12-01' AND occurred_at < '2026-01-01'",
+        "ALTER TABLE loan_events ATTACH PARTITION loan_events_default DEFAULT",
+        "CREATE TABLE loan_events_2026_01 PARTITION OF loan_events FOR VALUES FROM ('2026-01-01') TO ('2026-02-01')",
+    ]
@@ -0,0 +1,81 @@
+import logging
+import re
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from app.config import settings
+from app.metrics import REQUEST_DURATION, Histogram
+from app.metrics.sql import install_sql_hooks
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(client: AsyncClient, sample_book):
+    """Test that responses report app time, DB time and query count"""
+    response = await client.get("/books/123456")
+    timing = response.headers["server-timing"]
+    assert re.search(r"app;dur=[\d.]+", timing)
+    assert 'desc="1 queries"' in timing
+    assert "pool;dur=" in timing
+
+    cached = await client.get("/books/123456")
+    assert 'desc="0 queries"' in cached.headers["server-timing"]
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_uses_route_templates(client: AsyncClient, sample_book):
+    """Test the Prometheus endpoint and that routes are labelled by template"""
+    before = REQUEST_DURATION.count(method="GET", route="/books/{serial}", status=200)
+    await client.get("/books/123456")
+    assert REQUEST_DURATION.count(method="GET", route="/books/{serial}", status=200) == before + 1
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert 'route="/books/{serial}"' in body
+    assert 'route="/books/123456"' not in body
+    assert "http_request_db_queries_bucket" in body
+    assert "db_query_duration_seconds_count" in body
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log(client: AsyncClient, sample_book, caplog):
+    """Test that slow statements are logged with their route"""
+    install_sql_hooks(slow_query_ms=0)
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.slow_query"):
+            await client.get("/books/123456")
+    finally:
+        install_sql_hooks(settings.slow_query_threshold_ms)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("/books/{serial}" in m and "SELECT" in m for m in messages)
+
+
+def test_histogram_render():
+    """Test Prometheus text rendering of a histogram"""
+    histogram = Histogram("test_seconds", "Test histogram", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, route="/a")
+    histogram.observe(0.5, route="/a")
+    histogram.observe(5, route="/a")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/a"} 3' in lines
+    assert 'test_seconds_sum{route="/a"} 5.55' in lines
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_leaves_no_timing(test_session):
+    """Test that a statement that raises does not leave its start time on the connection"""
+    with pytest.raises(Exception):
+        await test_session.execute(text("SELECT * FROM no_such_table"))
+    await test_session.rollback()
+    await test_session.execute(text("SELECT 1"))
+    conn = await test_session.connection()
+    assert conn.info.get("query_started") == []
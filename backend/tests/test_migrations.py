@@ -0,0 +1,239 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import Base
+from app.migrations import (
+    MigrationError,
+    SchemaOutOfDate,
+    check_schema,
+    create_index,
+    current_revision,
+    downgrade,
+    head_revision,
+    load_migrations,
+    stamp,
+    upgrade,
+)
+
+REVISIONS = [migration.revision for migration in load_migrations()]
+
+
+@pytest_asyncio.fixture
+async def empty_engine(tmp_path):
+    """Create an engine on an empty SQLite file"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    await engine.dispose()
+
+
+def _schema(sync_conn):
+    inspector = inspect(sync_conn)
+    return {
+        table: (
+            {column["name"] for column in inspector.get_columns(table)},
+            {index["name"] for index in inspector.get_indexes(table)},
+        )
+        for table in Base.metadata.tables
+        if inspector.has_table(table)
+    }
+
+
+@pytest.mark.asyncio
+async def test_upgrade_matches_models(empty_engine, test_engine):
+    """Test that migrating an empty database yields the same schema as the models"""
+    assert await upgrade(empty_engine) == REVISIONS
+    assert await current_revision(empty_engine) == head_revision()
+
+    async with empty_engine.connect() as conn:
+        migrated = await conn.run_sync(_schema)
+    async with test_engine.connect() as conn:
+        expected = await conn.run_sync(_schema)
+    assert migrated == expected
+
+
+@pytest.mark.asyncio
+async def test_upgrade_is_idempotent(empty_engine):
+    """Test that upgrading an up-to-date database does nothing"""
+    await upgrade(empty_engine)
+    assert await upgrade(empty_engine) == []
+
+
+@pytest.mark.asyncio
+async def test_downgrade_to_base_and_back(empty_engine):
+    """Test reverting every migration and applying them again"""
+    await upgrade(empty_engine)
+    assert await downgrade(empty_engine, "0001") == REVISIONS[:0:-1]
+    assert await current_revision(empty_engine) == "0001"
+    assert await downgrade(empty_engine, "base") == ["0001"]
+    assert await current_revision(empty_engine) is None
+
+    async with empty_engine.connect() as conn:
+        tables = await conn.run_sync(lambda c: inspect(c).get_table_names())
+    assert "books" not in tables
+
+    assert await upgrade(empty_engine) == REVISIONS
+
+
+@pytest.mark.asyncio
+async def test_check_schema(empty_engine):
+    """Test the startup check against unmigrated, partially and fully migrated databases"""
+    with pytest.raises(SchemaOutOfDate):
+        await check_schema(empty_engine)
+    await upgrade(empty_engine, "0001")
+    with pytest.raises(SchemaOutOfDate):
+        await check_schema(empty_engine)
+    await upgrade(empty_engine)
+    await check_schema(empty_engine)
+
+
+@pytest.mark.asyncio
+async def test_legacy_database_requires_stamp(empty_engine):
+    """Test that a database created by create_all must be stamped before upgrading"""
+    async with empty_engine.begin() as conn:
+        await conn.execute(text("CREATE TABLE books (serial VARCHAR(6) PRIMARY KEY)"))
+    with pytest.raises(MigrationError):
+        await upgrade(empty_engine)
+
+    await stamp(empty_engine, "0002")
+    assert await current_revision(empty_engine) == "0002"
+    with pytest.raises(MigrationError):
+        await stamp(empty_engine, "9999")
+
+
+@pytest.mark.asyncio
+async def test_due_date_backfill(empty_engine):
+    """Test that upgrading past 0003 gives existing loans a due date"""
+    await upgrade(empty_engine, "0002")
+    async with empty_engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO books (serial, title, author, is_borrowed, borrowed_by, borrowed_at) VALUES "
+            "('100001', 'Borrowed', 'Author', 1, '999999', '2024-03-01 10:00:00'), "
+            "('100002', 'On shelf', 'Author', 0, NULL, NULL)"
+        ))
+    await upgrade(empty_engine)
+
+    async with empty_engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT serial, due_at FROM books ORDER BY serial"))).all()
+    assert rows == [("100001", "2024-03-15 10:00:00"), ("100002", None)]
+
+
+@pytest.mark.asyncio
+async def test_row_version_backfill(empty_engine):
+    """Test that upgrading past 0006 numbers existing books in serial order"""
+    await upgrade(empty_engine, "0005")
+    async with empty_engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO books (serial, title, author, is_borrowed) VALUES "
+            "('100003', 'C', 'Author', 0), ('100001', 'A', 'Author', 0), ('100002', 'B', 'Author', 0)"
+        ))
+    await upgrade(empty_engine, "0006")
+
+    async with empty_engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT serial, row_version FROM books ORDER BY serial"))).all()
+        counter = await conn.scalar(text("SELECT value FROM change_counters WHERE name = 'books'"))
+    assert rows == [("100001", 1), ("100002", 2), ("100003", 3)]
+    assert counter == 3
+
+
+@pytest.mark.asyncio
+async def test_works_backfill(empty_engine):
+    """Test that upgrading past 0010 moves titles and authors into works and authors"""
+    await upgrade(empty_engine, "0009")
+    async with empty_engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO books (serial, title, author, is_borrowed) VALUES "
+            "('100001', 'Dune', 'Frank Herbert', 1), ('100002', 'Dune', 'Frank Herbert', 0), "
+            "('100003', 'Solaris', 'Stanisław Lem', 0)"
+        ))
+        versions = (await conn.execute(text("SELECT serial, row_version FROM books ORDER BY serial"))).all()
+    await upgrade(empty_engine)
+
+    async with empty_engine.connect() as conn:
+        rows = (await conn.execute(text(
+            "SELECT serial, works.title, authors.name, books.work_id FROM books "
+            "JOIN works ON works.id = books.work_id JOIN authors ON authors.id = books.author_id ORDER BY serial"
+        ))).all()
+        stats = (await conn.execute(text(
+            "SELECT name, total, borrowed FROM author_stats JOIN authors ON authors.id = author_id ORDER BY name"
+        ))).all()
+        matches = (await conn.execute(text("SELECT title FROM works_fts WHERE works_fts MATCH 'herbert'"))).all()
+        assert (await conn.execute(text("SELECT serial, row_version FROM books ORDER BY serial"))).all() == versions
+    assert [row[:3] for row in rows] == [
+        ("100001", "Dune", "Frank Herbert"),
+        ("100002", "Dune", "Frank Herbert"),
+        ("100003", "Solaris", "Stanisław Lem"),
+    ]
+    assert rows[0].work_id == rows[1].work_id != rows[2].work_id
+    assert stats == [("Frank Herbert", 2, 1), ("Stanisław Lem", 1, 0)]
+    assert matches == [("Dune",)]
+
+    await downgrade(empty_engine, "0009")
+    async with empty_engine.connect() as conn:
+        rows = (await conn.execute(text("SELECT serial, title, author FROM books ORDER BY serial"))).all()
+        stats = (await conn.execute(text("SELECT author, total, borrowed FROM author_stats ORDER BY author"))).all()
+    assert rows[1] == ("100002", "Dune", "Frank Herbert")
+    assert stats == [("Frank Herbert", 2, 1), ("Stanisław Lem", 1, 0)]
+
+
+@pytest.mark.asyncio
+async def test_sharded_counters_backfill(empty_engine):
+    """Test that upgrading past 0011 keeps the totals and loans per day, and downgrading folds the shards"""
+    await upgrade(empty_engine, "0010")
+    async with empty_engine.begin() as conn:
+        await conn.execute(text("INSERT INTO authors (id, name) VALUES (1, 'Frank Herbert')"))
+        await conn.execute(text("INSERT INTO works (id, title, author_id) VALUES (1, 'Dune', 1)"))
+        await conn.execute(text(
+            "INSERT INTO books (serial, work_id, author_id, is_borrowed) VALUES ('100001', 1, 1, 1), ('100002', 1, 1, 0)"
+        ))
+        await conn.execute(text(
+            "INSERT INTO loan_events (id, serial, card_number, action, occurred_at) "
+            "VALUES (1, '100001', '654321', 'borrow', '2024-03-01 10:00:00')"
+        ))
+    await upgrade(empty_engine)
+
+    async with empty_engine.begin() as conn:
+        await conn.execute(text("INSERT INTO books (serial, work_id, author_id, is_borrowed) VALUES ('100003', 1, 1, 0)"))
+        await conn.execute(text(
+            "INSERT INTO loan_events (id, serial, card_number, action, occurred_at) "
+            "VALUES (2, '100001', NULL, 'return', '2024-03-01 11:00:00')"
+        ))
+        counters = (await conn.execute(text("SELECT name, shard, value FROM circulation_counters ORDER BY name"))).all()
+        days = (await conn.execute(text("SELECT day, shard, borrows, returns FROM daily_loan_stats"))).all()
+        assert not (await conn.execute(text("SELECT 1 FROM change_counters WHERE name = 'books_total'"))).all()
+    assert counters == [("books_borrowed", 0, 1), ("books_total", 0, 3)]
+    assert days == [("2024-03-01", 0, 1, 1)]
+
+    await downgrade(empty_engine, "0010")
+    async with empty_engine.connect() as conn:
+        counters = (await conn.execute(text(
+            "SELECT name, value FROM change_counters WHERE name LIKE 'books_%' ORDER BY name"
+        ))).all()
+        days = (await conn.execute(text("SELECT day, borrows, returns FROM daily_loan_stats"))).all()
+    assert counters == [("books_borrowed", 1), ("books_total", 3)]
+    assert days == [("2024-03-01", 1, 1)]
+
+
+def test_create_index_rebuilds_invalid_index():
+    """Test that an INVALID index left by a failed concurrent build is dropped and rebuilt"""
+    statements = []
+    indexes = {"ix_valid": True, "ix_invalid": False}
+
+    def execute(clause, params=None):
+        if params is not None:
+            return SimpleNamespace(scalar=lambda: indexes.get(params["name"]))
+        statements.append(str(clause))
+
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), execute=execute)
+    for name in ("ix_valid", "ix_invalid", "ix_missing"):
+        create_index(connection, name, "books", "serial")
+
+    assert statements == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_valid ON books (serial)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_invalid",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_invalid ON books (serial)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_missing ON books (serial)",
+    ]
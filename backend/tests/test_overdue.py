@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.models import Book
+from app.services.overdue import scan_overdue
+
+
+async def _borrow_books(client: AsyncClient, *serials: str):
+    for serial in serials:
+        await client.post("/books/", json={"serial": serial, "title": f"Book {serial}", "author": "Author"})
+        await client.patch(f"/books/{serial}/loan", json={"action": "borrow", "card_number": "999999"})
+
+
+async def _set_due(session, serial: str, due_at: datetime):
+    await session.execute(update(Book).where(Book.serial == serial).values(due_at=due_at))
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_borrow_sets_due_date(client: AsyncClient):
+    """Test that borrowing sets due_at from the loan period and returning clears it"""
+    await _borrow_books(client, "100001")
+    book = (await client.get("/books/100001")).json()
+    borrowed_at = datetime.fromisoformat(book["borrowed_at"])
+    assert datetime.fromisoformat(book["due_at"]) == borrowed_at + timedelta(days=settings.loan_period_days)
+
+    response = await client.patch("/books/100001/loan", json={"action": "return"})
+    assert response.json()["due_at"] is None
+
+
+@pytest.mark.asyncio
+async def test_overdue_loans_keyset_pages(client: AsyncClient, test_session):
+    """Test that /loans/overdue lists only overdue loans, oldest due date first, across pages"""
+    await _borrow_books(client, "100001", "100002", "100003", "100004")
+    now = datetime.utcnow()
+    await _set_due(test_session, "100001", now - timedelta(days=1))
+    await _set_due(test_session, "100002", now - timedelta(days=3))
+    await _set_due(test_session, "100003", now - timedelta(days=2))
+    # 100004 keeps its due date two weeks ahead
+
+    response = await client.get("/loans/overdue", params={"limit": 2})
+    assert [book["serial"] for book in response.json()] == ["100002", "100003"]
+
+    response = await client.get("/loans/overdue", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [book["serial"] for book in response.json()] == ["100001"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_overdue_invalid_cursor(client: AsyncClient):
+    """Test that a malformed cursor is rejected"""
+    response = await client.get("/loans/overdue", params={"cursor": "bm90LWEtY3Vyc29y"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_scan_overdue_only_handles_new_loans(client: AsyncClient, test_session, test_engine):
+    """Test that the scan works in batches and resumes from its high-water mark"""
+    await _borrow_books(client, "100001", "100002", "100003")
+    now = datetime.utcnow()
+    for days, serial in enumerate(("100001", "100002", "100003"), start=1):
+        await _set_due(test_session, serial, now - timedelta(days=days))
+
+    batches = []
+
+    async def handler(db, rows):
+        batches.append([row.serial for row in rows])
+
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+    assert await scan_overdue(session_factory, batch_size=2, handler=handler) == 3
+    assert batches == [["100003", "100002"], ["100001"]]
+
+    # Nothing new: no rescan of already reported loans
+    assert await scan_overdue(session_factory, batch_size=2, handler=handler) == 0
+
+    # A loan falling due later is picked up by the next run
+    await _borrow_books(client, "100004")
+    later = datetime.utcnow() + timedelta(days=settings.loan_period_days, minutes=1)
+    assert await scan_overdue(session_factory, batch_size=2, handler=handler, now=later) == 1
+    assert batches[-1] == ["100004"]
+
+
+@pytest.mark.asyncio
+async def test_scan_overdue_retries_batch_when_handler_fails(client: AsyncClient, test_session, test_engine):
+    """Test that a failing handler does not advance the high-water mark"""
+    await _borrow_books(client, "100001")
+    await _set_due(test_session, "100001", datetime.utcnow() - timedelta(days=1))
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def failing(db, rows):
+        raise RuntimeError("notification service down")
+
+    with pytest.raises(RuntimeError):
+        await scan_overdue(session_factory, batch_size=10, handler=failing)
+
+    handled = []
+
+    async def handler(db, rows):
+        handled.extend(row.serial for row in rows)
+
+    assert await scan_overdue(session_factory, batch_size=10, handler=handler) == 1
+    assert handled == ["100001"]
@@ -0,0 +1,208 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.db.pool import RECENT_WAIT_HALF_LIFE, PoolWaitStats
+from app.main import app
+from app.ratelimit import (
+    Bucket,
+    MemoryRateLimitStore,
+    RateLimiter,
+    RedisRateLimitStore,
+    get_rate_limiter,
+)
+from app.ratelimit.admission import AdmissionController, get_admission_controller
+
+
+class FakeRedis:
+    """redis.asyncio stand-in that evaluates the token bucket script in Python"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.calls = []
+
+    async def eval(self, script, numkeys, key, rate, burst):
+        self.calls.append(key)
+        tokens, updated = self.buckets.get(key, (burst, time.time()))
+        now = time.time()
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = 0
+        if tokens >= 1:
+            tokens -= 1
+            allowed = 1
+        self.buckets[key] = (tokens, now)
+        return [allowed, str(tokens).encode()]
+
+
+def limiter(ip_burst=100, card_burst=100) -> RateLimiter:
+    return RateLimiter(MemoryRateLimitStore(), ip=Bucket(1.0, ip_burst), card=Bucket(0.5, card_burst))
+
+
+@pytest.mark.asyncio
+async def test_memory_bucket_burst_and_retry_after():
+    """Test that a bucket allows its burst, then reports when the next token arrives"""
+    rate_limiter = limiter(ip_burst=2)
+    assert await rate_limiter.check("10.0.0.1") is None
+    assert await rate_limiter.check("10.0.0.1") is None
+    wait = await rate_limiter.check("10.0.0.1")
+    assert 0 < wait <= 1.0
+    assert await rate_limiter.check("10.0.0.2") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_store_forgets_least_recent_keys():
+    """Test that the in-process store stays bounded"""
+    store = MemoryRateLimitStore(max_keys=2)
+    bucket = Bucket(1.0, 1)
+    for key in ("a", "b", "c"):
+        await store.take(key, bucket)
+    assert await store.take("a", bucket) == (True, 0.0)
+    assert (await store.take("c", bucket))[0] is False
+
+
+@pytest.mark.asyncio
+async def test_redis_store_with_fake_client():
+    """Test the shared store against a local fake client"""
+    client = FakeRedis()
+    rate_limiter = RateLimiter(RedisRateLimitStore(client), ip=Bucket(1.0, 1), card=Bucket(1.0, 5))
+    assert await rate_limiter.check("10.0.0.1", "654321") is None
+    assert await rate_limiter.check("10.0.0.1", "654321") is not None
+    assert client.calls == [
+        "library:ratelimit:ip:10.0.0.1",
+        "library:ratelimit:card:654321",
+        "library:ratelimit:ip:10.0.0.1",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_writes_limited_per_ip(client: AsyncClient):
+    """Test that create requests get 429 with Retry-After once the IP bucket is empty"""
+    rate_limiter = limiter(ip_burst=2)
+    app.dependency_overrides[get_rate_limiter] = lambda: rate_limiter
+
+    for serial in ("300001", "300002"):
+        response = await client.post("/books/", json={"serial": serial, "title": "T", "author": "A"})
+        assert response.status_code == 201
+    limited = await client.post("/books/", json={"serial": "300003", "title": "T", "author": "A"})
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "1"
+    assert limited.json() == {"detail": "Too many requests"}
+
+    # Reads are never rate limited
+    assert (await client.get("/books/")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_loans_limited_per_card(client: AsyncClient, sample_book):
+    """Test that loan requests are keyed by card number and still reach the route intact"""
+    rate_limiter = limiter(card_burst=2)
+    app.dependency_overrides[get_rate_limiter] = lambda: rate_limiter
+
+    borrow = {"action": "borrow", "card_number": "654321"}
+    assert (await client.patch("/books/123456/loan", json=borrow)).json()["borrowed_by"] == "654321"
+    assert (await client.patch("/books/123456/loan", json={"action": "return"})).status_code == 200
+    assert (await client.patch("/books/123456/loan", json=borrow)).status_code == 200
+    assert (await client.patch("/books/123456/loan", json={"action": "return"})).status_code == 200
+
+    limited = await client.patch("/books/123456/loan", json=borrow)
+    assert limited.status_code == 429
+    assert limited.headers["retry-after"] == "2"
+
+    other_card = await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "111111"})
+    assert other_card.status_code == 200
+
+    # Padding the body past what is read for the card does not get around it
+    padded = {**borrow, "pad": " " * 5000}
+    assert (await client.patch("/books/123456/loan", json=padded)).status_code == 413
+    assert (await client.post("/books/123456/holds", json=padded)).status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_batch_loans_charge_every_card(client: AsyncClient):
+    """Test that a batch takes a token from each distinct card it names"""
+    for serial in ("300001", "300002", "300003"):
+        await client.post("/books/", json={"serial": serial, "title": "T", "author": "A"})
+    rate_limiter = limiter(card_burst=1)
+    app.dependency_overrides[get_rate_limiter] = lambda: rate_limiter
+
+    batch = {"items": [
+        {"serial": "300001", "action": "borrow", "card_number": "111111"},
+        {"serial": "300002", "action": "borrow", "card_number": "111111"},
+    ]}
+    assert (await client.post("/books/loans/batch", json=batch)).json()["committed"] is True
+
+    # Card 111111 is spent, so a batch naming it is refused whatever else it holds
+    batch = {"items": [
+        {"serial": "300003", "action": "borrow", "card_number": "222222"},
+        {"serial": "300001", "action": "return", "card_number": "111111"},
+    ]}
+    assert (await client.post("/books/loans/batch", json=batch)).status_code == 429
+
+    padded = {"items": [{"serial": "300003", "action": "borrow", "card_number": "333333"}], "pad": " " * 70000}
+    response = await client.post("/books/loans/batch", json=padded)
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_admission_sheds_on_pool_wait(client: AsyncClient):
+    """Test 503 with Retry-After while recent pool waits exceed the threshold"""
+    stats = PoolWaitStats()
+    controller = AdmissionController(max_pool_wait=0.1, retry_after=3, wait_stats=stats)
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+
+    assert (await client.get("/books/")).status_code == 200
+    stats.record(2.0)
+    shed = await client.get("/books/")
+    assert shed.status_code == 503
+    assert shed.headers["retry-after"] == "3"
+    # Health checks and metrics stay available
+    assert (await client.get("/health")).status_code == 200
+    assert controller.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_caps_in_flight(client: AsyncClient):
+    """Test that requests beyond max_in_flight are refused instead of queued"""
+    controller = AdmissionController(max_in_flight=1)
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+
+    assert (await client.get("/books/")).status_code == 200
+    controller.in_flight = 1
+    assert (await client.get("/books/")).status_code == 503
+    controller.in_flight = 0
+    assert (await client.get("/books/")).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_admission_caps_streams_separately(client: AsyncClient):
+    """Test that catalogue streams have their own cap and leave short requests alone"""
+    controller = AdmissionController(max_in_flight=1, max_streams=1)
+    app.dependency_overrides[get_admission_controller] = lambda: controller
+
+    controller.streams = 1
+    assert (await client.get("/books/export")).status_code == 503
+    assert (await client.get("/books/", params={"stream": "true"})).status_code == 503
+    assert (await client.get("/books/")).status_code == 200
+    controller.streams = 0
+
+    # A running export does not count as in flight for short reads
+    controller.in_flight = 1
+    assert (await client.get("/books/snapshot")).status_code == 200
+    assert (await client.get("/books/")).status_code == 503
+    controller.in_flight = 0
+    assert controller.streams == 0
+
+
+def test_recent_pool_wait_decays_while_idle():
+    """Test that the recent wait average recovers without further checkouts"""
+    stats = PoolWaitStats()
+    stats.record(1.0)
+    recent = stats.recent_wait_seconds()
+    assert recent == pytest.approx(0.2, rel=0.01)
+    later = time.monotonic() + 4 * RECENT_WAIT_HALF_LIFE
+    assert stats.recent_wait_seconds(later) == pytest.approx(recent / 16, rel=0.01)
+
+    stats.record_timeout(1.0)
+    assert stats.timeouts == 1
+    assert stats.checkouts == 1
@@ -0,0 +1,145 @@
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import db as db_module
+from app.cache import BookCache, MemoryCache, NullCache, get_cache
+from app.db import Base
+from app.db.replicas import PRIMARY_COOKIE, PRIMARY_HEADER, Replica, ReplicaSet
+from app.events import EventBroker, get_events
+from app.main import app
+from app.services.works import WorkLookup, get_work_lookup
+
+
+async def _file_engine(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+
+@pytest_asyncio.fixture
+async def replicated_client(tmp_path, monkeypatch):
+    """Client whose primary and single replica are separate SQLite files (no replication)"""
+    primary = await _file_engine(tmp_path / "primary.db")
+    replica = await _file_engine(tmp_path / "replica.db")
+    replica_set = db_module.replicas
+
+    monkeypatch.setattr(
+        db_module, "AsyncSessionLocal",
+        async_sessionmaker(primary, class_=AsyncSession, expire_on_commit=False),
+    )
+    monkeypatch.setattr(replica_set, "replicas", [Replica("replica", replica)])
+    monkeypatch.setattr(replica_set, "retry_seconds", 60)
+    app.dependency_overrides[get_cache] = lambda: BookCache(NullCache())
+    app.dependency_overrides[get_events] = EventBroker
+    # Work ids cached against another test's database would not exist here
+    app.dependency_overrides[get_work_lookup] = WorkLookup
+
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        yield ac, replica_set
+
+    app.dependency_overrides.clear()
+    await primary.dispose()
+    await replica.dispose()
+
+
+BOOK = {"serial": "123456", "title": "Replicated", "author": "Author"}
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica(replicated_client):
+    """Test that read routes use the replica while writes use the primary"""
+    client, _ = replicated_client
+    response = await client.post("/books/", json=BOOK)
+    assert response.status_code == 201
+
+    # The replica file never receives the write, so a replica read can't see it
+    client.cookies.clear()
+    response = await client.get("/books/")
+    assert response.json() == []
+    response = await client.get("/books/123456")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes_after_commit(replicated_client):
+    """Test that a client that just wrote reads from the primary"""
+    client, _ = replicated_client
+    response = await client.post("/books/", json=BOOK)
+    assert response.cookies.get(PRIMARY_COOKIE)
+    until = response.headers[PRIMARY_HEADER]
+
+    response = await client.get("/books/")
+    assert [book["serial"] for book in response.json()] == ["123456"]
+
+    # API clients without a cookie jar can echo the header instead
+    client.cookies.clear()
+    response = await client.get("/books/123456", headers={PRIMARY_HEADER: until})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back_to_primary(replicated_client, tmp_path):
+    """Test that a replica that cannot connect is marked down and reads use the primary"""
+    client, replica_set = replicated_client
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_set.replicas = [Replica("broken", broken)]
+
+    await client.post("/books/", json=BOOK)
+    client.cookies.clear()
+    response = await client.get("/books/")
+    assert [book["serial"] for book in response.json()] == ["123456"]
+
+    response = await client.get("/admin/replicas")
+    assert response.json() == [
+        {"name": "broken", "healthy": False, "failures": 1, "retry_in_seconds": pytest.approx(60, abs=1)}
+    ]
+    await broken.dispose()
+
+
+def test_replica_set_round_robin_skips_down_replicas():
+    """Test round-robin selection and the retry window"""
+    first, second = Replica("a", None), Replica("b", None)
+    replica_set = ReplicaSet([first, second], retry_seconds=60)
+    assert {replica_set.choose().name for _ in range(4)} == {"a", "b"}
+
+    replica_set.mark_down(first)
+    assert {replica_set.choose().name for _ in range(4)} == {"b"}
+    replica_set.mark_down(second)
+    assert replica_set.choose() is None
+    replica_set.mark_up(first)
+    assert replica_set.choose() is first
+
+
+@pytest.mark.asyncio
+async def test_pinned_reads_bypass_cache(replicated_client):
+    """Test that a page a lagging replica cached after a write does not hide it from the writer"""
+    client, _ = replicated_client
+    cache = BookCache(MemoryCache())
+    app.dependency_overrides[get_cache] = lambda: cache
+    response = await client.post("/books/", json=BOOK)
+    until = response.headers[PRIMARY_HEADER]
+
+    client.cookies.clear()
+    stale = await client.get("/books/")
+    assert stale.json() == []
+
+    response = await client.get("/books/", headers={PRIMARY_HEADER: until, "If-None-Match": stale.headers["ETag"]})
+    assert [book["serial"] for book in response.json()] == ["123456"]
+    # ...and the primary's page did not replace the replica's
+    assert (await client.get("/books/")).json() == []
+
+
+@pytest.mark.asyncio
+async def test_replica_is_not_contacted_without_a_query(replicated_client, tmp_path):
+    """Test that a 304 answered from the table version checks out no replica connection"""
+    client, replica_set = replicated_client
+    broken = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    replica_set.replicas = [Replica("broken", broken)]
+
+    response = await client.get("/books/123456", headers={"If-None-Match": "*"})
+    assert response.status_code == 304
+    assert replica_set.status()[0]["failures"] == 0
+    await broken.dispose()
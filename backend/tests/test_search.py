@@ -0,0 +1,67 @@
+import pytest
+from httpx import AsyncClient
+
+
+async def _create_catalogue(client: AsyncClient):
+    books = [
+        ("100001", "Harry Potter and the Philosopher's Stone", "J.K. Rowling"),
+        ("100002", "Harry Potter and the Chamber of Secrets", "J.K. Rowling"),
+        ("100003", "The Hobbit", "J.R.R. Tolkien"),
+        ("100004", "Potter's Field", "Ellis Peters"),
+    ]
+    for serial, title, author in books:
+        await client.post("/books/", json={"serial": serial, "title": title, "author": author})
+
+
+@pytest.mark.asyncio
+async def test_search_by_title_and_author(client: AsyncClient):
+    """Test searching books by title words and author"""
+    await _create_catalogue(client)
+
+    response = await client.get("/books/search", params={"q": "hobbit"})
+    assert response.status_code == 200
+    assert [b["serial"] for b in response.json()] == ["100003"]
+
+    by_author = await client.get("/books/search", params={"q": "rowling"})
+    assert [b["serial"] for b in by_author.json()] == ["100001", "100002"]
+
+
+@pytest.mark.asyncio
+async def test_search_prefix_type_ahead(client: AsyncClient):
+    """Test that partially typed words match as prefixes"""
+    await _create_catalogue(client)
+
+    response = await client.get("/books/search", params={"q": "harr pot cham"})
+    assert [b["serial"] for b in response.json()] == ["100002"]
+
+    response = await client.get("/books/search", params={"q": "pot", "limit": 2})
+    assert len(response.json()) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_deletes(client: AsyncClient):
+    """Test that deleted books disappear from search results"""
+    await _create_catalogue(client)
+    await client.delete("/books/100003")
+
+    response = await client.get("/books/search", params={"q": "hobbit"})
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_ignores_query_syntax(client: AsyncClient):
+    """Test that FTS operators in the query are treated as plain text"""
+    await _create_catalogue(client)
+
+    response = await client.get("/books/search", params={"q": '"hobbit" OR NEAR(*'})
+    assert response.status_code == 200
+
+    empty = await client.get("/books/search", params={"q": "***"})
+    assert empty.json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_requires_query(client: AsyncClient):
+    """Test that the query parameter is required"""
+    response = await client.get("/books/search")
+    assert response.status_code == 422
@@ -0,0 +1,40 @@
+import pytest
+
+from app.config import Settings
+from app.serve import shared_state_warnings, worker_pool_limits, worker_settings
+
+
+def test_worker_pool_limits_split_budget():
+    """Test that per-worker pools never exceed the global connection budget"""
+    assert worker_pool_limits(budget=40, workers=4, pool_size=5) == (5, 5)
+    assert worker_pool_limits(budget=12, workers=4, pool_size=5) == (3, 0)
+    size, overflow = worker_pool_limits(budget=50, workers=3, pool_size=5)
+    assert 3 * (size + overflow) <= 50
+
+
+def test_worker_pool_limits_reject_too_small_budget():
+    """Test that a budget smaller than the worker count is rejected"""
+    with pytest.raises(ValueError):
+        worker_pool_limits(budget=2, workers=4, pool_size=5)
+
+
+def test_worker_settings_without_budget():
+    """Test that pool settings are left alone without a connection budget"""
+    assert worker_settings(workers=4, budget=None) == {}
+    assert worker_settings(workers=2, budget=20)["db_max_overflow"] == 5
+
+
+def test_memory_cache_warns_with_several_workers():
+    """Test that a per-worker cache is flagged once more than one worker runs"""
+    memory = Settings(cache_backend="memory")
+    assert shared_state_warnings(1, memory) == []
+    assert "CACHE_BACKEND=memory" in shared_state_warnings(2, memory)[0]
+    assert shared_state_warnings(2, Settings(cache_backend="redis", idempotency_backend="database")) == []
+
+
+def test_memory_idempotency_warns_with_several_workers():
+    """Test that per-worker idempotency keys are flagged once more than one worker runs"""
+    shared = Settings(cache_backend="none", idempotency_backend="database")
+    assert shared_state_warnings(4, shared) == []
+    warnings = shared_state_warnings(4, Settings(cache_backend="none", idempotency_backend="memory"))
+    assert len(warnings) == 1 and "IDEMPOTENCY_BACKEND=memory" in warnings[0]
@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app.cache import BookCache, NullCache, get_cache
+from app.main import app
+from app.metrics import READ_COALESCING
+from app.singleflight import SingleFlight, get_single_flight
+
+
+def coalescing(route: str) -> tuple:
+    return (
+        READ_COALESCING.value(route=route, result="executed"),
+        READ_COALESCING.value(route=route, result="coalesced"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that identical keys in flight run once and distinct keys run separately"""
+    flights = SingleFlight()
+    calls = []
+
+    async def load(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(
+        *(flights.do("test", "a", lambda: load("a")) for _ in range(5)),
+        flights.do("test", "b", lambda: load("b")),
+    )
+    assert results == ["a"] * 5 + ["b"]
+    assert sorted(calls) == ["a", "b"]
+    assert flights.in_flight() == 0
+
+    # Once landed, the next call runs again
+    assert await flights.do("test", "a", lambda: load("a")) == "a"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failures_shared_only_while_in_flight():
+    """Test that followers see the leader's error but later calls retry"""
+    flights = SingleFlight(window=10)
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("query failed")
+
+    results = await asyncio.gather(*(flights.do("test", "k", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(attempts) == 1
+
+    async def succeed():
+        return "ok"
+
+    assert await flights.do("test", "k", succeed) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_window_keeps_result_shareable():
+    """Test that results are reused for `window` seconds after the query finished"""
+    flights = SingleFlight(window=0.05)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return len(calls)
+
+    assert await flights.do("test", "k", load) == 1
+    assert await flights.do("test", "k", load) == 1
+    await asyncio.sleep(0.06)
+    assert await flights.do("test", "k", load) == 2
+
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_cancelled_leader():
+    """Test that a cancelled leader does not fail the requests waiting on it"""
+    flights = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "follower result"
+
+    leader = asyncio.create_task(flights.do("test", "k", slow))
+    await started.wait()
+    follower = asyncio.create_task(flights.do("test", "k", fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == "follower result"
+
+
+@pytest.mark.asyncio
+async def test_identical_list_requests_coalesce(concurrent_client: AsyncClient):
+    """Test that concurrent identical list requests share one query and body"""
+    for serial in ("600001", "600002"):
+        await concurrent_client.post("/books/", json={"serial": serial, "title": "T", "author": "A"})
+    # No response cache, so only coalescing can save the queries
+    cache = BookCache(NullCache())
+    app.dependency_overrides[get_cache] = lambda: cache
+    flights = SingleFlight(window=1.0)
+    app.dependency_overrides[get_single_flight] = lambda: flights
+    before = coalescing("/books/")
+
+    responses = await asyncio.gather(*(
+        concurrent_client.get("/books/", params={"author": "A"}) for _ in range(10)
+    ))
+    executed, coalesced = (now - then for now, then in zip(coalescing("/books/"), before))
+    assert executed == 1
+    assert coalesced == 9
+    assert all(r.content == responses[0].content for r in responses)
+    assert [b["serial"] for b in responses[0].json()] == ["600001", "600002"]
+
+
+@pytest.mark.asyncio
+async def test_writes_start_new_flights(client: AsyncClient, sample_book):
+    """Test that a read after a write never joins a flight started before it"""
+    flights = SingleFlight(window=60)
+    app.dependency_overrides[get_single_flight] = lambda: flights
+    assert len((await client.get("/books/search", params={"q": "test"})).json()) == 1
+
+    await client.post("/books/", json={"serial": "600003", "title": "Test Again", "author": "B"})
+    results = (await client.get("/books/search", params={"q": "test"})).json()
+    assert sorted(book["serial"] for book in results) == ["123456", "600003"]
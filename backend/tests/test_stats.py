@@ -0,0 +1,129 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metrics import STATS_DRIFT
+from app.models import Author, AuthorStats, CirculationCounter
+from app.services.stats import reconcile_stats
+
+BOOKS = [
+    {"serial": "900001", "title": "Solaris", "author": "Stanisław Lem"},
+    {"serial": "900002", "title": "Eden", "author": "Stanisław Lem"},
+    {"serial": "900003", "title": "Dune", "author": "Frank Herbert"},
+]
+
+
+async def seed(client: AsyncClient):
+    for book in BOOKS:
+        await client.post("/books/", json=book)
+
+
+@pytest.mark.asyncio
+async def test_stats_follow_writes(client: AsyncClient):
+    """Test that creates, loans and deletes update the totals and per-author counts"""
+    await seed(client)
+    await client.patch("/books/900001/loan", json={"action": "borrow", "card_number": "654321"})
+    await client.patch("/books/900003/loan", json={"action": "borrow", "card_number": "654321"})
+    await client.patch("/books/900003/loan", json={"action": "return"})
+
+    stats = (await client.get("/stats")).json()
+    assert (stats["total_books"], stats["borrowed_books"], stats["available_books"]) == (3, 1, 2)
+    assert stats["authors"] == [
+        {"author": "Stanisław Lem", "total": 2, "borrowed": 1},
+        {"author": "Frank Herbert", "total": 1, "borrowed": 0},
+    ]
+    today = stats["loans_per_day"][-1]
+    assert today == {"day": datetime.utcnow().date().isoformat(), "borrows": 2, "returns": 1}
+    assert len(stats["loans_per_day"]) == 30
+
+    await client.delete("/books/900003")
+    await client.delete("/books/900001")
+    stats = (await client.get("/stats", params={"author": ["Frank Herbert", "Stanisław Lem"], "days": 7})).json()
+    assert (stats["total_books"], stats["borrowed_books"]) == (1, 0)
+    assert stats["authors"] == [
+        {"author": "Frank Herbert", "total": 0, "borrowed": 0},
+        {"author": "Stanisław Lem", "total": 1, "borrowed": 0},
+    ]
+    assert len(stats["loans_per_day"]) == 7
+
+
+@pytest.mark.asyncio
+async def test_stats_cover_bulk_and_batch_writes(client: AsyncClient):
+    """Test that set-based imports and batch loans are counted too"""
+    rows = [{"serial": f"90{i:04d}", "title": "T", "author": f"A{i % 2}"} for i in range(5)]
+    await client.post("/books/bulk", json=rows)
+    await client.post("/books/loans/batch", json={"items": [
+        {"serial": "900000", "action": "borrow", "card_number": "654321"},
+        {"serial": "900001", "action": "borrow", "card_number": "654321"},
+    ]})
+
+    stats = (await client.get("/stats", params={"top_authors": 1})).json()
+    assert (stats["total_books"], stats["borrowed_books"]) == (5, 2)
+    assert stats["authors"] == [{"author": "A0", "total": 3, "borrowed": 1}]
+    assert stats["loans_per_day"][-1]["borrows"] == 2
+
+
+@pytest.mark.asyncio
+async def test_reconcile_corrects_drift(client: AsyncClient, test_engine):
+    """Test that reconciliation finds counters out of step with the rows and fixes them"""
+    await seed(client)
+    await client.patch("/books/900002/loan", json={"action": "borrow", "card_number": "654321"})
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession)
+    assert await reconcile_stats(session_factory) == 0
+
+    before = STATS_DRIFT.value(table="author_stats")
+    async with session_factory() as session:
+        # Writes that bypassed the triggers
+        await session.execute(text(
+            "DELETE FROM author_stats WHERE author_id = (SELECT id FROM authors WHERE name = 'Frank Herbert')"
+        ))
+        await session.execute(update(AuthorStats).values(borrowed=0))
+        await session.execute(update(CirculationCounter).where(CirculationCounter.name == "books_total").values(value=10))
+        await session.execute(text("DELETE FROM daily_loan_stats"))
+        await session.commit()
+    assert await reconcile_stats(session_factory) == 4
+    assert STATS_DRIFT.value(table="author_stats") - before == 2
+
+    stats = (await client.get("/stats")).json()
+    assert (stats["total_books"], stats["borrowed_books"]) == (3, 1)
+    assert stats["authors"] == [
+        {"author": "Stanisław Lem", "total": 2, "borrowed": 1},
+        {"author": "Frank Herbert", "total": 1, "borrowed": 0},
+    ]
+    assert stats["loans_per_day"][-1]["borrows"] == 1
+    assert await reconcile_stats(session_factory) == 0
+
+    # Authors left without books are removed
+    async with session_factory() as session:
+        await session.execute(text("INSERT INTO authors (name) VALUES ('Nobody')"))
+        await session.execute(text(
+            "INSERT INTO author_stats (author_id, total, borrowed) "
+            "SELECT id, 2, 0 FROM authors WHERE name = 'Nobody'"
+        ))
+        await session.commit()
+    assert await reconcile_stats(session_factory, today=datetime.utcnow().date() + timedelta(days=1)) == 1
+    async with session_factory() as session:
+        assert await session.scalar(select(AuthorStats).join(Author).where(Author.name == "Nobody")) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reconciles_correct_once(concurrent_client: AsyncClient, file_engine):
+    """Test that workers reconciling at the same time apply each correction once"""
+    await seed(concurrent_client)
+    session_factory = async_sessionmaker(file_engine, class_=AsyncSession)
+    async with session_factory() as session:
+        await session.execute(update(CirculationCounter).where(CirculationCounter.name == "books_total").values(value=10))
+        await session.execute(text("DELETE FROM author_stats"))
+        await session.commit()
+
+    corrected = await asyncio.gather(*(reconcile_stats(session_factory) for _ in range(3)))
+    assert sorted(corrected) == [0, 0, 3]
+
+    stats = (await concurrent_client.get("/stats")).json()
+    assert stats["total_books"] == 3
+    assert {a["author"]: a["total"] for a in stats["authors"]} == {"Stanisław Lem": 2, "Frank Herbert": 1}
+    assert await reconcile_stats(session_factory) == 0
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import BookTombstone
+from app.services.sync import prune_tombstones
+
+
+async def changes(client: AsyncClient, since: int = 0, **params) -> dict:
+    response = await client.get("/books/changes", params={"since": since, **params})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_changes_in_version_order(client: AsyncClient, sample_book):
+    """Test that creates, loans and deletes appear once each, latest version only"""
+    await client.post("/books/", json={"serial": "700001", "title": "Dune", "author": "Frank Herbert"})
+    initial = await changes(client)
+    assert [(c["op"], c["serial"]) for c in initial["changes"]] == [("upsert", "123456"), ("upsert", "700001")]
+    assert initial["has_more"] is False
+    since = initial["next_since"]
+    assert since == initial["changes"][-1]["version"]
+
+    await client.patch("/books/123456/loan", json={"action": "borrow", "card_number": "654321"})
+    await client.delete("/books/700001")
+    feed = await changes(client, since)
+    assert [(c["op"], c["serial"]) for c in feed["changes"]] == [("upsert", "123456"), ("delete", "700001")]
+    assert feed["changes"][0]["book"]["borrowed_by"] == "654321"
+    assert feed["changes"][1]["book"] is None
+    assert feed["changes"][0]["version"] < feed["changes"][1]["version"]
+
+    # Nothing new: the cursor stays put
+    assert await changes(client, feed["next_since"]) == {
+        "changes": [], "next_since": feed["next_since"], "has_more": False
+    }
+
+    # A deleted serial created again is an upsert after its tombstone
+    await client.post("/books/", json={"serial": "700001", "title": "Dune", "author": "Frank Herbert"})
+    assert [c["op"] for c in (await changes(client, since))["changes"]] == ["upsert", "delete", "upsert"]
+
+
+@pytest.mark.asyncio
+async def test_changes_paging(client: AsyncClient):
+    """Test that following next_since returns every change exactly once"""
+    rows = [{"serial": f"70{i:04d}", "title": "T", "author": "A"} for i in range(7)]
+    assert (await client.post("/books/bulk", json=rows)).json()["inserted"] == 7
+    await client.delete("/books/700002")
+    await client.delete("/books/700005")
+
+    seen, since, has_more = [], 0, True
+    while has_more:
+        page = await changes(client, since, limit=3)
+        assert len(page["changes"]) <= 3
+        seen.extend((c["op"], c["serial"]) for c in page["changes"])
+        since, has_more = page["next_since"], page["has_more"]
+    assert len(seen) == 7
+    assert seen[-2:] == [("delete", "700002"), ("delete", "700005")]
+    assert {serial for op, serial in seen if op == "upsert"} == {"700000", "700001", "700003", "700004", "700006"}
+
+
+@pytest.mark.asyncio
+async def test_snapshot_then_changes(client: AsyncClient, sample_book):
+    """Test bootstrapping from the snapshot and continuing with the change feed"""
+    response = await client.get("/books/snapshot")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    books = [orjson.loads(line) for line in response.content.splitlines()]
+    assert [book["serial"] for book in books] == ["123456"]
+    version = int(response.headers["x-change-version"])
+    assert version == (await changes(client))["next_since"]
+
+    await client.post("/books/", json={"serial": "700001", "title": "Dune", "author": "Frank Herbert"})
+    assert [c["serial"] for c in (await changes(client, version))["changes"]] == ["700001"]
+
+
+@pytest.mark.asyncio
+async def test_pruned_tombstones_force_bootstrap(client: AsyncClient, test_engine, sample_book):
+    """Test 410 for clients that last synced before pruned deletions"""
+    await client.post("/books/", json={"serial": "700001", "title": "Dune", "author": "Frank Herbert"})
+    await client.delete("/books/700001")
+    session_factory = async_sessionmaker(test_engine, class_=AsyncSession)
+    assert await prune_tombstones(session_factory, retention_days=30) == 0
+
+    async with session_factory() as session:
+        await session.execute(update(BookTombstone).values(deleted_at=datetime.utcnow() - timedelta(days=31)))
+        await session.commit()
+    assert await prune_tombstones(session_factory, retention_days=30) == 1
+
+    response = await client.get("/books/changes", params={"since": 0})
+    assert response.status_code == 410
+    assert "/books/snapshot" in response.json()["detail"]
+    version = int((await client.get("/books/snapshot")).headers["x-change-version"])
+    assert (await changes(client, version))["changes"] == []
@@ -0,0 +1,87 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import func, select
+
+from app.models import Author, Book, Work
+from app.services.works import WorkLookup
+
+
+COPIES = [
+    {"serial": "500001", "title": "Dune", "author": "Frank Herbert"},
+    {"serial": "500002", "title": "Dune", "author": "Frank Herbert"},
+    {"serial": "500003", "title": "Dune Messiah", "author": "Frank Herbert"},
+]
+
+
+async def _count(session, model) -> int:
+    return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.asyncio
+async def test_copies_share_one_work(client: AsyncClient, test_session):
+    """Test that copies of a title share a work row and still read back in full"""
+    for copy in COPIES:
+        assert (await client.post("/books/", json=copy)).status_code == 201
+
+    assert await _count(test_session, Author) == 1
+    assert await _count(test_session, Work) == 2
+    work_ids = (await test_session.scalars(select(Book.work_id).order_by(Book.serial))).all()
+    assert work_ids[0] == work_ids[1] != work_ids[2]
+
+    response = await client.get("/books/500002")
+    assert (response.json()["title"], response.json()["author"]) == ("Dune", "Frank Herbert")
+    listing = await client.get("/books/", params={"author": "Frank Herbert"})
+    assert [b["serial"] for b in listing.json()] == ["500001", "500002", "500003"]
+    assert (await client.get("/books/", params={"author": "Nobody"})).json() == []
+
+    # Deleting the last copy keeps the work for the next one
+    await client.delete("/books/500003")
+    assert await _count(test_session, Work) == 2
+
+
+@pytest.mark.asyncio
+async def test_lookup_caches_only_committed_works(test_session):
+    """Test that ids learned in a rolled back transaction are not cached"""
+    works = WorkLookup(max_entries=1)
+    created = await works.resolve(test_session, [("Dune", "Frank Herbert")])
+    assert len(works) == 0
+    await test_session.rollback()
+    assert len(works) == 0
+    assert await _count(test_session, Work) == 0
+
+    created = await works.resolve(test_session, [("Dune", "Frank Herbert")])
+    await test_session.commit()
+    assert len(works) == 1
+    assert await works.resolve(test_session, [("Dune", "Frank Herbert")]) == created
+
+    # The least recently used entry goes first
+    await works.resolve(test_session, [("Solaris", "Stanisław Lem")])
+    await test_session.commit()
+    assert len(works) == 1
+    assert await works.resolve(test_session, [("Dune", "Frank Herbert")]) == created
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_deduplicates_works(client: AsyncClient, test_session, test_works):
+    """Test that a bulk import creates each work and author once"""
+    rows = [{"serial": f"60{i:04d}", "title": f"Title {i % 2}", "author": "A"} for i in range(6)]
+    response = await client.post("/books/bulk", json=rows)
+    assert response.json()["inserted"] == 6
+
+    assert await _count(test_session, Author) == 1
+    assert await _count(test_session, Work) == 2
+    assert len(test_works) == 2
+    listing = await client.get("/books/", params={"author": "A"})
+    assert [b["title"] for b in listing.json()] == ["Title 0", "Title 1"] * 3
+
+
+@pytest.mark.asyncio
+async def test_search_returns_every_copy(client: AsyncClient):
+    """Test that searching the per-work index finds all copies of a work"""
+    for copy in COPIES:
+        await client.post("/books/", json=copy)
+
+    response = await client.get("/books/search", params={"q": "messiah"})
+    assert [b["serial"] for b in response.json()] == ["500003"]
+    response = await client.get("/books/search", params={"q": "herbert"})
+    assert sorted(b["serial"] for b in response.json()) == ["500001", "500002", "500003"]